@@ -3,32 +3,70 @@
 #--------------------------------------------------------------------------"""
 
 
-import json
-import dateutil.parser
-import babel
-import datetime
-from flask import (Flask, render_template, request, Response, flash,
-                   redirect, url_for, jsonify)
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+import math
 import logging
-from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from models import db, Venue, Artist
-from validate import stringToDateTime
-
+import itertools
+from datetime import datetime
+import click
+from flask import (Flask, Blueprint, current_app, render_template, request,
+                   Response, flash, redirect, url_for, jsonify,
+                   stream_with_context, make_response, session)
+from forms import VenueForm, ArtistForm, ShowForm
+from sqlalchemy.exc import IntegrityError
+from models import (db, Venue, Artist, Show, ShowArchive, ShowListing,
+                    getRecord, getRecent, getUpcomingShowIds, dialectInsert,
+                    nameKey, isNameConflict)
+from validate import (stringToDateTime, venue_name_error, artist_name_error,
+                      state_choices)
+import logs
+import warmup
+import hooks
+import jobs
+import cache
+import ratelimit
+import idempotency
+import thumbs
+import timeline
+import nameindex
+import geo
+import partitions
+import archive
+import listing
+import assets
+import snapshots
+import events
+import changelog
+from formatting import format_datetime
+
+logger = logging.getLogger(__name__)
 
 """--------------------------------------------------------------------------#
 # App Config.
 #--------------------------------------------------------------------------"""
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db.init_app(app)
-migrate = Migrate(app, db)
+
+# The routes live on a blueprint, so importing this module only defines
+# them. The app is built by create_app(), which the flask command finds
+# on its own and wsgi.py and worker.py call.
+main = Blueprint('main', __name__, cli_group=None)
+
+
+def create_app(config='config'):
+    app = Flask(__name__)
+    app.config.from_object(config)
+    logs.configureLogging(app)
+    db.init_app(app)
+    warmup.configureTemplateCache(app)
+    app.register_blueprint(main)
+
+    # Flask-Migrate pulls in Alembic and is only needed by the "flask db"
+    # commands, so it is left out when the app is served.
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    warmup.startWarmUp(app)
+    return app
 
 
 """--------------------------------------------------------------------------#
@@ -36,16 +74,19 @@ migrate = Migrate(app, db)
 #--------------------------------------------------------------------------"""
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+main.add_app_template_filter(format_datetime, 'datetime')
+main.add_app_template_filter(thumbs.thumbUrl, 'thumb')
+main.add_app_template_global(state_choices, 'state_choices')
+
 
+@main.app_template_global()
+def asset_url(filename):
+    return assets.assetUrl(filename, current_app.config['ASSETS_DIST_DIR'])
 
-app.jinja_env.filters['datetime'] = format_datetime
+
+@main.app_template_global()
+def live_events():
+    return current_app.config['LIVE_EVENTS']
 
 
 """--------------------------------------------------------------------------#
@@ -73,71 +114,84 @@ def format_phone(form_phone):
 #  This function returns a single record in Dict format for display.
 def getRecordAsDict(table, record_id):
     time_now = datetime.now()
-    this_record = table.query.get(record_id)
+    this_record = getRecord(table, record_id)
+
+    record_as_dict = dict(this_record.__dict__)
 
     if hasattr(this_record, 'genres'):
         # Conditional that splits genres into a list, if record
-        # has the genres attribute.
-        this_record.genres = this_record.genres.split(',')
+        # has the genres attribute. (NOTE: the record itself is left
+        # as is, so the list is never flushed back as a change.)
+        record_as_dict['genres'] = this_record.genres.split(',')
+
+    if table is not Show:
+        # Venues and artists list all their upcoming shows, and their
+        # most recent past shows (the page loads more as it's scrolled,
+        # see pastShowsResponse). The shows relationship is left alone,
+        # it would load every show the record ever had.
+        if timeline.enabled():
+            upcoming_shows = getTimelineUpcomingShows(table, record_id,
+                                                      time_now)
+        else:
+            upcoming_shows = getUpcomingShows(table, record_id, time_now)
+        past_shows, past_shows_next = archive.getPastShows(
+            table, record_id, time_now,
+            limit=current_app.config['PAST_SHOWS_PAGE_SIZE'])
+        record_as_dict.update({
+            'past_shows': past_shows,
+            'upcoming_shows': upcoming_shows,
+            'past_shows_count': archive.countPastShows(table, record_id,
+                                                       time_now),
+            'upcoming_shows_count': len(upcoming_shows),
+            'past_shows_next': past_shows_next
+        })
 
-    record_as_dict = this_record.__dict__
+    return(record_as_dict)
 
-    if hasattr(this_record, 'shows'):
-        # Conditional returns a list of shows, if record
-        # has the shows attribute (NOTE: shows is a DB relationsip).
-        shows = (getShows(this_record.shows, time_now))
-        record_as_dict.update(shows)
 
-    return(record_as_dict)
+# This function returns a page of a venue's or artist's past shows as
+# JSON, for loading more of them on its page. The cursor for the next
+# page is returned as "next" and passed back as "after".
+def pastShowsResponse(table, record_id):
+    try:
+        past_shows, next_cursor = archive.getPastShows(
+            table, record_id, datetime.now(), request.args.get('after'),
+            current_app.config['PAST_SHOWS_PAGE_SIZE'])
+    except ValueError:
+        return jsonify(success=False, message='Invalid cursor.'), 400
+    finally:
+        db.session.close()
+    return jsonify(shows=[{
+        'artist_id': show['artist_id'],
+        'artist_name': show['artist_name'],
+        'artist_image_link': thumbs.thumbUrl(show['artist_image_link']),
+        'venue_id': show['venue_id'],
+        'venue_name': show['venue_name'],
+        'venue_image_link': thumbs.thumbUrl(show['venue_image_link']),
+        'start_time': format_datetime(show['start_time'], 'full')
+    } for show in past_shows], next=next_cursor)
 
 
-# This function loops a record's shows and structures data
-# as a list in the format needed for display. (e.g. a list of past
-# shows, a list of upcoming shows, and the show counts).
-def getShows(show_list, time_now):
-    upcoming_shows = []
-    past_shows = []
+# This function returns a venue's or artist's upcoming shows in start
+# time order, in the format needed for display, read from the show
+# listing alone.
+def getUpcomingShows(table, record_id, time_now):
+    return listing.getUpcomingListings(table, record_id, time_now)
 
-    for show in show_list:
-        if show.start_time > time_now:
-            upcoming_shows.append({
-                'artist_id': show.artist.id,
-                'artist_name': show.artist.name,
-                'artist_image_link': show.artist.image_link,
-                'venue_id': show.venue.id,
-                'venue_name': show.venue.name,
-                'venue_image_link': show.venue.image_link,
-                'start_time': str(show.start_time)
-            })
-        else:
-            past_shows.append({
-                'artist_id': show.artist.id,
-                'artist_name': show.artist.name,
-                'artist_image_link': show.artist.image_link,
-                'venue_id': show.venue.id,
-                'venue_name': show.venue.name,
-                'venue_image_link': show.venue.image_link,
-                'start_time': str(show.start_time)
-            })
 
-    return ({
-        'past_shows': past_shows,
-        'upcoming_shows': upcoming_shows,
-        'past_shows_count': len(past_shows),
-        'upcoming_shows_count': len(upcoming_shows)
-    })
+# This function returns the same as getUpcomingShows, with the show IDs
+# taken from the artist's or venue's show timeline.
+def getTimelineUpcomingShows(table, record_id, time_now):
+    kind = 'venues' if table is Venue else 'artists'
+    upcoming_ids = timeline.getTimelines().split(
+        kind, record_id, timeline.toEpoch(time_now))[1]
+    return listing.getListings(upcoming_ids)
 
 
 # This function returns a list of all shows and returns it
 # to the controller for display in the view.
 def getShowList():
-    show_list = Show.query.all()
-    for show in show_list:
-        show.venue_name = show.venue.name
-        show.artist_name = show.artist.name
-        show.artist_image_link = show.artist.image_link
-        show.start_time = str(show.start_time)
-    return(show_list)
+    return ShowListing.query.order_by(ShowListing.id).all()
 
 
 # This function counts the number of shows for
@@ -150,6 +204,21 @@ def getShowCount(show_list, match_id, record_id):
     return(count)
 
 
+# This function returns a function that counts the upcoming shows of
+# a record, matching on the ID parameter ('venue_id' or 'artist_id').
+# Counts come from the show timelines when they are enabled, otherwise
+# all upcoming shows are read once and counted per record.
+def getUpcomingShowCounter(match_id, time_now):
+    if timeline.enabled():
+        kind = 'venues' if match_id == 'venue_id' else 'artists'
+        timelines = timeline.getTimelines()
+        epoch = timeline.toEpoch(time_now)
+        return lambda record_id: timelines.countAfter(kind, record_id, epoch)
+
+    show_query = getUpcomingShowIds(time_now)
+    return lambda record_id: getShowCount(show_query, match_id, record_id)
+
+
 # This function returns results filtered by search terms.
 def getKeywordResults(table, column, search_term, shows_match_id=None):
     time_now = datetime.now()
@@ -159,12 +228,11 @@ def getKeywordResults(table, column, search_term, shows_match_id=None):
                      .filter(column.ilike('%' + search_term + '%')).all()
                      )
     if shows_match_id is not None:
-        show_query = Show.query.filter(Show.start_time > time_now).all()
+        countUpcomingShows = getUpcomingShowCounter(shows_match_id, time_now)
 
     for result in keyword_query:
         if shows_match_id is not None:
-            num_upcoming_shows = getShowCount(show_query, shows_match_id,
-                                              result.id)
+            num_upcoming_shows = countUpcomingShows(result.id)
 
         search_result.append({
             "id": result.id,
@@ -178,17 +246,140 @@ def getKeywordResults(table, column, search_term, shows_match_id=None):
     })
 
 
+search_cache = cache.CoalescingCache()
+
+
+# This function returns getKeywordResults() for a search. Identical
+# searches running at the same time share one query, and results are
+# kept for SEARCH_CACHE_SECONDS. Matching ignores case, so the term is
+# lower-cased for the key.
+def searchRecords(table, column, search_term, shows_match_id=None):
+    return search_cache.get(
+        (table.__tablename__, search_term.lower()),
+        lambda: getKeywordResults(table, column, search_term,
+                                  shows_match_id),
+        current_app.config['SEARCH_CACHE_SECONDS']
+    )
+
+
+# This function updates a record in a single UPDATE statement that only
+# matches if the record still has the version the editor started from,
+# and bumps the version. Returns False if someone else changed (or
+# deleted) the record in the meantime.
+def updateVersioned(table, record_id, version, values):
+    try:
+        version = int(version)
+    except (TypeError, ValueError):
+        return False
+    values['version'] = table.version + 1
+    updated = (
+        table.query
+        .filter(table.id == record_id, table.version == version)
+        .update(values, synchronize_session=False)
+    )
+    return updated == 1
+
+
+# This function inserts a venue or artist and returns its ID, or None if
+# its name is taken. The unique name index makes the check, so two
+# submissions of the same name at once can't both get in.
+def insertNamed(table, values):
+    return db.session.execute(
+        dialectInsert(table).values(values)
+        .on_conflict_do_nothing(index_elements=[nameKey(table)])
+        .returning(table.id)
+    ).scalar()
+
+
+# This function renders an edit form tagged with the record version as
+# its ETag, so a browser revalidating an unchanged record gets a 304.
+# Pages carrying flashed messages are not tagged.
+def renderVersioned(record_type, record, template_name, **context):
+    has_messages = bool(session.get('_flashes'))
+    response = make_response(render_template(template_name, **context))
+    if not has_messages:
+        response.set_etag(f'{record_type}-{record["id"]}-'
+                          f'v{record["version"]}')
+    return response
+
+
+# This function deletes the shows, current and archived, of the given
+# venues or artists and records their deletion, which the database's ON
+# DELETE CASCADE would do unseen. The venues or artists are locked
+# first, so no show can be booked on them in between.
+def deleteShowsOf(table, record_ids):
+    db.session.execute(db.select(table.id).where(table.id.in_(record_ids))
+                       .with_for_update())
+    for source in (Show, ShowArchive):
+        column = source.venue_id if table is Venue else source.artist_id
+        deleted = db.session.execute(
+            db.delete(source).where(column.in_(record_ids))
+            .returning(source.id)
+        )
+        hooks.recordChanged(Show, [row.id for row in deleted], 'delete')
+
+
+# This function deletes every record of a table that matches a list of
+# IDs and/or a filter in a single DELETE statement, and returns the IDs
+# of the deleted records. Filters compare columns for equality, columns
+# suffixed with _before or _after compare date columns. The shows of
+# deleted venues or artists are deleted (and recorded) first.
+def deleteRecords(table, ids=None, filters=None):
+    criteria = []
+    if ids is not None:
+        criteria.append(table.id.in_([int(record_id) for record_id in ids]))
+    for key, value in (filters or {}).items():
+        name, operator = key, '='
+        if key.endswith(('_before', '_after')):
+            name, operator = key.rsplit('_', 1)
+        column = table.__table__.columns.get(name)
+        if column is None:
+            raise ValueError(f'{table.__tablename__} has no column {name}.')
+        column = getattr(table, name)
+        if operator == '=':
+            criteria.append(column == value)
+        else:
+            value = stringToDateTime(value)
+            criteria.append(column < value if operator == 'before'
+                            else column > value)
+    if not criteria:
+        raise ValueError('Either ids or a filter is required.')
+
+    if table is not Show:
+        deleteShowsOf(table, db.session.execute(
+            db.select(table.id).where(*criteria)).scalars().all())
+    deleted = db.session.execute(
+        db.delete(table).where(*criteria).returning(table.id)
+    )
+    return [row.id for row in deleted]
+
+
+# This function handles a bulk delete request body of the form
+# {"ids": [1, 2]} and/or {"filter": {"city": "Austin"}}.
+def bulkDeleteResponse(table):
+    body = request.get_json(silent=True) or {}
+    try:
+        deleted = deleteRecords(table, ids=body.get('ids'),
+                                filters=body.get('filter'))
+        hooks.recordChanged(table, deleted, 'delete')
+        db.session.commit()
+    except (ValueError, TypeError) as e:
+        db.session.rollback()
+        return jsonify(success=False, message=str(e)), 400
+    except Exception:
+        db.session.rollback()
+        logger.exception('Bulk delete of %s failed.', table.__tablename__)
+        return jsonify(success=False), 500
+    finally:
+        db.session.close()
+    return jsonify(success=True, deleted=len(deleted)), 200
+
+
 def getRecentListings():
     recent_artists = []
     recent_venues = []
-    recent_artists_query = (
-        Artist.query
-        .order_by(Artist.id.desc()).limit(5).all()
-    )
-    recent_venues_query = (
-        Venue.query
-        .order_by(Venue.id.desc()).limit(5).all()
-    )
+    recent_artists_query = getRecent(Artist)
+    recent_venues_query = getRecent(Venue)
     for artist in recent_artists_query:
         recent_artists.append({
             'id': artist.id,
@@ -209,12 +400,107 @@ def getRecentListings():
     })
 
 
+#  Streamed listings
+#  ----------------------------------------------------------------
+
+
+# This function returns the iterable with its first item already
+# fetched, or None if it is empty. Fetching the first item runs the
+# query before the response starts, so errors and empty tables can
+# still be answered with a redirect.
+def peekRows(rows):
+    rows = iter(rows)
+    try:
+        first = next(rows)
+    except StopIteration:
+        return None
+    return itertools.chain([first], rows)
+
+
+# This function renders a template as a stream of chunks, so the page
+# header is sent before all listing rows have been read.
+def streamTemplate(template_name, **context):
+    current_app.update_template_context(context)
+    template = current_app.jinja_env.get_template(template_name)
+    response = Response(stream_with_context(template.generate(context)))
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# This function streams a listing page from a row generator, or
+# redirects home with the same messages as the buffered pages.
+def streamListing(template_name, rows_name, rows, display_name,
+                  table_name):
+    try:
+        rows = peekRows(rows)
+    except Exception:
+        logger.exception('Could not stream the %s table.', table_name)
+        flash('An error occured. ' + display_name + ' cannot be shown.')
+        return redirect(url_for('.index'))
+    if rows is None:
+        flash('The ' + table_name + ' table in the database is empty.')
+        return redirect(url_for('.index'))
+    return streamTemplate(template_name, **{rows_name: rows})
+
+
+# This function yields venues grouped by city and state in the format
+# of venues(), reading the rows in batches.
+def iterVenueAreas(time_now):
+    upcoming = (
+        db.session.query(Show.venue_id,
+                         db.func.count(Show.id).label('num_shows'))
+        .filter(Show.start_time > time_now)
+        .group_by(Show.venue_id).subquery()
+    )
+    venue_rows = (
+        db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                         db.func.coalesce(upcoming.c.num_shows, 0)
+                         .label('num_shows'))
+        .outerjoin(upcoming, upcoming.c.venue_id == Venue.id)
+        .order_by(Venue.state, Venue.city, Venue.name)
+        .yield_per(current_app.config['STREAM_BATCH_SIZE'])
+    )
+    for location, records in itertools.groupby(
+            venue_rows, key=lambda record: (record.city, record.state)):
+        yield {
+            'city': location[0],
+            'state': location[1],
+            'venues': ({
+                'id': record.id,
+                'name': record.name,
+                'num_upcoming_shows': record.num_shows
+            } for record in records)
+        }
+
+
+# This function yields artists in the format of artists().
+def iterArtists():
+    return (
+        Artist.query.with_entities(Artist.id, Artist.name)
+        .yield_per(current_app.config['STREAM_BATCH_SIZE'])
+    )
+
+
+# This function yields shows with the artist and venue fields used by
+# the shows page, read from the show listing.
+def iterShows():
+    return (
+        db.session.query(ShowListing.id, ShowListing.artist_id,
+                         ShowListing.venue_id, ShowListing.start_time,
+                         ShowListing.artist_name,
+                         ShowListing.artist_image_link,
+                         ShowListing.venue_name)
+        .order_by(ShowListing.id)
+        .yield_per(current_app.config['STREAM_BATCH_SIZE'])
+    )
+
+
 #  ----------------------------------------------------------------
 #  Main
 #  ----------------------------------------------------------------
 
 
-@app.route('/')
+@main.route('/')
 def index():
     # Displays the home page
     error = False
@@ -222,9 +508,9 @@ def index():
 
     try:
         recent_listings = getRecentListings()
-    except Exception as e:
+    except Exception:
         error = True
-        print('Exception', e)
+        logger.exception('Could not load the home page.')
     finally:
         db.session.close()
 
@@ -250,62 +536,83 @@ def index():
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues')
-def venues():
-    # Lists venues ordered by city and state.
-    error = False
+# This function returns the venues grouped by city and state, in the
+# format of the venues page.
+def getVenueAreas(time_now):
     venue_list = []
-    try:
-        # Sets a single time as now for all time based logic
-        time_now = datetime.now()
-        # Single query gets necessary venue information to avoid multiple
-        # queries in loops.
-        venue_query = (
-            Venue.query.with_entities(Venue.id, Venue.name,
-                                      Venue.city, Venue.state)
-            .order_by(Venue.name).all()
-        )
-        # Single query to return show all future show records to avoid multiple
-        # queries in loops.
-        show_query = Show.query.filter(Show.start_time > time_now).all()
+    # Single query gets necessary venue information to avoid multiple
+    # queries in loops.
+    venue_query = (
+        Venue.query.with_entities(Venue.id, Venue.name,
+                                  Venue.city, Venue.state)
+        .order_by(Venue.name).all()
+    )
+    # Single query to return show all future show records (or the show
+    # timelines) to avoid multiple queries in loops.
+    countUpcomingShows = getUpcomingShowCounter('venue_id', time_now)
 
-        locations = sorted(list(set([(record.city, record.state) for record
-                                in venue_query])), key=lambda x: (x[1], x[0]))
+    locations = sorted(list(set([(record.city, record.state) for record
+                            in venue_query])), key=lambda x: (x[1], x[0]))
 
-        for location in locations:
-            location_venues = []
+    for location in locations:
+        location_venues = []
 
-            for record in venue_query:
+        for record in venue_query:
 
-                if record.city == location[0] and (record.state ==
-                                                   location[1]):
+            if record.city == location[0] and (record.state ==
+                                               location[1]):
 
-                    num_shows = getShowCount(show_query, 'venue_id',
-                                             record.id)
+                num_shows = countUpcomingShows(record.id)
 
-                    location_venues.append({
-                        'id': record.id,
-                        'name': record.name,
-                        'num_upcoming_shows': num_shows
-                    })
+                location_venues.append({
+                    'id': record.id,
+                    'name': record.name,
+                    'num_upcoming_shows': num_shows
+                })
 
-            venue_list.append({
-                'city': location[0],
-                'state': location[1],
-                'venues': location_venues
-            })
-    except Exception as e:
+        venue_list.append({
+            'city': location[0],
+            'state': location[1],
+            'venues': location_venues
+        })
+    return venue_list
+
+
+@snapshots.page('venues', '/venues', Venue)
+def renderVenues():
+    venue_list = getVenueAreas(datetime.now())
+    if venue_list == []:
+        return None
+    return render_template('pages/venues.html', areas=venue_list)
+
+
+@main.route('/venues')
+def venues():
+    # Lists venues ordered by city and state.
+    snapshot = snapshots.snapshotResponse('venues')
+    if snapshot is not None:
+        return snapshot
+    if current_app.config['STREAM_LISTINGS']:
+        return streamListing('pages/venues.html', 'areas',
+                             iterVenueAreas(datetime.now()),
+                             'Venues', 'Venues')
+    error = False
+    venue_list = []
+    try:
+        # Sets a single time as now for all time based logic
+        venue_list = getVenueAreas(datetime.now())
+    except Exception:
         error = True
-        print('Exception', e)
+        logger.exception('Could not list venues.')
     finally:
         db.session.close()
 
     if error:
         flash('An error occured. Venues cannot be shown.')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     elif venue_list == []:
         flash('The Venues table in the database is empty.')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     else:
         return render_template('pages/venues.html', areas=venue_list)
 
@@ -314,94 +621,211 @@ def venues():
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/search', methods=['POST'])
+@main.route('/venues/search', methods=['POST'])
+@ratelimit.limited('search')
 def search_venues():
     # Returns search results for venues on keyword match.
     error = False
     try:
         search_term = request.form.get('search_term', '').strip()
         if search_term == '':
-            return redirect(url_for('venues'))
-        response = getKeywordResults(Venue, Venue.name, search_term,
-                                     shows_match_id='venue_id')
-    except Exception as e:
+            return redirect(url_for('.venues'))
+        response = searchRecords(Venue, Venue.name, search_term,
+                                 shows_match_id='venue_id')
+    except Exception:
         error = True
-        print('Exception: ', e)
+        logger.exception('Venue search failed.')
     finally:
         db.session.close()
     if error is True:
         flash('An error occurred. Search could not be completed')
-        return redirect(url_for('venues'))
+        return redirect(url_for('.venues'))
     else:
         return render_template('pages/search_venues.html', results=response,
                                search_term=request.form.get('search_term', ''))
 
 
+#  Venues near a place
+#  ----------------------------------------------------------------
+
+
+# This function returns a number parameter, or default if it is missing.
+# Raises ValueError if it isn't a finite number (e.g. "nan").
+def getFiniteParameter(args, name, default=None):
+    value = args.get(name)
+    if value is None:
+        return default
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f'{name} must be a finite number.')
+    return value
+
+
+# This function returns the center of a near search from the lat and lon
+# parameters, or from the city and state parameters through the
+# gazetteer. Returns None if neither gives a place.
+def getNearCenter(args):
+    latitude = getFiniteParameter(args, 'lat')
+    longitude = getFiniteParameter(args, 'lon')
+    if latitude is not None and longitude is not None:
+        if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+            return latitude, longitude
+        return None
+    return geo.geocode(args.get('city', '').strip(), args.get('state', ''))
+
+
+# This function returns the venues near the place in the request's
+# parameters: the k nearest if k is given, otherwise up to limit (at
+# most 200) within radius km (default 50). Returns None if the place
+# isn't known. Raises ValueError for parameters that aren't numbers.
+def getVenuesNearRequest(args):
+    center = getNearCenter(args)
+    if center is None:
+        return None
+    max_km = current_app.config['GEO_MAX_RADIUS_KM']
+    if args.get('k') is not None:
+        count = int(args['k'])
+        return geo.getVenuesNear(*center, count=min(max(count, 1), 100))
+    radius_km = min(max(getFiniteParameter(args, 'radius', 50), 0), max_km)
+    limit = int(args.get('limit', 50))
+    return geo.getVenuesNear(*center, radius_km=radius_km,
+                             limit=min(max(limit, 1), 200))
+
+
+@main.route('/venues/near')
+def venues_near():
+    # Lists the venues near a city, nearest first.
+    error = False
+    found = None
+    try:
+        found = getVenuesNearRequest(request.args)
+    except ValueError:
+        flash('Please enter numbers for the place and distance.')
+        return redirect(url_for('.venues'))
+    except Exception:
+        error = True
+        logger.exception('Venue near search failed.')
+    finally:
+        db.session.close()
+    if error:
+        flash('An error occurred. Search could not be completed')
+        return redirect(url_for('.venues'))
+    elif found is None:
+        flash('That place could not be found.')
+        return redirect(url_for('.venues'))
+    else:
+        return render_template('pages/venues_near.html', venues=found,
+                               city=request.args.get('city', ''),
+                               state=request.args.get('state', ''),
+                               radius=request.args.get('radius', '50'))
+
+
+@main.route('/api/venues/near')
+def api_venues_near():
+    # Returns the venues near lat/lon (or city/state) as JSON: the k
+    # nearest, or those within radius km.
+    try:
+        found = getVenuesNearRequest(request.args)
+    except ValueError as e:
+        return jsonify(success=False, message=str(e)), 400
+    except Exception:
+        logger.exception('Venue near search failed.')
+        return jsonify(success=False), 500
+    finally:
+        db.session.close()
+    if found is None:
+        return jsonify(success=False, message='Unknown place.'), 400
+    return jsonify(results=[dict(venue, image_link=thumbs.thumbUrl(
+        venue['image_link'])) for venue in found])
+
+
+@main.cli.command('locate-venues')
+def locate_venues():
+    # Geocodes the venues without a location from the gazetteer.
+    count = geo.locateVenues()
+    click.echo(f'Located {count} venues.')
+
+
 #  Show venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/<int:venue_id>')
+@main.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
     # Shows the venue page with the given venue_id
     error = False
     try:
         this_venue = getRecordAsDict(Venue, venue_id)
-    except Exception as e:
+    except Exception:
         error = True
-        print('Exception: ', e)
+        logger.exception('Could not load venue %s.', venue_id)
     finally:
         db.session.close()
     if error is True:
         flash('An error occurred. Venue with ID ' + str(venue_id) +
               ' could not be displayed.')
-        return redirect(url_for('venues'))
+        return redirect(url_for('.venues'))
     else:
         return render_template('pages/show_venue.html',
                                venue=this_venue)
 
 
+@main.route('/venues/<int:venue_id>/past-shows')
+def venue_past_shows(venue_id):
+    # Returns a page of the venue's past shows.
+    return pastShowsResponse(Venue, venue_id)
+
+
 #  Create venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
     # Renders the create venue form.
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     # Adds new venue record to database.
     form = VenueForm()
     error = False
+    key = idempotency.requestKey()
 
     try:
-        if not form.validate():
+        # A repeated submission is answered like the first one was.
+        repeated = idempotency.isDone('venue', key)
+        if not repeated and not form.validate():
             return render_template('forms/new_venue.html', form=form)
 
-        this_venue = Venue(
-            name=form.name.data.strip(),
-            genres=','.join(form.genres.data),
-            city=form.city.data.strip(),
-            state=form.state.data,
-            address=form.address.data.strip(),
-            phone=format_phone(form.phone.data),
-            image_link=form.image_link.data,
-            facebook_link=form.facebook_link.data,
-            website=form.website.data,
-            seeking_talent=form.seeking_talent.data,
-            seeking_description=form.seeking_description.data
-        )
+        if not repeated and idempotency.claim('venue', key):
+            venue_id = insertNamed(Venue, {
+                'name': form.name.data.strip(),
+                'genres': ','.join(form.genres.data),
+                'city': form.city.data.strip(),
+                'state': form.state.data,
+                'address': form.address.data.strip(),
+                'phone': format_phone(form.phone.data),
+                'image_link': form.image_link.data,
+                'facebook_link': form.facebook_link.data,
+                'website': form.website.data,
+                'seeking_talent': form.seeking_talent.data,
+                'seeking_description': form.seeking_description.data,
+                **geo.venueLocation(form.city.data, form.state.data)
+            })
+            if venue_id is None:
+                form.name.errors.append(venue_name_error)
+                return render_template('forms/new_venue.html',
+                                       form=form)
 
-        db.session.add(this_venue)
+            hooks.recordChanged(Venue, [venue_id], 'create')
         db.session.commit()
-    except Exception as e:
+    except Exception:
         error = True
         db.session.rollback()
-        print('Exception: ', e)
+        logger.exception('Could not create venue.')
     finally:
         db.session.close()
     if error:
@@ -410,108 +834,139 @@ def create_venue_submission():
         return render_template('forms/new_venue.html', form=form)
     else:
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
 
 
 #  Edit venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     # Populates form with venue record from database.
     error = False
 
     try:
         this_venue = getRecordAsDict(Venue, venue_id)
-    except Exception as e:
+    except Exception:
         error = True
-        print('Exception: ', e)
+        logger.exception('Could not load venue %s for editing.', venue_id)
     finally:
         db.session.close()
     if error is True:
         flash('An error occurred. Venue with ID ' + str(venue_id) +
               ' could not be edited.')
-        return redirect(url_for('show_venue', venue_id=venue_id))
+        return redirect(url_for('.show_venue', venue_id=venue_id))
     else:
         form = VenueForm(data=this_venue)
-        return render_template('forms/edit_venue.html', form=form,
-                               venue=this_venue)
+        return renderVersioned('venue', this_venue, 'forms/edit_venue.html',
+                               form=form, venue=this_venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     # Edits venue record in database.
     form = VenueForm()
     error = False
+    updated = False
 
     try:
-        this_venue = Venue.query.get(venue_id)
-
         if not form.validate():
+            this_venue = getRecord(Venue, venue_id)
             return render_template('forms/edit_venue.html', form=form,
                                    venue=this_venue)
 
-        this_venue.name = form.name.data
-        this_venue.genres = ','.join(form.genres.data)
-        this_venue.city = form.city.data.strip()
-        this_venue.state = form.state.data
-        this_venue.address = form.address.data.strip()
-        this_venue.phone = format_phone(form.phone.data)
-        this_venue.image_link = form.image_link.data
-        this_venue.facebook_link = form.facebook_link.data
-        this_venue.website = form.website.data
-        this_venue.seeking_talent = form.seeking_talent.data
-        this_venue.seeking_description = form.seeking_description.data
-
-        db.session.add(this_venue)
+        updated = updateVersioned(Venue, venue_id, form.version.data, {
+            'name': form.name.data.strip(),
+            'genres': ','.join(form.genres.data),
+            'city': form.city.data.strip(),
+            'state': form.state.data,
+            'address': form.address.data.strip(),
+            'phone': format_phone(form.phone.data),
+            'image_link': form.image_link.data,
+            'facebook_link': form.facebook_link.data,
+            'website': form.website.data,
+            'seeking_talent': form.seeking_talent.data,
+            'seeking_description': form.seeking_description.data,
+            **geo.venueLocation(form.city.data, form.state.data)
+        })
+        if updated:
+            hooks.recordChanged(Venue, [venue_id], 'edit')
         db.session.commit()
 
-    except Exception as e:
+    except IntegrityError as e:
+        db.session.rollback()
+        if not isNameConflict(e, Venue):
+            error = True
+            logger.exception('Could not edit venue %s.', venue_id)
+        else:
+            form.name.errors.append(venue_name_error)
+            return render_template('forms/edit_venue.html', form=form,
+                                   venue=getRecord(Venue, venue_id))
+    except Exception:
         error = True
         db.session.rollback()
-        print('Exception: ', e)
+        logger.exception('Could not edit venue %s.', venue_id)
     finally:
         db.session.close()
     if error:
         flash('An error occurred. Venue ' + request.form['name'] +
               ' could not be edited.')
+    elif not updated:
+        flash('Venue ' + request.form['name'] + ' was changed by someone '
+              'else while you were editing. Please review the latest '
+              'version and try again.')
+        return redirect(url_for('.edit_venue', venue_id=venue_id))
     else:
         flash('Venue ' + request.form['name'] + ' was successfully edited!')
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('.show_venue', venue_id=venue_id))
 
 
 #  Delete venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@main.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     # Deletes a venue from the database.
     error = False
+    this_venue = None
 
     try:
-        this_venue = Venue.query.get(venue_id)
-        this_venue_name = this_venue.name
-        db.session.delete(this_venue)
+        deleteShowsOf(Venue, [venue_id])
+        this_venue = db.session.execute(
+            db.delete(Venue).where(Venue.id == venue_id)
+            .returning(Venue.id, Venue.name)
+        ).first()
+        if this_venue is not None:
+            hooks.recordChanged(Venue, [this_venue.id], 'delete')
         db.session.commit()
-    except Exception as e:
+    except Exception:
         error = True
         db.session.rollback()
-        print('Exception: ', e)
+        logger.exception('Could not delete venue %s.', venue_id)
     finally:
         db.session.close()
 
     if error:
-        flash('An error occurred. Venue ' + this_venue_name +
+        flash('An error occurred. Venue with ID ' + str(venue_id) +
               ' could not be deleted.')
         return jsonify(success=False), 500
+    elif this_venue is None:
+        flash('Venue with ID ' + str(venue_id) + ' was not found.')
+        return jsonify(success=False), 404
     else:
-        flash('Venue ' + this_venue_name + ' was successfully deleted!')
+        flash('Venue ' + this_venue.name + ' was successfully deleted!')
 
     return jsonify(success=True), 200
 
 
+@main.route('/venues', methods=['DELETE'])
+def delete_venues():
+    # Deletes the venues matching a list of IDs or a filter.
+    return bulkDeleteResponse(Venue)
+
+
 #  ----------------------------------------------------------------
 #  Artists
 #  ----------------------------------------------------------------
@@ -521,33 +976,50 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists')
+# This function returns the artists in the format of the artists page.
+def getArtistList():
+    artists_query = Artist.query.with_entities(Artist.id,
+                                               Artist.name).all()
+    return [{
+        "id": record.id,
+        "name": record.name,
+    } for record in artists_query]
+
+
+@snapshots.page('artists', '/artists', Artist)
+def renderArtists():
+    artist_list = getArtistList()
+    if artist_list == []:
+        return None
+    return render_template('pages/artists.html', artists=artist_list)
+
+
+@main.route('/artists')
 def artists():
     # Lists artist records in the database.
+    snapshot = snapshots.snapshotResponse('artists')
+    if snapshot is not None:
+        return snapshot
+    if current_app.config['STREAM_LISTINGS']:
+        return streamListing('pages/artists.html', 'artists', iterArtists(),
+                             'Artists', 'Artist')
     error = False
     artist_list = []
 
     try:
-        artists_query = Artist.query.with_entities(Artist.id,
-                                                   Artist.name).all()
-
-        for record in artists_query:
-            artist_list.append({
-                "id": record.id,
-                "name": record.name,
-            })
-    except Exception as e:
+        artist_list = getArtistList()
+    except Exception:
         error = True
-        print('Exception : ', e)
+        logger.exception('Could not list artists.')
     finally:
         db.session.close()
 
     if error:
         flash('An error occured. Artists cannot be shown.')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     elif artist_list == []:
         flash('The Artist table in the database is empty.')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     else:
         return render_template('pages/artists.html', artists=artist_list)
 
@@ -556,23 +1028,24 @@ def artists():
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/search', methods=['POST'])
+@main.route('/artists/search', methods=['POST'])
+@ratelimit.limited('search')
 def search_artists():
     # Returns search results for venues on keyword match.
     error = False
     try:
         search_term = request.form.get('search_term', '').strip()
         if search_term == '':
-            return redirect(url_for('artists'))
-        response = getKeywordResults(Artist, Artist.name, search_term)
-    except Exception as e:
+            return redirect(url_for('.artists'))
+        response = searchRecords(Artist, Artist.name, search_term)
+    except Exception:
         error = True
-        print('Exception: ', e)
+        logger.exception('Artist search failed.')
     finally:
         db.session.close()
     if error is True:
         flash('An error occurred. Search could not be completed')
-        return redirect(url_for('artists'))
+        return redirect(url_for('.artists'))
     else:
         return render_template('pages/search_artists.html', results=response,
                                search_term=request.form.get('search_term', ''))
@@ -582,70 +1055,85 @@ def search_artists():
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/<int:artist_id>')
+@main.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
     error = False
 
     try:
         this_artist = getRecordAsDict(Artist, artist_id)
-    except Exception as e:
+    except Exception:
         error = True
-        print('Exception: ', e)
+        logger.exception('Could not load artist %s.', artist_id)
     finally:
         db.session.close()
     if error is True:
         flash('An error occurred. Artist with ID ' + str(artist_id) +
               ' could not be displayed.')
-        return redirect(url_for('artists'))
+        return redirect(url_for('.artists'))
     else:
         return render_template('pages/show_artist.html',
                                artist=this_artist)
 
 
+@main.route('/artists/<int:artist_id>/past-shows')
+def artist_past_shows(artist_id):
+    # Returns a page of the artist's past shows.
+    return pastShowsResponse(Artist, artist_id)
+
+
 #  Create artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
     # Renders the new artist form.
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     # Adds new artist record to the database.
     form = ArtistForm()
     error = False
+    key = idempotency.requestKey()
+
     try:
-        if not form.validate():
+        # A repeated submission is answered like the first one was.
+        repeated = idempotency.isDone('artist', key)
+        if not repeated and not form.validate():
             return render_template('forms/new_artist.html', form=form)
 
-        this_artist = Artist(
-            name=form.name.data.strip(),
-            genres=','.join(form.genres.data),
-            city=form.city.data.strip(),
-            state=form.state.data,
-            phone=format_phone(form.phone.data),
-            image_link=form.image_link.data,
-            facebook_link=form.facebook_link.data,
-            website=form.website.data,
-            seeking_venue=form.seeking_venue.data,
-            seeking_description=form.seeking_description.data,
-            available_start=validate.stringToDateTime(
-                form.available_start.data.strip()),
-            available_end=validate.stringToDateTime(
-                form.available_end.data.strip())
-        )
+        if not repeated and idempotency.claim('artist', key):
+            artist_id = insertNamed(Artist, {
+                'name': form.name.data.strip(),
+                'genres': ','.join(form.genres.data),
+                'city': form.city.data.strip(),
+                'state': form.state.data,
+                'phone': format_phone(form.phone.data),
+                'image_link': form.image_link.data,
+                'facebook_link': form.facebook_link.data,
+                'website': form.website.data,
+                'seeking_venue': form.seeking_venue.data,
+                'seeking_description': form.seeking_description.data,
+                'available_start': stringToDateTime(
+                    form.available_start.data.strip()),
+                'available_end': stringToDateTime(
+                    form.available_end.data.strip())
+            })
+            if artist_id is None:
+                form.name.errors.append(artist_name_error)
+                return render_template('forms/new_artist.html',
+                                       form=form)
 
-        db.session.add(this_artist)
+            hooks.recordChanged(Artist, [artist_id], 'create')
         db.session.commit()
-    except Exception as e:
+    except Exception:
         error = True
         db.session.rollback()
-        print('Exception: ', e)
+        logger.exception('Could not create artist.')
     finally:
         db.session.close()
     if error:
@@ -654,14 +1142,14 @@ def create_artist_submission():
         return render_template('forms/new_artist.html', form=form)
     else:
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
 
 
 #  Edit artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     # Populates form with artist record from database.
     form = ArtistForm()
@@ -669,97 +1157,128 @@ def edit_artist(artist_id):
 
     try:
         this_artist = getRecordAsDict(Artist, artist_id)
-    except Exception as e:
+    except Exception:
         error = True
-        print('Exception: ', e)
+        logger.exception('Could not load artist %s for editing.', artist_id)
     finally:
         db.session.close()
     if error is True:
         flash('An error occurred. Artist with ID ' + str(artist_id) +
               ' could not be edited.')
-        return redirect(url_for('show_artist', artist_id=artist_id))
+        return redirect(url_for('.show_artist', artist_id=artist_id))
     else:
         form = ArtistForm(data=this_artist)
-        return render_template('forms/edit_artist.html', form=form,
+        return renderVersioned('artist', this_artist,
+                               'forms/edit_artist.html', form=form,
                                artist=this_artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     # Edits venue record in database.
     form = ArtistForm()
     error = False
+    updated = False
 
     try:
-        this_artist = Artist.query.get(artist_id)
-
         if not form.validate():
+            this_artist = getRecord(Artist, artist_id)
             return render_template('forms/edit_artist.html', form=form,
                                    artist=this_artist)
 
-        this_artist.name = form.name.data
-        this_artist.genres = ','.join(form.genres.data)
-        this_artist.city = form.city.data.strip()
-        this_artist.state = form.state.data
-        this_artist.phone = format_phone(form.phone.data)
-        this_artist.image_link = form.image_link.data
-        this_artist.facebook_link = form.facebook_link.data
-        this_artist.website = form.website.data
-        this_artist.seeking_venue = form.seeking_venue.data
-        this_artist.seeking_description = form.seeking_description.data
-        this_artist.available_start = validate.stringToDateTime(
-            form.available_start.data.strip())
-        this_artist.available_end = validate.stringToDateTime(
-            form.available_end.data.strip())
-
-        db.session.add(this_artist)
+        updated = updateVersioned(Artist, artist_id, form.version.data, {
+            'name': form.name.data.strip(),
+            'genres': ','.join(form.genres.data),
+            'city': form.city.data.strip(),
+            'state': form.state.data,
+            'phone': format_phone(form.phone.data),
+            'image_link': form.image_link.data,
+            'facebook_link': form.facebook_link.data,
+            'website': form.website.data,
+            'seeking_venue': form.seeking_venue.data,
+            'seeking_description': form.seeking_description.data,
+            'available_start': stringToDateTime(
+                form.available_start.data.strip()),
+            'available_end': stringToDateTime(
+                form.available_end.data.strip())
+        })
+        if updated:
+            hooks.recordChanged(Artist, [artist_id], 'edit')
         db.session.commit()
 
-    except Exception as e:
+    except IntegrityError as e:
+        db.session.rollback()
+        if not isNameConflict(e, Artist):
+            error = True
+            logger.exception('Could not edit artist %s.', artist_id)
+        else:
+            form.name.errors.append(artist_name_error)
+            return render_template('forms/edit_artist.html', form=form,
+                                   artist=getRecord(Artist, artist_id))
+    except Exception:
         error = True
         db.session.rollback()
-        print('Exception ', e)
+        logger.exception('Could not edit artist %s.', artist_id)
     finally:
         db.session.close()
     if error:
         flash('An error occurred. Artist ' + request.form['name'] +
               ' could not be edited.')
+    elif not updated:
+        flash('Artist ' + request.form['name'] + ' was changed by someone '
+              'else while you were editing. Please review the latest '
+              'version and try again.')
+        return redirect(url_for('.edit_artist', artist_id=artist_id))
     else:
         flash('Artist ' + request.form['name'] + ' was successfully edited!')
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('.show_artist', artist_id=artist_id))
 
 
 #  Delete artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/<artist_id>', methods=['DELETE'])
+@main.route('/artists/<artist_id>', methods=['DELETE'])
 def delete_artist(artist_id):
     # Deletes an artist from the database.
     error = False
+    this_artist = None
 
     try:
-        this_artist = Artist.query.get(artist_id)
-        this_artist_name = this_artist.name
-        db.session.delete(this_artist)
+        deleteShowsOf(Artist, [artist_id])
+        this_artist = db.session.execute(
+            db.delete(Artist).where(Artist.id == artist_id)
+            .returning(Artist.id, Artist.name)
+        ).first()
+        if this_artist is not None:
+            hooks.recordChanged(Artist, [this_artist.id], 'delete')
         db.session.commit()
-    except Exception as e:
+    except Exception:
         error = True
         db.session.rollback()
-        print('Exception: ', e)
+        logger.exception('Could not delete artist %s.', artist_id)
     finally:
         db.session.close()
 
     if error:
-        flash('An error occurred. Artist ' + this_artist_name +
+        flash('An error occurred. Artist with ID ' + str(artist_id) +
               ' could not be deleted.')
         return jsonify(success=False), 500
+    elif this_artist is None:
+        flash('Artist with ID ' + str(artist_id) + ' was not found.')
+        return jsonify(success=False), 404
     else:
-        flash('Artist ' + this_artist_name + ' was successfully deleted!')
+        flash('Artist ' + this_artist.name + ' was successfully deleted!')
 
     return jsonify(success=True), 200
 
 
+@main.route('/artists', methods=['DELETE'])
+def delete_artists():
+    # Deletes the artists matching a list of IDs or a filter.
+    return bulkDeleteResponse(Artist)
+
+
 # -----------------------------------------------------------------
 #  Shows
 #  ----------------------------------------------------------------
@@ -769,25 +1288,28 @@ def delete_artist(artist_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/shows')
+@main.route('/shows')
 def shows():
     # displays list of shows at /shows
+    if current_app.config['STREAM_LISTINGS']:
+        return streamListing('pages/shows.html', 'shows', iterShows(),
+                             'Shows', 'Show')
     error = False
 
     try:
         show_list = getShowList()
-    except Exception as e:
+    except Exception:
         error = True
-        print('Exception', e)
+        logger.exception('Could not list shows.')
     finally:
         db.session.close()
 
     if error:
         flash('An error occured. Shows cannot be shown.')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     elif show_list == []:
         flash('The Show table in the database is empty.')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     else:
         return render_template('pages/shows.html', shows=show_list)
 
@@ -796,34 +1318,44 @@ def shows():
 #  ----------------------------------------------------------------
 
 
-@app.route('/shows/create')
+@main.route('/shows/create')
 def create_shows():
     # Renders the new show form.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
     # Creates new show record in the database.
     form = ShowForm()
     error = False
+    key = idempotency.requestKey()
+
     try:
-        if not form.validate():
+        # A repeated submission is answered like the first one was.
+        repeated = idempotency.isDone('show', key)
+        if not repeated and not form.validate():
             return render_template('forms/new_show.html', form=form)
 
-        this_show = Show(
-            artist_id=form.artist_id.data,
-            venue_id=form.venue_id.data,
-            start_time=validate.stringToDateTime(form.start_time.data.strip())
-        )
-
-        db.session.add(this_show)
+        if not repeated and idempotency.claim('show', key):
+            # No ID is returned if the same show was listed meanwhile.
+            show_id = db.session.execute(
+                dialectInsert(Show).values(
+                    artist_id=form.artist_id.data,
+                    venue_id=form.venue_id.data,
+                    start_time=stringToDateTime(form.start_time.data.strip())
+                ).on_conflict_do_nothing(
+                    index_elements=['artist_id', 'venue_id', 'start_time']
+                ).returning(Show.id)
+            ).scalar()
+            if show_id is not None:
+                hooks.recordChanged(Show, [show_id], 'create')
         db.session.commit()
-    except Exception as e:
+    except Exception:
         error = True
         db.session.rollback()
-        print('Exception: ', e)
+        logger.exception('Could not create show.')
     finally:
         db.session.close()
     if error:
@@ -831,140 +1363,312 @@ def create_show_submission():
         return render_template('forms/new_show.html', form=form)
     else:
         flash('Show was successfully listed!')
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
 
 
 #  Edit show
 #  ----------------------------------------------------------------
 
 
-@app.route('/shows/<int:show_id>/edit', methods=['GET'])
+@main.route('/shows/<int:show_id>/edit', methods=['GET'])
 def edit_show(show_id):
     # Populates form with show record from database.
     error = False
 
     try:
         this_show = getRecordAsDict(Show, show_id)
-    except Exception as e:
+    except Exception:
         error = True
-        print('Exception: ', e)
+        logger.exception('Could not load show %s for editing.', show_id)
     finally:
         db.session.close()
     if error is True:
         flash('An error occurred. Venue with ID ' + str(show_id) +
               ' could not be edited.')
-        # return redirect(url_for('show_venue', show_id=show_id))
+        # return redirect(url_for('.show_venue', show_id=show_id))
     else:
         form = ShowForm(data=this_show)
-        return render_template('forms/edit_show.html', form=form,
-                               show=this_show)
+        return renderVersioned('show', this_show, 'forms/edit_show.html',
+                               form=form, show=this_show)
 
 
-@app.route('/shows/<int:show_id>/edit', methods=['POST'])
+@main.route('/shows/<int:show_id>/edit', methods=['POST'])
 def edit_show_submission(show_id):
     # Edits venue record in database.
     form = ShowForm()
     error = False
+    updated = False
 
     try:
-        this_show = Show.query.get(show_id)
-
         if not form.validate():
+            this_show = getRecord(Show, show_id)
             return render_template('forms/edit_show.html', form=form,
                                    show=this_show)
 
-        this_show.artist_id = form.artist_id.data
-        this_show.venue_id = form.venue_id.data
-        this_show.start_time = validate.stringToDateTime(
-            form.start_time.data.strip())
-
-        db.session.add(this_show)
+        updated = updateVersioned(Show, show_id, form.version.data, {
+            'artist_id': form.artist_id.data,
+            'venue_id': form.venue_id.data,
+            'start_time': stringToDateTime(
+                form.start_time.data.strip())
+        })
+        if updated:
+            hooks.recordChanged(Show, [show_id], 'edit')
         db.session.commit()
 
-    except Exception as e:
+    except Exception:
         error = True
         db.session.rollback()
-        print('Exception: ', e)
+        logger.exception('Could not edit show %s.', show_id)
     finally:
         db.session.close()
     if error:
         flash('An error occurred. Show with ID ' + str(show_id) +
               ' could not be edited.')
+    elif not updated:
+        flash('Show with ID ' + str(show_id) + ' was changed by someone '
+              'else while you were editing. Please review the latest '
+              'version and try again.')
+        return redirect(url_for('.edit_show', show_id=show_id))
     else:
         flash('Show with ID ' + str(show_id) + ' was successfully edited!')
-    return redirect(url_for('shows'))
+    return redirect(url_for('.shows'))
 
 
 #  Delete show
 #  ----------------------------------------------------------------
 
 
-@app.route('/shows/<show_id>', methods=['DELETE'])
+@main.route('/shows/<show_id>', methods=['DELETE'])
 def delete_show(show_id):
     # Deletes a venue from the database.
     error = False
+    this_show = None
     try:
-        this_show = Show.query.get(show_id)
-        this_show_id = this_show.id
-        db.session.delete(this_show)
+        this_show = db.session.execute(
+            db.delete(Show).where(Show.id == show_id).returning(Show.id)
+        ).first()
+        if this_show is not None:
+            hooks.recordChanged(Show, [this_show.id], 'delete')
         db.session.commit()
-    except Exception as e:
+    except Exception:
         error = True
         db.session.rollback()
-        print('Exception: ', e)
+        logger.exception('Could not delete show %s.', show_id)
     finally:
         db.session.close()
 
     if error:
-        flash('An error occurred. Show with ID ' + str(this_show_id) +
+        flash('An error occurred. Show with ID ' + str(show_id) +
               ' could not be deleted.')
         return jsonify(success=False), 500
+    elif this_show is None:
+        flash('Show with ID ' + str(show_id) + ' was not found.')
+        return jsonify(success=False), 404
     else:
-        flash('Show with ID ' + str(this_show_id) +
+        flash('Show with ID ' + str(show_id) +
               ' was successfully deleted!')
 
     return jsonify(success=True), 200
 
 
+@main.route('/shows', methods=['DELETE'])
+def delete_shows():
+    # Deletes the shows matching a list of IDs or a filter
+    # (e.g. {"filter": {"start_time_before": "2020-01-01 00:00"}}).
+    return bulkDeleteResponse(Show)
+
+
+# -----------------------------------------------------------------
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+
+@main.route('/api/autocomplete/<any(artists, venues):kind>')
+def autocomplete(kind):
+    # Returns the artists or venues with a word in their name starting
+    # with the q parameter, for the typeahead on the show forms.
+    limit = min(request.args.get('limit', 10, type=int), 20)
+    try:
+        found = nameindex.getIndexes().search(
+            kind, request.args.get('q', ''), limit)
+    finally:
+        db.session.close()
+    return jsonify(results=[{
+        'id': record_id,
+        'name': name,
+        'image_link': thumbs.thumbUrl(image_link)
+    } for record_id, name, image_link in found])
+
+
+# -----------------------------------------------------------------
+#  Change events
+#  ----------------------------------------------------------------
+
+
+@main.route('/events')
+def change_events():
+    # Streams venue, artist and show changes as server-sent events, if
+    # live events are on.
+    if not current_app.config['LIVE_EVENTS']:
+        return not_found_error(None)
+    try:
+        return events.streamResponse(request.headers.get('Last-Event-ID'))
+    finally:
+        db.session.close()
+
+
+# -----------------------------------------------------------------
+#  Change feed
+#  ----------------------------------------------------------------
+
+
+@main.route('/api/changes')
+def api_changes():
+    # Returns the venue, artist and show changes after the since ID, in
+    # batches of limit. Pass "next" back as since for the next batch.
+    # Operations are create, edit, delete, and archive for shows moved
+    # to the archive (still shown as past shows).
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get(
+        'limit', current_app.config['CHANGES_PAGE_SIZE'], type=int), 1),
+        current_app.config['CHANGES_MAX_PAGE_SIZE'])
+    try:
+        changes, more = changelog.getChanges(since, limit)
+    finally:
+        db.session.close()
+    return jsonify(changes=[dict(change, changed_at=(
+        change['changed_at'].isoformat() + 'Z')) for change in changes],
+        next=changes[-1]['id'] if changes else since, more=more)
+
+
+@main.cli.command('compact-changes')
+def compact_changes():
+    # Queues the job compacting old change log entries.
+    changelog.enqueueCompaction()
+    click.echo('Queued the change log compaction job.')
+
+
+# -----------------------------------------------------------------
+#  Static assets and HTTP caching
+#  ----------------------------------------------------------------
+
+
+@main.route('/assets/<path:filename>')
+def asset(filename):
+    # Serves fingerprinted static files built by "flask build-assets".
+    return assets.sendAsset(current_app.config['ASSETS_DIST_DIR'], filename)
+
+
+@main.cli.command('build-assets')
+def build_assets():
+    # Fingerprints and precompresses the files under static/.
+    manifest = assets.buildAssets(current_app.static_folder,
+                                  current_app.config['ASSETS_DIST_DIR'],
+                                  current_app.config['ASSETS_KEPT_BUILDS'])
+    click.echo(f'Built {len(manifest)} assets.')
+
+
+@main.route('/thumbs/<key>')
+def thumbnail(key):
+    # Serves a resized image built by the thumbnail job.
+    return thumbs.sendThumbnail(key)
+
+
+@main.cli.command('build-thumbnails')
+def build_thumbnails():
+    # Queues thumbnail jobs for all venue and artist images.
+    count = thumbs.enqueueAllThumbnails()
+    click.echo(f'Queued thumbnails for {count} images.')
+
+
+@main.cli.command('maintain-partitions')
+def maintain_partitions():
+    # Creates the upcoming Show partitions and detaches the old ones.
+    created, detached = partitions.maintainPartitions()
+    click.echo(f'Created {len(created)} and detached {len(detached)} '
+           f'partitions.')
+
+
+@main.cli.command('render-snapshots')
+def render_snapshots():
+    # Renders the directory page snapshots now.
+    for name in snapshots.pages:
+        snapshots.markStale(name)
+        db.session.commit()
+        snapshots.renderSnapshot(name)
+    click.echo(f'Rendered {len(snapshots.pages)} page snapshots.')
+
+
+@main.cli.command('archive-shows')
+def archive_shows():
+    # Queues the job moving old shows to the archive.
+    archive.enqueueArchive()
+    click.echo('Queued the show archive job.')
+
+
+@main.after_app_request
+def conditional_get(response):
+    # Tags rendered pages with an ETag so browsers can revalidate them
+    # and get a 304 when nothing changed. Streamed pages are skipped.
+    if (request.method == 'GET' and response.status_code == 200 and
+            response.mimetype == 'text/html' and
+            not response.is_streamed):
+        response.add_etag()
+        response.headers.setdefault('Cache-Control', 'no-cache')
+        response.make_conditional(request)
+    return response
+
+
+# -----------------------------------------------------------------
+#  Metrics
+#  ----------------------------------------------------------------
+
+
+@main.route('/metrics/jobs')
+def job_metrics():
+    # Returns job queue depth and latency.
+    try:
+        stats = jobs.queueStats()
+    finally:
+        db.session.close()
+    return jsonify(stats)
+
+
+# -----------------------------------------------------------------
+#  Readiness
+#  ----------------------------------------------------------------
+
+
+@main.route('/ready')
+def readiness():
+    # Reports ready once templates and queries have been warmed up.
+    if warmup.ready.is_set():
+        return jsonify(ready=True), 200
+    return jsonify(ready=False), 503
+
+
 # -----------------------------------------------------------------
 #  Error handlers
 #  ----------------------------------------------------------------
 
 
-@app.errorhandler(404)
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s' +
-                  ' [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
-
 """--------------------------------------------------------------------------#
 # Launch.
 #--------------------------------------------------------------------------"""
 
 
-# Default port:
-if __name__ == '__main__':
-    app.run()
-
-# Or specify port manually:
-'''
+# Development server. In production the app is served by gunicorn, see
+# gunicorn.conf.py and wsgi.py:
+#   gunicorn -c gunicorn.conf.py wsgi:app
 if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
-'''
+    create_app().run()
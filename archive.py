@@ -0,0 +1,157 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import datetime
+from flask import current_app
+import hooks
+import jobs
+import listing
+from models import (db, Show, ShowArchive, ShowListing, Venue,
+                    Artist)
+
+
+"""--------------------------------------------------------------------------#
+# Show archive
+#
+# The shows.archive job moves shows that started more than
+# SHOW_ARCHIVE_DAYS ago from Show to ShowArchive, SHOW_ARCHIVE_BATCH at
+# a time, so the Show table and its indexes only hold recent and
+# upcoming shows. "flask archive-shows" queues it (once a day at most),
+# run it e.g. from cron. Detail pages list past shows from both tables.
+# --------------------------------------------------------------------------"""
+
+
+#  ----------------------------------------------------------------
+#  Archiving
+#  ----------------------------------------------------------------
+
+
+# Function moves up to batch_size shows that started before the given
+# time to the archive, and returns how many it moved. Shows another
+# worker is moving are skipped (SKIP LOCKED, ignored on SQLite).
+def archiveShows(before, batch_size):
+    show_ids = db.session.execute(
+        db.select(Show.id)
+        .where(Show.start_time < before)
+        .order_by(Show.start_time).limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not show_ids:
+        db.session.rollback()
+        return 0
+    db.session.execute(
+        db.insert(ShowArchive).from_select(
+            ['id', 'artist_id', 'venue_id', 'start_time'],
+            db.select(Show.id, Show.artist_id, Show.venue_id,
+                      Show.start_time)
+            .where(Show.id.in_(show_ids)))
+    )
+    db.session.execute(db.delete(Show).where(Show.id.in_(show_ids)))
+    # For the rest of the app the shows are gone from Show, but they still
+    # happened, so they are archived rather than deleted.
+    hooks.recordChanged(Show, show_ids, 'archive')
+    db.session.commit()
+    return len(show_ids)
+
+
+@jobs.handler('shows.archive')
+def archiveShowsJob(payload):
+    config = current_app.config
+    before = (datetime.datetime.now() -
+              datetime.timedelta(days=config['SHOW_ARCHIVE_DAYS']))
+    while archiveShows(before, config['SHOW_ARCHIVE_BATCH']):
+        pass
+
+
+def enqueueArchive():
+    jobs.enqueue('shows.archive',
+                 key=f'shows.archive:{datetime.date.today().isoformat()}')
+    db.session.commit()
+
+
+#  ----------------------------------------------------------------
+#  Past shows
+#  ----------------------------------------------------------------
+
+
+# Past shows of a venue or artist are read from the show listing and
+# ShowArchive together, newest first, a page at a time. The listing,
+# Show and ShowArchive have an index on (venue_id or artist_id,
+# start_time, id), so a page reads a short index range of each and the
+# count reads the Show and ShowArchive indexes alone, however long the
+# history is.
+
+
+def recordColumn(source, table):
+    return source.venue_id if table is Venue else source.artist_id
+
+
+def countPastShows(table, record_id, time_now):
+    counts = [
+        db.select(db.func.count()).select_from(source)
+        .where(recordColumn(source, table) == record_id,
+               source.start_time <= time_now)
+        .scalar_subquery()
+        for source in (Show, ShowArchive)
+    ]
+    return db.session.execute(db.select(counts[0] + counts[1])).scalar()
+
+
+# Cursors point at the last show of a page, as "<start time>,<id>".
+def makeCursor(start_time, show_id):
+    return f'{start_time.isoformat()},{show_id}'
+
+
+# Function returns the (start time, id) of a cursor, or None for none.
+# Raises ValueError if the cursor is malformed.
+def parseCursor(cursor):
+    if not cursor:
+        return None
+    start_time, show_id = cursor.rsplit(',', 1)
+    return datetime.datetime.fromisoformat(start_time), int(show_id)
+
+
+# Function returns up to limit past shows of a venue or artist that come
+# after the cursor, newest first, with their artist's and venue's name
+# and image, and the cursor of the next page (None on the last page).
+# Shows still in Show are read from the show listing, archived ones are
+# joined to their artist and venue.
+def getPastShows(table, record_id, time_now, cursor=None, limit=12):
+    position = parseCursor(cursor)
+    pages = []
+    for source in (ShowListing, ShowArchive):
+        if source is ShowListing:
+            page = db.select(*listing.listing_columns)
+        else:
+            page = (
+                db.select(ShowArchive.id, ShowArchive.artist_id,
+                          ShowArchive.venue_id, ShowArchive.start_time,
+                          Artist.name.label('artist_name'),
+                          Artist.image_link.label('artist_image_link'),
+                          Venue.name.label('venue_name'),
+                          Venue.image_link.label('venue_image_link'))
+                .join(Artist, ShowArchive.artist_id == Artist.id)
+                .join(Venue, ShowArchive.venue_id == Venue.id)
+            )
+        page = (
+            page.where(recordColumn(source, table) == record_id,
+                       source.start_time <= time_now)
+            .order_by(source.start_time.desc(), source.id.desc())
+            .limit(limit + 1)
+        )
+        if position is not None:
+            page = page.where(db.tuple_(source.start_time,
+                                        source.id) < position)
+        pages.append(db.select(page.subquery()))
+    shows = db.union_all(*pages).subquery()
+    rows = db.session.execute(
+        db.select(shows)
+        .order_by(shows.c.start_time.desc(), shows.c.id.desc())
+        .limit(limit + 1)
+    ).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = makeCursor(rows[-1].start_time, rows[-1].id)
+    return [row._asdict() for row in rows], next_cursor
@@ -0,0 +1,220 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import os
+import re
+import gzip
+import json
+import hashlib
+import mimetypes
+from flask import request, send_from_directory, url_for
+
+
+"""--------------------------------------------------------------------------#
+# Static asset pipeline
+# --------------------------------------------------------------------------"""
+
+
+# Fingerprinted files never change, so they can be cached for a year.
+immutable_cache = 'public, max-age=31536000, immutable'
+manifest_name = 'manifest.json'
+# The files written by each recent build, oldest first.
+builds_name = 'builds.json'
+compressible = ('.css', '.js', '.map', '.svg', '.eot', '.otf', '.ttf',
+                '.txt', '.json', '.html')
+css_url = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+# Logical path (e.g. css/main.css) -> fingerprinted path, loaded from the
+# manifest, the manifest's modification time when it was loaded and a
+# hash of its content.
+_manifest = None
+_manifest_mtime = None
+_manifest_version = ''
+
+
+#  ----------------------------------------------------------------
+#  Build
+#  ----------------------------------------------------------------
+
+
+def fingerprint(relative_path, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, extension = os.path.splitext(relative_path)
+    return f'{stem}.{digest}{extension}'
+
+
+# Function points url() references in a stylesheet at the fingerprinted
+# files. References to files that are not in the manifest (external or
+# missing) are left as they are.
+def rewriteCss(relative_path, content, manifest):
+    css_dir = os.path.dirname(relative_path)
+    this_dir = os.path.dirname(manifest.get(relative_path, relative_path))
+
+    def replace(match):
+        quote, target = match.group(1), match.group(2)
+        if target.startswith(('data:', 'http:', 'https:', '//', '/')):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', target).groups()
+        logical = os.path.normpath(os.path.join(css_dir, path))
+        if logical not in manifest:
+            return match.group(0)
+        built = os.path.relpath(manifest[logical], this_dir or '.')
+        return f'url({quote}{built}{suffix}{quote})'
+
+    text = content.decode('utf-8')
+    return css_url.sub(replace, text).encode('utf-8')
+
+
+# Brotli is optional, without it only gzip variants are built. It is
+# imported here as only "flask build-assets" needs it. Returns the
+# paths of the variants written.
+def writeCompressed(path, content):
+    if not path.endswith(compressible):
+        return []
+    with gzip.open(path + '.gz', 'wb', compresslevel=9) as gz_file:
+        gz_file.write(content)
+    try:
+        import brotli
+    except ImportError:
+        return [path + '.gz']
+    with open(path + '.br', 'wb') as br_file:
+        br_file.write(brotli.compress(content))
+    return [path + '.gz', path + '.br']
+
+
+# Function writes the file through a temporary one, so readers see the
+# old or the new content and never a partly written file.
+def replaceJson(path, data):
+    with open(path + '.tmp', 'w') as json_file:
+        json.dump(data, json_file, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+# Function records the files of a build and deletes the files that none
+# of the last kept_builds builds wrote. Older builds' files stay until
+# then, for pages that were rendered (and cached or stored) before.
+def pruneBuilds(dist_dir, built_files, kept_builds):
+    path = os.path.join(dist_dir, builds_name)
+    try:
+        with open(path) as builds_file:
+            builds = json.load(builds_file)
+    except (OSError, ValueError):
+        builds = []
+    builds = (builds + [sorted(built_files)])[-kept_builds:]
+    replaceJson(path, builds)
+
+    kept = {name for build in builds for name in build}
+    kept.update((manifest_name, builds_name))
+    for root, dirs, files in os.walk(dist_dir):
+        for name in files:
+            file_path = os.path.join(root, name)
+            relative_path = (os.path.relpath(file_path, dist_dir)
+                             .replace(os.sep, '/'))
+            if relative_path not in kept:
+                os.remove(file_path)
+
+
+# Function copies every file under static_dir into dist_dir with a
+# content hash in its name, writes gzip and brotli variants next to it
+# and records the mapping in the manifest. Stylesheets are handled last
+# so the files they reference are already fingerprinted. The new files
+# are written next to the previous builds' and the manifest is swapped
+# in last, then files only the builds before the last kept_builds used
+# are deleted.
+def buildAssets(static_dir, dist_dir, kept_builds=5):
+    sources = []
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root).startswith(os.path.abspath(dist_dir)):
+            continue
+        for name in files:
+            path = os.path.join(root, name)
+            sources.append(os.path.relpath(path, static_dir)
+                           .replace(os.sep, '/'))
+    sources.sort(key=lambda path: (path.endswith('.css'), path))
+
+    manifest = {}
+    built_files = set()
+    for relative_path in sources:
+        with open(os.path.join(static_dir, relative_path), 'rb') as source:
+            content = source.read()
+        if relative_path.endswith('.css'):
+            content = rewriteCss(relative_path, content, manifest)
+        built = fingerprint(relative_path, content)
+        manifest[relative_path] = built
+        target = os.path.join(dist_dir, built)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as built_file:
+            built_file.write(content)
+        built_files.add(built)
+        built_files.update(os.path.relpath(variant, dist_dir)
+                           .replace(os.sep, '/')
+                           for variant in writeCompressed(target, content))
+
+    os.makedirs(dist_dir, exist_ok=True)
+    replaceJson(os.path.join(dist_dir, manifest_name), manifest)
+    pruneBuilds(dist_dir, built_files, kept_builds)
+    return manifest
+
+
+#  ----------------------------------------------------------------
+#  Serve
+#  ----------------------------------------------------------------
+
+
+# Function returns the manifest, reloading it when "flask build-assets"
+# has rewritten it. Without a manifest nothing is cached, so assets
+# built after the app started are picked up by the next request.
+def loadManifest(dist_dir):
+    global _manifest, _manifest_mtime, _manifest_version
+    path = os.path.join(dist_dir, manifest_name)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        _manifest, _manifest_mtime, _manifest_version = None, None, ''
+        return {}
+    if _manifest is None or mtime != _manifest_mtime:
+        try:
+            with open(path, 'rb') as manifest:
+                content = manifest.read()
+            _manifest = json.loads(content)
+        except (OSError, ValueError):
+            return {}
+        _manifest_mtime = mtime
+        _manifest_version = hashlib.sha256(content).hexdigest()[:32]
+    return _manifest
+
+
+# Function returns a hash of the current manifest ('' before assets are
+# built), which changes whenever a build changes an asset URL.
+def manifestVersion(dist_dir):
+    loadManifest(dist_dir)
+    return _manifest_version
+
+
+# Template global. Returns the fingerprinted URL of a static file once
+# assets have been built, and the plain static URL before that.
+def assetUrl(filename, dist_dir):
+    built = loadManifest(dist_dir).get(filename)
+    if built is None:
+        return url_for('static', filename=filename)
+    return url_for('main.asset', filename=built)
+
+
+# Function sends a fingerprinted file, choosing the brotli or gzip
+# variant when the client accepts it.
+def sendAsset(dist_dir, filename):
+    mimetype = mimetypes.guess_type(filename)[0]
+    send_name, encoding = filename, None
+    for accepted, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if (request.accept_encodings[accepted] and
+                os.path.isfile(os.path.join(dist_dir, filename + suffix))):
+            send_name, encoding = filename + suffix, accepted
+            break
+
+    response = send_from_directory(dist_dir, send_name, mimetype=mimetype)
+    response.headers['Cache-Control'] = immutable_cache
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    return response
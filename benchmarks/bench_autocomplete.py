@@ -0,0 +1,80 @@
+"""--------------------------------------------------------------------------#
+# Benchmark: autocomplete lookups in the name index
+#
+# Builds a nameindex.NameIndex of NAME_COUNT generated names and times
+# prefix searches against a scan for the same matches (what an ILIKE
+# query does, minus the round trip), plus incremental adds and removes.
+#
+#   python benchmarks/bench_autocomplete.py [name count]
+# --------------------------------------------------------------------------"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import nameindex  # noqa: E402
+
+
+NAME_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+LOOKUPS = 2000
+LIMIT = 10
+
+WORDS = ('the', 'blue', 'velvet', 'room', 'hall', 'park', 'sound', 'city',
+         'river', 'guns', 'petals', 'jazz', 'club', 'musical', 'hop',
+         'dueling', 'pianos', 'bar', 'matt', 'quevedo', 'wild', 'sax',
+         'band', 'garden', 'house', 'north', 'south', 'stage', 'loft')
+
+
+def randomName(generator):
+    words = generator.sample(WORDS, generator.randint(1, 4))
+    return ' '.join(words).title() + ' ' + str(generator.randint(1, 9999))
+
+
+def percentiles(samples):
+    samples.sort()
+    return (samples[len(samples) // 2] * 1e6,
+            samples[int(len(samples) * 0.99)] * 1e6)
+
+
+def main():
+    generator = random.Random(1)
+    rows = [(record_id, randomName(generator), None)
+            for record_id in range(1, NAME_COUNT + 1)]
+    started = time.perf_counter()
+    index = nameindex.NameIndex()
+    index.extend(rows)
+    print(f'built index of {NAME_COUNT} names ({len(index.keys)} keys) in '
+          f'{time.perf_counter() - started:.2f} s')
+
+    prefixes = [generator.choice(WORDS)[:generator.randint(1, 4)]
+                for _ in range(LOOKUPS)]
+    index_times, scan_times = [], []
+    for prefix in prefixes:
+        started = time.perf_counter()
+        index.search(prefix, LIMIT)
+        index_times.append(time.perf_counter() - started)
+    for prefix in prefixes[:LOOKUPS // 20]:
+        started = time.perf_counter()
+        pattern = ' ' + prefix
+        [row for row in rows if (' ' + row[1].casefold()).find(pattern) >= 0]
+        scan_times.append(time.perf_counter() - started)
+
+    p50, p99 = percentiles(index_times)
+    print(f'index search: p50 {p50:.1f} us, p99 {p99:.1f} us')
+    p50, p99 = percentiles(scan_times)
+    print(f'full scan:    p50 {p50:.1f} us, p99 {p99:.1f} us')
+
+    updates = []
+    for record_id in range(NAME_COUNT + 1, NAME_COUNT + 1001):
+        started = time.perf_counter()
+        index.add(record_id, randomName(generator), None)
+        index.remove(record_id - NAME_COUNT)
+        updates.append(time.perf_counter() - started)
+    p50, p99 = percentiles(updates)
+    print(f'add + remove: p50 {p50:.1f} us, p99 {p99:.1f} us')
+
+
+if __name__ == '__main__':
+    main()
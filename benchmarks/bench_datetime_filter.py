@@ -0,0 +1,84 @@
+"""--------------------------------------------------------------------------#
+# Benchmark: datetime filter render time for the /shows page
+#
+# Renders the show tile markup for 10,000 shows with the previous
+# filter (string in, dateutil parse, babel pattern resolved per call)
+# and with formatting.format_datetime.
+#
+#   python benchmarks/bench_datetime_filter.py
+# --------------------------------------------------------------------------"""
+
+import os
+import sys
+import time
+import random
+import datetime
+import dateutil.parser
+import babel.dates
+from jinja2 import Environment
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import formatting  # noqa: E402
+
+
+SHOW_COUNT = 10000
+ROUNDS = 5
+
+TILE = (
+    '{% for show in shows %}'
+    '<div class="tile tile-show">'
+    '<h4>{{ show.start_time|datetime(\'full\') }}</h4>'
+    '<h5>{{ show.artist_name }}</h5>'
+    '</div>'
+    '{% endfor %}'
+)
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en_US')
+
+
+def makeShows(distinct_times):
+    start = datetime.datetime(2026, 1, 1, 20, 0)
+    times = [start + datetime.timedelta(hours=3 * i)
+             for i in range(distinct_times)]
+    return [{'artist_name': f'Artist {i}',
+             'start_time': random.choice(times)}
+            for i in range(SHOW_COUNT)]
+
+
+def render(shows, filter_function):
+    environment = Environment()
+    environment.filters['datetime'] = filter_function
+    tile = environment.from_string(TILE)
+    best = None
+    for _ in range(ROUNDS):
+        formatting.formatTimestamp.cache_clear()
+        started = time.perf_counter()
+        tile.render(shows=shows)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    random.seed(0)
+    for distinct_times in (SHOW_COUNT, 500):
+        shows = makeShows(distinct_times)
+        legacy_shows = [dict(show, start_time=str(show['start_time']))
+                        for show in shows]
+        legacy = render(legacy_shows, legacy_format_datetime)
+        cached = render(shows, formatting.format_datetime)
+        print(f'{SHOW_COUNT} shows, {distinct_times} distinct times: '
+              f'legacy {legacy * 1000:.1f} ms, '
+              f'cached {cached * 1000:.1f} ms '
+              f'({legacy / cached:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
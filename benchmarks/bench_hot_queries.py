@@ -0,0 +1,155 @@
+"""--------------------------------------------------------------------------#
+# Benchmark: hot queries as Query API calls vs cached statements
+#
+# Times each hot query written the previous way (the statement is built
+# on every call), the same with the compiled cache off (adding the cost
+# of compiling the SQL), with lambda_stmt, and as the cached statements
+# in models.py. On PostgreSQL (psycopg) the cached statements are also
+# timed with server-side prepared statements off and on, the difference
+# being the database's parse and plan time.
+#
+# Without DATABASE_URL an in-memory SQLite database with sample rows is
+# used. With it, the queries run read-only against that database.
+#
+#   python benchmarks/bench_hot_queries.py [rounds]
+# --------------------------------------------------------------------------"""
+
+import os
+import sys
+import time
+import datetime
+from sqlalchemy import lambda_stmt, select
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import config  # noqa: E402
+
+if 'DATABASE_URL' not in os.environ:
+    config.SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    config.SQLALCHEMY_ENGINE_OPTIONS = {}
+config.WARMUP_ON_START = False
+config.LOG_FILE = None
+
+from app import create_app  # noqa: E402
+from models import (db, Venue, Artist, Show, getRecord, getRecent,  # noqa
+                    getUpcomingShowIds, getFirstMatch)
+
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+SAMPLE_RECORDS = 200
+SAMPLE_SHOWS = 1000
+
+
+def makeApp(**overrides):
+    settings = {name: getattr(config, name) for name in dir(config)
+                if name.isupper()}
+    settings.update(overrides)
+    return create_app(type('BenchConfig', (object,), settings))
+
+
+def addSampleRows():
+    db.create_all()
+    now = datetime.datetime.now()
+    for number in range(SAMPLE_RECORDS):
+        db.session.add(Venue(name=f'Venue {number}', city='Austin',
+                             state='TX', address='1 Main',
+                             phone='123-456-7890', genres='Jazz'))
+        db.session.add(Artist(name=f'Artist {number}', city='Austin',
+                              state='TX', phone='123-456-7890',
+                              genres='Jazz'))
+    db.session.flush()
+    for number in range(SAMPLE_SHOWS):
+        db.session.add(Show(
+            artist_id=number % SAMPLE_RECORDS + 1,
+            venue_id=number * 7 % SAMPLE_RECORDS + 1,
+            start_time=now + datetime.timedelta(days=number - 500)))
+    db.session.commit()
+
+
+def hotQueries():
+    record_id = db.session.query(db.func.min(Venue.id)).scalar()
+    name = db.session.query(Venue.name).filter(Venue.id == record_id).scalar()
+    now = datetime.datetime.now()
+    return [
+        ('get by id',
+         lambda: Venue.query.get(record_id),
+         lambda: execute(lambda_stmt(
+             lambda: select(Venue).where(Venue.id == record_id)
+         )).scalar_one_or_none(),
+         lambda: getRecord(Venue, record_id)),
+        ('recent listings',
+         lambda: Venue.query.order_by(Venue.id.desc()).limit(5).all(),
+         lambda: execute(lambda_stmt(
+             lambda: select(Venue.id, Venue.name, Venue.image_link)
+             .order_by(Venue.id.desc()).limit(5)
+         )).all(),
+         lambda: getRecent(Venue)),
+        ('upcoming shows',
+         lambda: Show.query.filter(Show.start_time > now).all(),
+         lambda: execute(lambda_stmt(
+             lambda: select(Show.artist_id, Show.venue_id)
+             .where(Show.start_time > now)
+         )).all(),
+         lambda: getUpcomingShowIds(now)),
+        ('unique check',
+         lambda: Venue.query.filter(Venue.name == name).first(),
+         lambda: execute(lambda_stmt(
+             lambda: select(Venue).where(Venue.name == name).limit(1)
+         )).scalar_one_or_none(),
+         lambda: getFirstMatch(Venue, Venue.name, name)),
+    ]
+
+
+def execute(statement):
+    return db.session.execute(statement)
+
+
+# Function returns the microseconds per call. The identity map is
+# cleared each time, so a get by ID always reaches the database.
+def timeCalls(function, compiled_cache=True):
+    db.session.remove()
+    if not compiled_cache:
+        db.session.connection(execution_options={'compiled_cache': None})
+    for _ in range(50):
+        function()
+        db.session.expunge_all()
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        function()
+        db.session.expunge_all()
+    elapsed = time.perf_counter() - started
+    db.session.remove()
+    return elapsed / ROUNDS * 1e6
+
+
+def main():
+    app = makeApp()
+    with app.app_context():
+        if 'DATABASE_URL' not in os.environ:
+            addSampleRows()
+        print(f'{db.engine.dialect.name}, {ROUNDS} calls each, us per call')
+        print(f'{"query":16} {"no cache":>9} {"query API":>9} '
+              f'{"lambda":>9} {"cached":>9}')
+        queries = hotQueries()
+        for name, legacy, lambda_query, cached in queries:
+            print(f'{name:16} {timeCalls(legacy, False):9.1f} '
+                  f'{timeCalls(legacy):9.1f} {timeCalls(lambda_query):9.1f} '
+                  f'{timeCalls(cached):9.1f}')
+
+    if not config.SQLALCHEMY_DATABASE_URI.startswith('postgresql+psycopg'):
+        print('Prepared statements: skipped (needs PostgreSQL via psycopg).')
+        return
+    print('cached statements, prepared statements off / on')
+    apps = [makeApp(SQLALCHEMY_ENGINE_OPTIONS={
+        'connect_args': {'prepare_threshold': threshold}
+    }) for threshold in (None, 0)]
+    for index in range(len(queries)):
+        times = []
+        for server_app in apps:
+            with server_app.app_context():
+                name, legacy, lambda_query, cached = hotQueries()[index]
+                times.append(timeCalls(cached))
+        print(f'{name:16} {times[0]:9.1f} {times[1]:9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""--------------------------------------------------------------------------#
+# Benchmark: app import time and startup budget
+#
+# Imports the app in fresh interpreters under "python -X importtime",
+# prints the import and create_app() times with the heaviest modules,
+# and fails (exit status 1) if the median import takes longer than
+# IMPORT_BUDGET_MS or if a module that is only needed by the CLI or
+# the job worker was loaded. Warm-up is switched off, so the database
+# in config.py (or DATABASE_URL) is not connected to, but its driver
+# must be installed.
+#
+#   python benchmarks/bench_import.py [rounds]
+# --------------------------------------------------------------------------"""
+
+import os
+import re
+import sys
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 550))
+TOP_MODULES = 10
+
+# Modules only the flask db / build-assets commands, the thumbnail job
+# or the datetime filter need, imported on first use. (Babel is not
+# listed, Flask-WTF imports it for its translations when installed.)
+LAZY_MODULES = ('flask_migrate', 'alembic', 'dateutil', 'PIL', 'brotli')
+
+PROGRAM = f'''
+import sys
+import time
+import config
+config.WARMUP_ON_START = False
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print('create_app', (created - imported) * 1000)
+print('loaded', ','.join(name for name in {LAZY_MODULES!r}
+                         if name in sys.modules))
+'''
+
+import_line = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def run():
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROGRAM],
+        cwd=ROOT, capture_output=True, text=True,
+        check=True
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = import_line.match(line)
+        # Direct imports of the app module are indented by three spaces.
+        if match and len(match.group(3)) <= 3:
+            modules[match.group(4)] = int(match.group(2)) / 1000
+    output = dict(line.split(' ', 1) for line in result.stdout.splitlines()
+                  if line.startswith(('create_app', 'loaded')))
+    return (modules, float(output['create_app']),
+            [name for name in output['loaded'].strip().split(',') if name])
+
+
+def main():
+    imports, startups, loaded = [], [], set()
+    totals = {}
+    for _ in range(ROUNDS):
+        modules, startup, lazy_loaded = run()
+        imports.append(modules['app'])
+        startups.append(startup)
+        loaded.update(lazy_loaded)
+        for name, milliseconds in modules.items():
+            totals.setdefault(name, []).append(milliseconds)
+
+    import_ms = statistics.median(imports)
+    print(f'import app: {import_ms:.0f} ms median, '
+          f'{min(imports):.0f} ms best '
+          f'(budget {IMPORT_BUDGET_MS:.0f} ms), '
+          f'create_app(): {statistics.median(startups):.0f} ms')
+    heaviest = sorted(((statistics.median(times), name)
+                       for name, times in totals.items() if name != 'app'),
+                      reverse=True)[:TOP_MODULES]
+    for milliseconds, name in heaviest:
+        print(f'  {milliseconds:7.1f} ms  {name}')
+
+    failed = False
+    if import_ms > IMPORT_BUDGET_MS:
+        print(f'FAIL: import is {import_ms - IMPORT_BUDGET_MS:.0f} ms over '
+              'budget.')
+        failed = True
+    if loaded:
+        print('FAIL: loaded at startup: ' + ', '.join(sorted(loaded)))
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
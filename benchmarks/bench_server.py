@@ -0,0 +1,91 @@
+"""--------------------------------------------------------------------------#
+# Benchmark: gunicorn (preloaded, multi-process) vs the development server
+#
+# Starts each server on its own port, sends requests to PATH from
+# CONCURRENCY client threads for DURATION seconds and prints the
+# throughput and latency. The database in config.py must be reachable
+# for pages that read from it.
+#
+#   python benchmarks/bench_server.py [path] [concurrency] [duration]
+# --------------------------------------------------------------------------"""
+
+import os
+import sys
+import time
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PATH = sys.argv[1] if len(sys.argv) > 1 else '/'
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+DURATION = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+servers = {
+    'flask dev server': (
+        [sys.executable, '-m', 'flask', '--app', 'app', 'run',
+         '--port', '5101'], 5101),
+    'gunicorn (preload)': (
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+         '--bind', '127.0.0.1:5102', 'wsgi:app'], 5102),
+}
+
+
+def waitUntilReady(port, deadline=60):
+    started = time.monotonic()
+    while time.monotonic() - started < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/ready', timeout=1)
+            return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError(f'Server on port {port} did not become ready.')
+
+
+def load(port):
+    url = f'http://127.0.0.1:{port}{PATH}'
+    latencies = []
+    errors = [0]
+    stop = time.monotonic() + DURATION
+
+    def client():
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    response.read()
+            except Exception:
+                errors[0] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=client) for _ in range(CONCURRENCY)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def main():
+    for name, (command, port) in servers.items():
+        process = subprocess.Popen(command, cwd=ROOT,
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+        try:
+            waitUntilReady(port)
+            latencies, errors = load(port)
+        finally:
+            process.terminate()
+            process.wait()
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] if latencies else 0
+        p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+        print(f'{name}: {len(latencies) / DURATION:.0f} req/s, '
+              f'p50 {p50 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms, '
+              f'{errors} errors')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import time
+import threading
+from collections import OrderedDict
+
+
+"""--------------------------------------------------------------------------#
+# Result caching and request coalescing
+#
+# SingleFlight makes concurrent callers asking for the same key share
+# one call: the first one runs it, the others wait for its result.
+# TtlCache keeps results for a few seconds. CoalescingCache combines
+# the two, so a burst of identical requests costs a single query. Both
+# work within one process.
+# --------------------------------------------------------------------------"""
+
+
+#  ----------------------------------------------------------------
+#  Single flight
+#  ----------------------------------------------------------------
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    # Function returns function(), or the result of the call already
+    # running for key. An exception is raised in every waiting caller.
+    def do(self, key, function):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+
+#  ----------------------------------------------------------------
+#  Cache
+#  ----------------------------------------------------------------
+
+
+class TtlCache(object):
+    def __init__(self, max_size=1024):
+        self.lock = threading.Lock()
+        # Key -> (expires at, value), least recently used first.
+        self.entries = OrderedDict()
+        self.max_size = max_size
+
+    # Function returns (True, value) for a live entry, else (False, None).
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return False, None
+            self.entries.move_to_end(key)
+            return True, entry[1]
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class CoalescingCache(object):
+    def __init__(self, max_size=1024):
+        self.cache = TtlCache(max_size)
+        self.flights = SingleFlight()
+
+    # Function returns the cached value for key, or loads it with
+    # function() (once for all concurrent callers) and caches it for ttl
+    # seconds. With a ttl of 0 only concurrent calls are shared.
+    def get(self, key, function, ttl):
+        hit, value = self.cache.get(key)
+        if hit:
+            return value
+
+        def load():
+            value = function()
+            if ttl > 0:
+                self.cache.set(key, value, ttl)
+            return value
+
+        return self.flights.do(key, load)
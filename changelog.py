@@ -0,0 +1,188 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import datetime
+from flask import current_app
+from sqlalchemy import event, literal, text
+from sqlalchemy.orm import Session
+import hooks
+import jobs
+from models import db, ChangeLog, Venue, Artist, Show
+
+
+"""--------------------------------------------------------------------------#
+# Change log
+#
+# Every create, edit and delete of a venue, artist or show, and every
+# show moved to the archive ('archive'), adds a row to ChangeLog in the
+# transaction making it: by the change hooks for the handlers'
+# statements, and by a flush listener for changes made through the ORM.
+# Downstream consumers read it from /api/changes?since=<ID> in batches,
+# so they only sync what changed since their last run.
+#
+# Row IDs are taken when a change is made, so a long transaction can
+# commit a lower ID after a reader has passed it. The feed is read by
+# sequence instead, which each transaction gives its entries as it
+# commits: on PostgreSQL under an advisory lock held until the commit,
+# on SQLite under the database's write lock. A transaction can't take
+# sequences before the ones committing ahead of it are visible, so a
+# reader never passes an entry still to come.
+#
+# The compaction job removes entries older than CHANGES_COMPACT_DAYS
+# that a later entry of the same record supersedes. A consumer that far
+# behind still gets each record's latest change.
+# --------------------------------------------------------------------------"""
+
+
+tables = (Venue, Artist, Show)
+# Advisory lock held from numbering a transaction's entries to its
+# commit, so sequences are taken in commit order.
+lock_key = 4315002
+
+
+#  ----------------------------------------------------------------
+#  Logging changes
+#  ----------------------------------------------------------------
+
+
+# Function returns the statement logging the change. Creates and edits
+# log the records' versions as they are now in the transaction.
+def logStatement(table, record_ids, operation):
+    now = datetime.datetime.utcnow()
+    if operation in hooks.removals:
+        return db.insert(ChangeLog).values([{
+            'entity': table.__tablename__,
+            'record_id': record_id,
+            'operation': operation,
+            'version': None,
+            'changed_at': now
+        } for record_id in record_ids])
+    return db.insert(ChangeLog).from_select(
+        ['entity', 'record_id', 'operation', 'version', 'changed_at'],
+        db.select(literal(table.__tablename__), table.id, literal(operation),
+                  table.version, literal(now, db.DateTime))
+        .where(table.id.in_(record_ids))
+        .order_by(table.id)
+    )
+
+
+# Change hook. Logs the handler's change in the same transaction.
+@hooks.onChange(*tables)
+def logChange(table, record_ids, operation):
+    db.session.execute(logStatement(table, record_ids, operation))
+    db.session.info['changes_logged'] = True
+
+
+# Flush listener. Logs the venues, artists and shows added, changed or
+# deleted through the ORM.
+@event.listens_for(Session, 'after_flush')
+def logFlushedChanges(session, flush_context):
+    changes = hooks.flushedChanges(session, tables)
+    if not changes:
+        return
+    connection = session.connection()
+    for table, record_ids, operation in changes:
+        connection.execute(logStatement(table, record_ids, operation))
+    session.info['changes_logged'] = True
+
+
+# Commit listener. Numbers the entries the transaction logged, after
+# the entries of every transaction that committed before it. The rest
+# of the commit is short, but commits logging changes wait on each
+# other for it.
+@event.listens_for(Session, 'before_commit')
+def sequenceChanges(session):
+    # The commit flushes after this listener, so flush first for the
+    # flush listener to log what is left.
+    session.flush()
+    if not session.info.pop('changes_logged', False):
+        return
+    connection = session.connection()
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('SELECT pg_advisory_xact_lock(:key)'),
+                           {'key': lock_key})
+    # Other transactions' unnumbered entries aren't committed, so they
+    # are not seen here.
+    first_id, last_sequence = connection.execute(
+        db.select(db.select(db.func.min(ChangeLog.id))
+                  .where(ChangeLog.sequence.is_(None)).scalar_subquery(),
+                  db.select(db.func.max(ChangeLog.sequence))
+                  .scalar_subquery())
+    ).one()
+    if first_id is None:
+        return
+    # Keeps the order of the IDs, gaps included.
+    connection.execute(
+        db.update(ChangeLog)
+        .where(ChangeLog.sequence.is_(None))
+        .values(sequence=ChangeLog.id - first_id + (last_sequence or 0) + 1)
+    )
+
+
+@event.listens_for(Session, 'after_rollback')
+def discardChanges(session):
+    session.info.pop('changes_logged', None)
+
+
+#  ----------------------------------------------------------------
+#  Reading changes
+#  ----------------------------------------------------------------
+
+
+# Function returns up to limit changes after the since ID, in commit
+# order, as dicts, and whether more are ready. A change's ID in the feed
+# is its sequence.
+def getChanges(since, limit):
+    rows = db.session.execute(
+        db.select(ChangeLog.sequence.label('id'), ChangeLog.entity,
+                  ChangeLog.record_id, ChangeLog.operation,
+                  ChangeLog.version, ChangeLog.changed_at)
+        .where(ChangeLog.sequence > since)
+        .order_by(ChangeLog.sequence)
+        .limit(limit + 1)
+    ).all()
+    return [row._asdict() for row in rows[:limit]], len(rows) > limit
+
+
+#  ----------------------------------------------------------------
+#  Compaction
+#  ----------------------------------------------------------------
+
+
+# Function deletes up to batch_size entries from before the cutoff that
+# a later entry of the same record supersedes, and commits. Returns the
+# number deleted.
+def compactChanges(before, batch_size):
+    later = db.aliased(ChangeLog)
+    superseded = db.session.execute(
+        db.select(ChangeLog.id)
+        .where(ChangeLog.changed_at < before,
+               db.select(later.id)
+               .where(later.entity == ChangeLog.entity,
+                      later.record_id == ChangeLog.record_id,
+                      later.sequence > ChangeLog.sequence)
+               .exists())
+        .limit(batch_size)
+    ).scalars().all()
+    if superseded:
+        db.session.execute(
+            db.delete(ChangeLog).where(ChangeLog.id.in_(superseded)))
+    db.session.commit()
+    return len(superseded)
+
+
+@jobs.handler('changes.compact')
+def compactChangesJob(payload):
+    config = current_app.config
+    before = (datetime.datetime.utcnow() -
+              datetime.timedelta(days=config['CHANGES_COMPACT_DAYS']))
+    while compactChanges(before, config['CHANGES_COMPACT_BATCH']):
+        pass
+
+
+# Function queues the compaction job, once a day at most.
+def enqueueCompaction():
+    jobs.enqueue('changes.compact',
+                 key=f'changes.compact:{datetime.date.today().isoformat()}')
+    db.session.commit()
@@ -0,0 +1,225 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import json
+import time
+import queue
+import logging
+import threading
+import collections
+from flask import Response, current_app
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+import hooks
+from models import db, Venue, Artist, Show
+
+logger = logging.getLogger(__name__)
+
+
+"""--------------------------------------------------------------------------#
+# Change events
+#
+# Creates, edits and deletes of venues, artists and shows are pushed to
+# clients as server-sent events (/events), e.g. "show.create" with the
+# show IDs, so pages can tell what changed instead of being polled.
+# Shows moved to the archive are sent as "show.archive".
+#
+# Each process has one hub fanning events out to its open streams. On
+# PostgreSQL the change hook sends the event with pg_notify in the
+# handler's transaction, so it goes out exactly when the change commits,
+# and each process LISTENs for it in a background thread. Elsewhere
+# (SQLite, tests) the event is handed to the local hub after the commit,
+# which only reaches streams in the same process.
+#
+# It is only served with LIVE_EVENTS on, as each open stream holds a
+# worker thread. A stream ends after EVENTS_STREAM_SECONDS so it doesn't
+# hold one for long, the browser reconnects and sends the last event ID it
+# saw. Events still in the hub's buffer are sent again from there,
+# a client that may have missed some gets a "reset" event and should
+# reload what it shows.
+# --------------------------------------------------------------------------"""
+
+
+kinds = {Venue: 'venue', Artist: 'artist', Show: 'show'}
+# pg_notify payloads must stay under 8000 bytes.
+ids_per_event = 500
+reconnect_seconds = 5
+
+
+#  ----------------------------------------------------------------
+#  Hub
+#  ----------------------------------------------------------------
+
+
+class EventHub(object):
+    def __init__(self, buffer_size):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.recent = collections.deque(maxlen=buffer_size)
+        # Events up to this ID may have been missed: they were published
+        # before the hub started, or dropped from the buffer since.
+        self.forgotten_id = time.time_ns()
+        self.last_id = self.forgotten_id
+        self.listening = False
+
+    # Function gives the event the next ID (nanoseconds since the epoch,
+    # so IDs from processes on one machine compare) and sends it to the
+    # streams.
+    def publish(self, message):
+        with self.lock:
+            self.last_id = max(time.time_ns(), self.last_id + 1)
+            message = dict(message, id=self.last_id)
+            if len(self.recent) == self.recent.maxlen:
+                self.forgotten_id = self.recent[0]['id']
+            self.recent.append(message)
+            for subscriber in self.subscribers:
+                subscriber.put(message)
+
+    # Function returns a queue receiving the events published from now
+    # on, the buffered events after last_id (a reset event first if
+    # some may be missing), and the ID the stream starts from.
+    def subscribe(self, last_id=None):
+        subscriber = queue.Queue()
+        with self.lock:
+            self.subscribers.add(subscriber)
+            start_id = max(time.time_ns(), self.last_id)
+            if last_id is None:
+                return subscriber, [], start_id
+            missed = [message for message in self.recent
+                      if message['id'] > last_id]
+            if last_id < self.forgotten_id:
+                missed.insert(0, {'type': 'reset', 'ids': []})
+        return subscriber, missed, start_id
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+
+hub = None
+hub_lock = threading.Lock()
+
+
+# Function returns the process's hub. On PostgreSQL, the thread
+# listening for events is started with it.
+def getHub():
+    global hub
+    with hub_lock:
+        if hub is None:
+            hub = EventHub(current_app.config['EVENTS_BUFFER_SIZE'])
+        if not hub.listening and db.engine.dialect.name == 'postgresql':
+            hub.listening = True
+            threading.Thread(
+                target=listen, daemon=True,
+                args=(hub, current_app.config['SQLALCHEMY_DATABASE_URI'],
+                      current_app.config['EVENTS_CHANNEL'])
+            ).start()
+    return hub
+
+
+# Thread target. Publishes the events notified on the channel to the
+# hub, reconnecting if the connection is lost. psycopg is imported here
+# as only PostgreSQL needs it.
+def listen(hub, database_uri, channel):
+    import psycopg
+    url = (make_url(database_uri).set(drivername='postgresql')
+           .render_as_string(hide_password=False))
+    while True:
+        try:
+            with psycopg.connect(url, autocommit=True) as connection:
+                connection.execute(f'LISTEN "{channel}"')
+                for notify in connection.notifies():
+                    hub.publish(json.loads(notify.payload))
+        except Exception:
+            logger.exception('Lost the %s event listener, reconnecting.',
+                             channel)
+        time.sleep(reconnect_seconds)
+
+
+#  ----------------------------------------------------------------
+#  Publish
+#  ----------------------------------------------------------------
+
+
+# Function publishes the events of a committed session to this
+# process's listeners.
+def publishEvents(messages):
+    if hub is not None:
+        for message in messages:
+            hub.publish(message)
+
+
+# Change hook. Sends the event with the transaction on PostgreSQL, and
+# otherwise returns it to publish once the session commits.
+@hooks.onCommit(publishEvents, Venue, Artist, Show)
+def collectEvents(table, record_ids, operation):
+    if not current_app.config['LIVE_EVENTS']:
+        return None
+    postgres = db.session.get_bind().dialect.name == 'postgresql'
+    messages = []
+    for start in range(0, len(record_ids), ids_per_event):
+        message = {'type': f'{kinds[table]}.{operation}',
+                   'ids': record_ids[start:start + ids_per_event]}
+        if postgres:
+            db.session.execute(
+                text('SELECT pg_notify(:channel, :payload)'),
+                {'channel': current_app.config['EVENTS_CHANNEL'],
+                 'payload': json.dumps(message)})
+        else:
+            messages.append(message)
+    return messages
+
+
+#  ----------------------------------------------------------------
+#  Stream
+#  ----------------------------------------------------------------
+
+
+def formatEvent(message):
+    lines = [f'event: {message["type"]}',
+             f'data: {json.dumps({"ids": message["ids"]})}']
+    if 'id' in message:
+        lines.insert(0, f'id: {message["id"]}')
+    return '\n'.join(lines) + '\n\n'
+
+
+# Function returns the event stream response. last_id is the browser's
+# Last-Event-ID header, if it is reconnecting.
+def streamResponse(last_id):
+    config = current_app.config
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = 0
+    event_hub = getHub()
+    subscriber, missed, start_id = event_hub.subscribe(last_id)
+
+    def generate():
+        try:
+            yield f'retry: {config["EVENTS_RETRY_MS"]}\n\n'
+            for message in missed:
+                yield formatEvent(message)
+            # The ID marks where a reconnecting stream picks up, even if
+            # no event comes before this one ends.
+            yield f'id: {start_id}\n\n'
+            deadline = time.monotonic() + config['EVENTS_STREAM_SECONDS']
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    message = subscriber.get(
+                        timeout=min(remaining,
+                                    config['EVENTS_KEEPALIVE_SECONDS']))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield formatEvent(message)
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
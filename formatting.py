@@ -0,0 +1,59 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import datetime
+from functools import lru_cache
+
+
+"""--------------------------------------------------------------------------#
+# Date and time formatting
+# --------------------------------------------------------------------------"""
+
+
+# Named formats accepted by the datetime template filter.
+datetime_formats = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma"
+}
+
+default_locale = 'en_US'
+
+
+#  ----------------------------------------------------------------
+#  Functions
+#  ----------------------------------------------------------------
+
+
+# Babel and dateutil are imported on first use, which keeps them out of
+# the app's import time.
+
+# Function returns the compiled babel pattern for a format string.
+@lru_cache(maxsize=64)
+def getPattern(format):
+    from babel.dates import parse_pattern
+    return parse_pattern(datetime_formats.get(format, format))
+
+
+# Function returns the babel locale data for a locale name.
+@lru_cache(maxsize=16)
+def getLocale(locale):
+    from babel import Locale
+    return Locale.parse(locale)
+
+
+# Function formats a timestamp. Listing pages repeat the same show
+# times many times over, so results are cached on
+# (timestamp, format, locale).
+@lru_cache(maxsize=8192)
+def formatTimestamp(timestamp, format, locale):
+    return getPattern(format).apply(timestamp, getLocale(locale))
+
+
+def format_datetime(value, format='medium', locale=default_locale):
+    # Datetimes are formatted as they are, strings (e.g. from older
+    # callers) are parsed first.
+    if not isinstance(value, datetime.datetime):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    return formatTimestamp(value, format, locale)
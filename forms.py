@@ -10,10 +10,11 @@ from wtforms import (StringField, SelectField, SelectMultipleField,
                      DateTimeField, BooleanField, TextAreaField,
                      HiddenField, IntegerField, ValidationError)
 from wtforms.validators import (DataRequired, AnyOf, URL, Optional, Length)
-from validate import (Phone, ReduiredIfChecked, IsUnique, AnyOfMultiple,
+from validate import (Phone, ReduiredIfChecked, AnyOfMultiple,
                       RecordExists, DateInRange, ValidDateTime, CompareDate,
                       DateAvailable, timeToString, RequiredIfFilled)
 from models import Venue, Artist, Show
+from idempotency import newKey
 
 
 """--------------------------------------------------------------------------#
@@ -31,14 +32,13 @@ class VenueForm(FlaskForm):
         csrf = False
 
     id = HiddenField()
+    version = HiddenField()
+    idempotency_key = HiddenField(default=newKey)
 
     name = StringField(
         'name', validators=[DataRequired(),
                             Length(max=120,
-                                   message=validate.text_120_error),
-                            IsUnique(table=Venue, key='id',
-                                     check_field='name',
-                                     message=validate.venue_name_error)]
+                                   message=validate.text_120_error)]
     )
     city = StringField(
         'city', validators=[DataRequired(),
@@ -104,14 +104,13 @@ class ArtistForm(FlaskForm):
         csrf = False
 
     id = HiddenField()
+    version = HiddenField()
+    idempotency_key = HiddenField(default=newKey)
 
     name = StringField(
         'name', validators=[DataRequired(),
                             Length(max=120,
-                                   message=validate.text_120_error),
-                            IsUnique(table=Artist, key='id',
-                                     check_field='name',
-                                     message=validate.artist_name_error)]
+                                   message=validate.text_120_error)]
     )
     city = StringField(
         'city', validators=[DataRequired(),
@@ -195,6 +194,10 @@ class ShowForm(FlaskForm):
     class Meta:
         csrf = False
 
+    id = HiddenField()
+    version = HiddenField()
+    idempotency_key = HiddenField(default=newKey)
+
     artist_id = IntegerField(
         'artist_id',
         validators=[DataRequired(message=validate.integer_error),
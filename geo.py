@@ -0,0 +1,318 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import csv
+import math
+import time
+import bisect
+import threading
+from flask import current_app
+import hooks
+from models import db, Venue
+
+
+"""--------------------------------------------------------------------------#
+# Venue locations
+#
+# Venues are geocoded from their city and state with an offline gazetteer
+# (GAZETTEER_FILE, a CSV of city, state, latitude and longitude), so no
+# geocoding service is called. Venues whose city isn't in it have no
+# location and are left out of "near" searches.
+#
+# Searches use an in-memory grid of GEO_CELL_DEGREES cells. Each cell
+# holds the distinct venue locations in it, and each location the IDs of
+# its venues, so a radius search only measures the distance to the
+# locations in the few cells around the center, however many venues
+# there are. Like the name index, the grid is loaded on first use, kept
+# current from the change hooks when a session commits, and reloaded
+# after GEO_INDEX_MAX_AGE seconds to pick up changes made by other
+# processes.
+# --------------------------------------------------------------------------"""
+
+
+earth_radius_km = 6371.0
+km_per_degree = math.pi * earth_radius_km / 180
+
+
+def normalize(city):
+    return ' '.join(city.casefold().split())
+
+
+def distanceKm(latitude, longitude, other_latitude, other_longitude):
+    latitude, longitude, other_latitude, other_longitude = map(
+        math.radians, (latitude, longitude, other_latitude, other_longitude))
+    a = (math.sin((other_latitude - latitude) / 2) ** 2 +
+         math.cos(latitude) * math.cos(other_latitude) *
+         math.sin((other_longitude - longitude) / 2) ** 2)
+    return 2 * earth_radius_km * math.asin(min(1.0, math.sqrt(a)))
+
+
+#  ----------------------------------------------------------------
+#  Gazetteer
+#  ----------------------------------------------------------------
+
+
+# Gazetteers loaded, by file path: (city, state) -> (latitude, longitude).
+gazetteers = {}
+
+
+def loadGazetteer(path):
+    places = {}
+    with open(path, newline='', encoding='utf-8') as places_file:
+        for row in csv.DictReader(places_file):
+            places[(normalize(row['city']), row['state'].upper())] = (
+                float(row['latitude']), float(row['longitude']))
+    return places
+
+
+# Function returns the (latitude, longitude) of a city, or None if the
+# gazetteer doesn't have it.
+def geocode(city, state):
+    path = current_app.config['GAZETTEER_FILE']
+    if path not in gazetteers:
+        gazetteers[path] = loadGazetteer(path)
+    return gazetteers[path].get((normalize(city or ''),
+                                 (state or '').upper()))
+
+
+# Function returns the location columns of a venue in the city, for
+# inserts and updates.
+def venueLocation(city, state):
+    location = geocode(city, state) or (None, None)
+    return {'latitude': location[0], 'longitude': location[1]}
+
+
+# Function geocodes the venues without a location whose city is in the
+# gazetteer, bumping their versions like any other edit (the change feed
+# and edit form ETags carry them). Returns the number of venues located.
+def locateVenues():
+    places = (
+        db.session.query(Venue.city, Venue.state)
+        .filter(Venue.latitude.is_(None))
+        .distinct().all()
+    )
+    located = []
+    for city, state in places:
+        location = venueLocation(city, state)
+        if location['latitude'] is None:
+            continue
+        located += db.session.execute(
+            db.update(Venue)
+            .where(Venue.city == city, Venue.state == state,
+                   Venue.latitude.is_(None))
+            .values(version=Venue.version + 1, **location)
+            .returning(Venue.id)
+        ).scalars().all()
+    hooks.recordChanged(Venue, located, 'edit')
+    db.session.commit()
+    return len(located)
+
+
+#  ----------------------------------------------------------------
+#  Grid
+#  ----------------------------------------------------------------
+
+
+class GeoGrid(object):
+    def __init__(self, cell_degrees):
+        self.cell_degrees = cell_degrees
+        self.columns = math.ceil(360 / cell_degrees)
+        # Cell -> set of (latitude, longitude) locations.
+        self.cells = {}
+        # Location -> sorted list of venue IDs.
+        self.locations = {}
+        # Venue ID -> location.
+        self.records = {}
+
+    def cell(self, latitude, longitude):
+        return (math.floor((latitude + 90) / self.cell_degrees),
+                math.floor((longitude + 180) / self.cell_degrees) %
+                self.columns)
+
+    def add(self, record_id, latitude, longitude):
+        self.remove(record_id)
+        if latitude is None or longitude is None:
+            return
+        location = (latitude, longitude)
+        self.records[record_id] = location
+        if location not in self.locations:
+            self.locations[location] = []
+            self.cells.setdefault(self.cell(*location), set()).add(location)
+        bisect.insort(self.locations[location], record_id)
+
+    def remove(self, record_id):
+        location = self.records.pop(record_id, None)
+        if location is None:
+            return
+        ids = self.locations[location]
+        ids.remove(record_id)
+        if not ids:
+            del self.locations[location]
+            cell = self.cell(*location)
+            self.cells[cell].discard(location)
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+    # Function builds the grid with one sort per location, for the
+    # initial load.
+    def extend(self, rows):
+        for record_id, latitude, longitude in rows:
+            location = (latitude, longitude)
+            self.records[record_id] = location
+            if location not in self.locations:
+                self.locations[location] = []
+                self.cells.setdefault(self.cell(*location),
+                                      set()).add(location)
+            self.locations[location].append(record_id)
+        for ids in self.locations.values():
+            ids.sort()
+
+    # Function returns the locations in the cells overlapping the box of
+    # radius_km around the center.
+    def candidates(self, latitude, longitude, radius_km):
+        degrees = radius_km / km_per_degree
+        first_row = self.cell(max(latitude - degrees, -90), longitude)[0]
+        last_row = self.cell(min(latitude + degrees, 90), longitude)[0]
+        center_column = self.cell(latitude, longitude)[1]
+        # Longitude degrees shrink towards the poles, the box's edge
+        # nearest to a pole decides how many columns it spans.
+        edge = min(abs(latitude) + degrees, 89.9)
+        columns = math.ceil(degrees / math.cos(math.radians(edge)) /
+                            self.cell_degrees)
+        if 2 * columns + 1 >= self.columns:
+            column_range = range(self.columns)
+        else:
+            column_range = [column % self.columns for column in
+                            range(center_column - columns,
+                                  center_column + columns + 1)]
+        for row in range(first_row, last_row + 1):
+            for column in column_range:
+                yield from self.cells.get((row, column), ())
+
+    # Function returns up to limit (venue ID, distance in km) pairs of
+    # the venues within radius_km of the center, nearest first.
+    def within(self, latitude, longitude, radius_km, limit):
+        found = sorted(
+            (distance, location) for distance, location in (
+                (distanceKm(latitude, longitude, *location), location)
+                for location in self.candidates(latitude, longitude,
+                                                radius_km))
+            if distance <= radius_km
+        )
+        results = []
+        for distance, location in found:
+            for record_id in self.locations[location]:
+                if len(results) == limit:
+                    return results
+                results.append((record_id, distance))
+        return results
+
+    # Function returns the count nearest venues to the center, as
+    # within() does, searching twice as far until enough are found.
+    def nearest(self, latitude, longitude, count, max_km):
+        radius_km = self.cell_degrees * km_per_degree
+        while True:
+            results = self.within(latitude, longitude, radius_km, count)
+            if len(results) == count or radius_km >= max_km:
+                return results
+            radius_km = min(radius_km * 2, max_km)
+
+
+#  ----------------------------------------------------------------
+#  Index
+#  ----------------------------------------------------------------
+
+
+class GeoIndex(object):
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.grid = None
+        self.loaded_at = None
+
+    def load(self, cell_degrees):
+        grid = GeoGrid(cell_degrees)
+        grid.extend(
+            db.session.query(Venue.id, Venue.latitude, Venue.longitude)
+            .filter(Venue.latitude.isnot(None))
+        )
+        with self.lock:
+            self.grid = grid
+            self.loaded_at = time.monotonic()
+
+    # Loads the grid if it was never loaded or is older than max_age
+    # seconds, and returns the index.
+    def current(self, cell_degrees, max_age):
+        if (self.loaded_at is None or
+                time.monotonic() - self.loaded_at > max_age):
+            self.load(cell_degrees)
+        return self
+
+    def within(self, latitude, longitude, radius_km, limit):
+        with self.lock:
+            return self.grid.within(latitude, longitude, radius_km, limit)
+
+    def nearest(self, latitude, longitude, count, max_km):
+        with self.lock:
+            return self.grid.nearest(latitude, longitude, count, max_km)
+
+    def apply(self, changes):
+        with self.lock:
+            for method, arguments in changes:
+                getattr(self.grid, method)(*arguments)
+
+
+geo_index = GeoIndex()
+
+
+#  ----------------------------------------------------------------
+#  Functions
+#  ----------------------------------------------------------------
+
+
+def getIndex():
+    config = current_app.config
+    return geo_index.current(config['GEO_CELL_DEGREES'],
+                             config['GEO_INDEX_MAX_AGE'])
+
+
+# Function returns the venues near the center as dicts for display,
+# nearest first: those within radius_km, or the count nearest (up to
+# GEO_MAX_RADIUS_KM away) when count is given.
+def getVenuesNear(latitude, longitude, radius_km=None, count=None,
+                  limit=50):
+    index = getIndex()
+    if count is not None:
+        found = index.nearest(latitude, longitude, count,
+                              current_app.config['GEO_MAX_RADIUS_KM'])
+    else:
+        found = index.within(latitude, longitude, radius_km, limit)
+    if not found:
+        return []
+    venues = {
+        row.id: row for row in db.session.query(
+            Venue.id, Venue.name, Venue.city, Venue.state, Venue.image_link
+        ).filter(Venue.id.in_([record_id for record_id, _ in found]))
+    }
+    return [{
+        'id': record_id,
+        'name': venues[record_id].name,
+        'city': venues[record_id].city,
+        'state': venues[record_id].state,
+        'image_link': venues[record_id].image_link,
+        'distance_km': round(distance, 1)
+    } for record_id, distance in found if record_id in venues]
+
+
+# Change hook. Returns the grid updates for the changed venues.
+@hooks.onCommit(geo_index.apply, Venue)
+def collectChanges(table, record_ids, operation):
+    if geo_index.loaded_at is None:
+        return None
+    if operation == 'delete':
+        return [('remove', (record_id,)) for record_id in record_ids]
+    rows = (
+        db.session.query(Venue.id, Venue.latitude, Venue.longitude)
+        .filter(Venue.id.in_(record_ids))
+    )
+    return [('add', tuple(row)) for row in rows]
@@ -0,0 +1,81 @@
+"""--------------------------------------------------------------------------#
+# gunicorn configuration
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Settings can be overridden with the usual environment variables:
+# PORT, WEB_CONCURRENCY (workers), GUNICORN_THREADS, GUNICORN_TIMEOUT.
+# Workers are sync, or threaded (gthread) when there is more than one
+# thread.
+# --------------------------------------------------------------------------"""
+
+import gc
+import os
+import config
+
+
+#  ----------------------------------------------------------------
+#  Functions
+#  ----------------------------------------------------------------
+
+
+# Function returns the number of CPUs this process may run on, which is
+# smaller than the machine's count in containers with a CPU set.
+def availableCpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Function returns the default worker count, (2 x CPUs) + 1 for sync
+# workers that spend part of each request waiting on the database,
+# capped so small database connection limits are not exhausted.
+def defaultWorkers(max_workers=12):
+    return min(availableCpus() * 2 + 1, max_workers)
+
+
+#  ----------------------------------------------------------------
+#  Settings
+#  ----------------------------------------------------------------
+
+
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', defaultWorkers()))
+# Each visitor with live change notices open holds a thread for the
+# stream (which doesn't use a database connection), so those need many.
+threads = int(os.environ.get('GUNICORN_THREADS',
+                             32 if config.LIVE_EVENTS else 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+
+# Import the app (and warm it up, see wsgi.py) once in the master, the
+# forked workers share that memory copy-on-write.
+preload_app = True
+
+# Recycle workers now and then to bound memory growth. The jitter keeps
+# them from all restarting at once.
+max_requests = 1000
+max_requests_jitter = 100
+
+
+#  ----------------------------------------------------------------
+#  Server hooks
+#  ----------------------------------------------------------------
+
+
+def pre_fork(server, worker):
+    # Moves everything allocated so far out of the garbage collector's
+    # reach, so collections in the workers don't touch (and copy) the
+    # shared pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections opened by the master during warm-up must not be used by
+    # several processes. Dropping the pool without closing them leaves the
+    # master's connections alone and gives each worker its own pool.
+    from wsgi import app
+    from models import db
+
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,99 @@
+"""--------------------------------------------------------------------------#
+# Record change hooks
+#
+# The create, edit and delete handlers call recordChanged() inside their
+# transaction, before committing. Listeners registered with onChange()
+# run right away on the same session, so anything they write (e.g. a
+# queued job) is committed or rolled back together with the change.
+#
+# Listeners registered with onCommit() instead collect updates to state
+# outside the database (the in-memory indexes, live events), which are
+# applied once the session commits and dropped if it rolls back.
+# --------------------------------------------------------------------------"""
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db
+
+
+# List of (tables, listener) pairs. An empty tables tuple matches all.
+listeners = []
+
+# Operations after which the records are gone from their table. Shows
+# moved to ShowArchive are 'archive'd rather than deleted.
+removals = ('delete', 'archive')
+
+
+#  ----------------------------------------------------------------
+#  Functions
+#  ----------------------------------------------------------------
+
+
+# Decorator registers a listener for changes to the given models. The
+# listener is called as listener(table, record_ids, operation), where
+# operation is one of 'create', 'edit', 'delete' or 'archive'.
+def onChange(*tables):
+    def register(listener):
+        listeners.append((tables, listener))
+        return listener
+    return register
+
+
+def recordChanged(table, record_ids, operation):
+    record_ids = list(record_ids)
+    if not record_ids:
+        return
+    for tables, listener in listeners:
+        if not tables or table in tables:
+            listener(table, record_ids, operation)
+
+
+# Function returns the (table, record_ids, operation) changes of the
+# given models in a session's flush, for after_flush listeners covering
+# records changed through the ORM rather than by the handlers.
+def flushedChanges(session, tables):
+    changes = []
+    for operation, instances in (('create', session.new),
+                                 ('edit', session.dirty),
+                                 ('delete', session.deleted)):
+        for table in tables:
+            record_ids = [
+                instance.id for instance in instances
+                if type(instance) is table and
+                (operation != 'edit' or session.is_modified(instance))
+            ]
+            if record_ids:
+                changes.append((table, record_ids, operation))
+    return changes
+
+
+#  ----------------------------------------------------------------
+#  Updates applied on commit
+#  ----------------------------------------------------------------
+
+
+# Decorator registers a collector for changes to the given models. The
+# collector is called as collect(table, record_ids, operation) and
+# returns a list of updates, or None. Once the session commits, apply is
+# called with the updates collected in it, in order.
+def onCommit(apply, *tables):
+    def register(collect):
+        def collectUpdates(table, record_ids, operation):
+            updates = collect(table, record_ids, operation)
+            if updates:
+                pending = db.session.info.setdefault('pending_updates', {})
+                pending.setdefault(apply, []).extend(updates)
+        onChange(*tables)(collectUpdates)
+        return collect
+    return register
+
+
+@event.listens_for(Session, 'after_commit')
+def applyUpdates(session):
+    for apply, updates in session.info.pop('pending_updates', {}).items():
+        apply(updates)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discardUpdates(session):
+    session.info.pop('pending_updates', None)
@@ -0,0 +1,87 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import re
+import time
+import uuid
+import random
+from flask import current_app, request
+from models import db, IdempotencyKey, dialectInsert
+
+
+"""--------------------------------------------------------------------------#
+# Idempotent creates
+#
+# Create forms carry a key generated when the form is rendered, API
+# clients can send it in an Idempotency-Key header instead. A create
+# claims its key in the same transaction as the record it adds, so the
+# key is committed exactly when the record is. A double-click or retry
+# of the submission finds the key and is answered like the first one,
+# without validating or writing anything again. Keys are forgotten after
+# IDEMPOTENCY_KEY_SECONDS.
+# --------------------------------------------------------------------------"""
+
+
+key_header = 'Idempotency-Key'
+valid_key = re.compile(r'[A-Za-z0-9._:-]{1,128}')
+prune_probability = 0.001
+
+
+#  ----------------------------------------------------------------
+#  Functions
+#  ----------------------------------------------------------------
+
+
+def newKey():
+    return uuid.uuid4().hex
+
+
+# Function returns the submission's key from the form or the header, or
+# None if it has none or the key doesn't look sane. (The form field's
+# data can't be used, it holds a new key when the field is missing.)
+def requestKey():
+    key = (request.form.get('idempotency_key') or
+           request.headers.get(key_header, ''))
+    return key if valid_key.fullmatch(key) else None
+
+
+def expiredBefore():
+    return time.time() - current_app.config['IDEMPOTENCY_KEY_SECONDS']
+
+
+# Function returns whether a submission of kind with this key was
+# already committed.
+def isDone(kind, key):
+    if key is None:
+        return False
+    return db.session.execute(
+        db.select(IdempotencyKey.key)
+        .where(IdempotencyKey.key == f'{kind}:{key}',
+               IdempotencyKey.created_at > expiredBefore())
+    ).first() is not None
+
+
+# Function claims the key in the current transaction. Returns False if a
+# submission with the key was committed, including one that was still
+# running when this one started (on PostgreSQL the insert waits for it).
+# An expired key is claimed again. Without a key every submission is
+# new.
+def claim(kind, key):
+    if key is None:
+        return True
+    now = time.time()
+    expired_before = expiredBefore()
+    claimed = db.session.execute(
+        dialectInsert(IdempotencyKey)
+        .values(key=f'{kind}:{key}', created_at=now)
+        .on_conflict_do_update(
+            index_elements=['key'], set_={'created_at': now},
+            where=IdempotencyKey.created_at <= expired_before)
+        .returning(IdempotencyKey.key)
+    ).first()
+    if random.random() < prune_probability:
+        (IdempotencyKey.query
+         .filter(IdempotencyKey.created_at <= expired_before)
+         .delete(synchronize_session=False))
+    return claimed is not None
@@ -0,0 +1,184 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import json
+import time
+import random
+import logging
+import datetime
+from models import db, Job, dialectInsert
+
+logger = logging.getLogger(__name__)
+
+
+"""--------------------------------------------------------------------------#
+# Background jobs
+#
+# Jobs are rows in the Job table. Request handlers enqueue them inside
+# their own transaction, a worker process (worker.py) claims them with
+# SELECT ... FOR UPDATE SKIP LOCKED, so several workers can poll the
+# same table without handing out a job twice. Failed jobs are retried
+# with exponential backoff until max_attempts is reached.
+# --------------------------------------------------------------------------"""
+
+
+# Job kind -> function(payload). Filled with the handler decorator.
+handlers = {}
+
+retry_base_seconds = 5
+retry_max_seconds = 3600
+# A running job not finished after this long is assumed to belong to a
+# worker that died, and is handed out again.
+running_timeout_seconds = 600
+
+
+#  ----------------------------------------------------------------
+#  Enqueue
+#  ----------------------------------------------------------------
+
+
+# Decorator registers the function that runs jobs of the given kind.
+def handler(kind):
+    def register(function):
+        handlers[kind] = function
+        return function
+    return register
+
+
+# Function adds a job to the current session's transaction. A job whose
+# idempotency key was already used is not added again, unless the job
+# holding it failed for good (it gives its key up).
+def enqueue(kind, payload=None, key=None, delay=0, max_attempts=5):
+    now = datetime.datetime.utcnow()
+    statement = dialectInsert(Job).values(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        idempotency_key=key,
+        status='queued',
+        attempts=0,
+        max_attempts=max_attempts,
+        run_at=now + datetime.timedelta(seconds=delay),
+        created_at=now
+    ).on_conflict_do_nothing(index_elements=['idempotency_key'])
+    db.session.execute(statement)
+
+
+#  ----------------------------------------------------------------
+#  Worker
+#  ----------------------------------------------------------------
+
+
+def backoff(attempts):
+    delay = min(retry_base_seconds * 2 ** (attempts - 1), retry_max_seconds)
+    return delay * random.uniform(0.5, 1.0)
+
+
+# Function claims the next due job and marks it as running. Returns None
+# if there is nothing to do. (NOTE: SQLite has no row locks, SKIP LOCKED
+# is ignored there, which is fine for a single worker.)
+def claimJob():
+    now = datetime.datetime.utcnow()
+    abandoned = now - datetime.timedelta(seconds=running_timeout_seconds)
+    job = (
+        Job.query
+        .filter(db.or_(
+            db.and_(Job.status == 'queued', Job.run_at <= now),
+            db.and_(Job.status == 'running', Job.started_at < abandoned)
+        ))
+        .order_by(Job.run_at)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if job is None:
+        db.session.rollback()
+        return None
+    job.status = 'running'
+    job.attempts += 1
+    job.started_at = now
+    db.session.commit()
+    return job
+
+
+def runJob(job):
+    try:
+        function = handlers.get(job.kind)
+        if function is None:
+            raise LookupError(f'No handler registered for {job.kind}.')
+        function(json.loads(job.payload))
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Job %s (%s) failed.', job.id, job.kind)
+        job.last_error = repr(e)
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.finished_at = datetime.datetime.utcnow()
+            job.idempotency_key = None
+        else:
+            job.status = 'queued'
+            job.run_at = (datetime.datetime.utcnow() +
+                          datetime.timedelta(seconds=backoff(job.attempts)))
+    else:
+        job.status = 'done'
+        job.finished_at = datetime.datetime.utcnow()
+    db.session.commit()
+
+
+# Function runs jobs until stopped. With once=True it returns as soon as
+# the queue has no due jobs, which is handy for tests and cron.
+def work(app, poll_interval=1.0, once=False):
+    with app.app_context():
+        while True:
+            try:
+                job = claimJob()
+                if job is not None:
+                    runJob(job)
+            except Exception:
+                db.session.rollback()
+                logger.exception('Job worker error.')
+                job = None
+            finally:
+                db.session.remove()
+            if job is None:
+                if once:
+                    return
+                time.sleep(poll_interval)
+
+
+#  ----------------------------------------------------------------
+#  Metrics
+#  ----------------------------------------------------------------
+
+
+# Function returns the number of jobs per status, the age of the oldest
+# due job and the average wait (enqueue to start) and run time of the
+# jobs finished in the last window_seconds.
+def queueStats(window_seconds=3600):
+    now = datetime.datetime.utcnow()
+    depth = dict(
+        db.session.query(Job.status, db.func.count(Job.id))
+        .group_by(Job.status).all()
+    )
+    oldest = (
+        db.session.query(db.func.min(Job.run_at))
+        .filter(Job.status == 'queued', Job.run_at <= now).scalar()
+    )
+    finished = (
+        db.session.query(Job.created_at, Job.started_at, Job.finished_at)
+        .filter(Job.status == 'done',
+                Job.finished_at >= now -
+                datetime.timedelta(seconds=window_seconds))
+        .order_by(Job.finished_at.desc()).limit(1000).all()
+    )
+    waits = [(job.started_at - job.created_at).total_seconds()
+             for job in finished]
+    runs = [(job.finished_at - job.started_at).total_seconds()
+            for job in finished]
+    return {
+        'depth': depth,
+        'oldest_due_seconds': ((now - oldest).total_seconds()
+                               if oldest is not None else 0),
+        'finished': len(finished),
+        'avg_wait_seconds': sum(waits) / len(waits) if waits else 0,
+        'avg_run_seconds': sum(runs) / len(runs) if runs else 0
+    }
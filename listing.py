@@ -0,0 +1,127 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import hooks
+from models import db, Show, ShowListing, Venue, Artist
+
+
+"""--------------------------------------------------------------------------#
+# Show listing
+#
+# ShowListing holds every show with its artist's and venue's name, image
+# and location, so show lists are read from one table instead of joining
+# Show to Artist and Venue. It is kept current in the transaction that
+# changes the shows, artists or venues: by the change hooks for the
+# handlers' statements, and by a flush listener for changes made through
+# the ORM (e.g. seed scripts).
+# --------------------------------------------------------------------------"""
+
+
+# Venue and artist columns copied into the listing, by listing column.
+venue_columns = {
+    'venue_name': Venue.name,
+    'venue_image_link': Venue.image_link,
+    'city': Venue.city,
+    'state': Venue.state
+}
+artist_columns = {
+    'artist_name': Artist.name,
+    'artist_image_link': Artist.image_link
+}
+
+
+#  ----------------------------------------------------------------
+#  Updates
+#  ----------------------------------------------------------------
+
+
+def listingStatements(table, record_ids, operation):
+    if table is Show:
+        statements = [db.delete(ShowListing)
+                      .where(ShowListing.id.in_(record_ids))]
+        if operation not in hooks.removals:
+            columns = {'id': Show.id, 'artist_id': Show.artist_id,
+                       'venue_id': Show.venue_id,
+                       'start_time': Show.start_time,
+                       **artist_columns, **venue_columns}
+            statements.append(db.insert(ShowListing).from_select(
+                list(columns),
+                db.select(*columns.values())
+                .join(Artist, Show.artist_id == Artist.id)
+                .join(Venue, Show.venue_id == Venue.id)
+                .where(Show.id.in_(record_ids))))
+        return statements
+
+    if table is Venue:
+        key, copied = ShowListing.venue_id, venue_columns
+    else:
+        key, copied = ShowListing.artist_id, artist_columns
+    if operation == 'delete':
+        return [db.delete(ShowListing).where(key.in_(record_ids))]
+    if operation == 'edit':
+        return [db.update(ShowListing).where(key.in_(record_ids)).values({
+            name: db.select(column).where(column.table.c.id == key)
+            .scalar_subquery()
+            for name, column in copied.items()
+        })]
+    return []
+
+
+# Change hook. Updates the listing with the handler's change, in the
+# same transaction.
+@hooks.onChange(Venue, Artist, Show)
+def updateListing(table, record_ids, operation):
+    for statement in listingStatements(table, record_ids, operation):
+        db.session.execute(statement)
+
+
+# Flush listener. Updates the listing with the shows, artists and venues
+# added, changed or deleted through the ORM.
+@event.listens_for(Session, 'after_flush')
+def updateListingAfterFlush(session, flush_context):
+    changes = hooks.flushedChanges(session, (Show, Venue, Artist))
+    if not changes:
+        return
+    connection = session.connection()
+    for table, record_ids, operation in changes:
+        for statement in listingStatements(table, record_ids, operation):
+            connection.execute(statement)
+
+
+#  ----------------------------------------------------------------
+#  Reading
+#  ----------------------------------------------------------------
+
+
+listing_columns = (ShowListing.id, ShowListing.artist_id,
+                   ShowListing.venue_id, ShowListing.start_time,
+                   ShowListing.artist_name, ShowListing.artist_image_link,
+                   ShowListing.venue_name, ShowListing.venue_image_link)
+
+
+def recordColumn(table):
+    return ShowListing.venue_id if table is Venue else ShowListing.artist_id
+
+
+# Function returns a venue's or artist's upcoming shows in start time
+# order, as dicts with the fields of a listing.
+def getUpcomingListings(table, record_id, time_now):
+    return [row._asdict() for row in db.session.execute(
+        db.select(*listing_columns)
+        .where(recordColumn(table) == record_id,
+               ShowListing.start_time > time_now)
+        .order_by(ShowListing.start_time, ShowListing.id)
+    )]
+
+
+# Function returns the listings of the given shows, in the given order.
+def getListings(show_ids):
+    if not show_ids:
+        return []
+    rows = {row.id: row._asdict() for row in db.session.execute(
+        db.select(*listing_columns).where(ShowListing.id.in_(show_ids))
+    )}
+    return [rows[show_id] for show_id in show_ids if show_id in rows]
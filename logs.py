@@ -0,0 +1,225 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import os
+import re
+import sys
+import copy
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, request, has_request_context
+
+
+"""--------------------------------------------------------------------------#
+# Logging
+#
+# Records are written as JSON lines, tagged with the ID of the request
+# they belong to. Loggers only put records on an in-memory queue, a
+# listener thread formats them and does the writing, so request threads
+# never wait on disk or pipe I/O.
+# --------------------------------------------------------------------------"""
+
+
+request_id_header = 'X-Request-ID'
+valid_request_id = re.compile(r'[A-Za-z0-9._:-]{1,128}')
+
+# Attributes every LogRecord has. Anything else on a record was passed
+# with extra= and is added to the JSON output.
+standard_attributes = set(vars(logging.LogRecord(
+    '', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_handler = None
+_targets = []
+_listener = None
+
+
+#  ----------------------------------------------------------------
+#  Formatting and filters
+#  ----------------------------------------------------------------
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in standard_attributes and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+# Filter adds the request ID, method and path to records logged while a
+# request is handled.
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+# Filter keeps warnings and errors, and a sample_rate fraction of the
+# records below WARNING.
+class SamplingFilter(logging.Filter):
+    def __init__(self, sample_rate=1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        return (record.levelno >= logging.WARNING or
+                self.sample_rate >= 1 or
+                random.random() < self.sample_rate)
+
+
+#  ----------------------------------------------------------------
+#  Handlers
+#  ----------------------------------------------------------------
+
+
+# Queue handler that renders the message and traceback in the thread
+# that logged them, while the arguments and exception are still current,
+# and queues a record that only holds plain strings.
+class LogQueueHandler(QueueHandler):
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# File handler that rotates when the file reaches max_bytes or after
+# interval seconds, whichever comes first. Old files are numbered like
+# RotatingFileHandler's (error.log.1 is the newest). With several
+# processes writing the same file, log to stdout instead and leave
+# rotation to the platform.
+class RotatingLogFileHandler(RotatingFileHandler):
+    def __init__(self, filename, max_bytes, interval, backup_count):
+        super().__init__(filename, maxBytes=max_bytes,
+                         backupCount=backup_count, encoding='utf-8',
+                         delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record):
+        if self.interval and time.time() >= self.rollover_at:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() > 0:
+                return True
+            self.rollover_at = time.time() + self.interval
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+#  ----------------------------------------------------------------
+#  Setup
+#  ----------------------------------------------------------------
+
+
+def buildHandlers(config):
+    formatter = JsonFormatter()
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if config.get('LOG_FILE'):
+        handlers.append(RotatingLogFileHandler(
+            config['LOG_FILE'], config['LOG_MAX_BYTES'],
+            config['LOG_ROTATE_SECONDS'], config['LOG_BACKUP_COUNT']))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def startListener():
+    global _listener
+    _handler.queue = queue.SimpleQueue()
+    _listener = QueueListener(_handler.queue, *_targets,
+                              respect_handler_level=True)
+    _listener.start()
+
+
+# Function writes out the queued records and stops the listener thread.
+def stopListener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    for target in _targets:
+        target.close()
+
+
+# Function routes all logging through the queue to the configured
+# handlers and tags the app's requests with an ID. Calling it again (a
+# second app in the same process) replaces the previous setup.
+def configureLogging(app):
+    global _handler, _targets
+    root = logging.getLogger()
+    if _handler is not None:
+        stopListener()
+        root.removeHandler(_handler)
+
+    _targets = buildHandlers(app.config)
+    _handler = LogQueueHandler(queue.SimpleQueue())
+    _handler.addFilter(SamplingFilter(app.config['LOG_INFO_SAMPLE_RATE']))
+    _handler.addFilter(RequestContextFilter())
+    root.addHandler(_handler)
+    root.setLevel(app.config['LOG_LEVEL'])
+    startListener()
+
+    app.before_request(assignRequestId)
+    app.after_request(returnRequestId)
+
+
+def restartListenerAfterFork():
+    # The listener thread does not survive a fork (e.g. gunicorn's
+    # preloaded workers), so each child starts its own.
+    if _handler is not None:
+        startListener()
+
+
+os.register_at_fork(after_in_child=restartListenerAfterFork)
+atexit.register(stopListener)
+
+
+#  ----------------------------------------------------------------
+#  Request IDs
+#  ----------------------------------------------------------------
+
+
+# Uses the request ID set by a proxy in front of the app, if it looks
+# sane, so log lines can be matched across both.
+def assignRequestId():
+    request_id = request.headers.get(request_id_header, '')
+    if not valid_request_id.fullmatch(request_id):
+        request_id = uuid.uuid4().hex
+    g.request_id = request_id
+
+
+def returnRequestId(response):
+    if 'request_id' in g:
+        response.headers[request_id_header] = g.request_id
+    return response
@@ -0,0 +1,35 @@
+"""Partition the show table by start time.
+
+Only on PostgreSQL, and only if SHOW_PARTITION_INTERVAL is set.
+
+Revision ID: e6f1a3b9c2d7
+Revises: d4e9b2c6a8f1
+Create Date: 2026-10-19 22:31:52.418806
+
+"""
+from alembic import op
+from flask import current_app
+import partitions
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6f1a3b9c2d7'
+down_revision = 'd4e9b2c6a8f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    interval = current_app.config.get('SHOW_PARTITION_INTERVAL')
+    if (interval is None or connection.dialect.name != 'postgresql' or
+            partitions.isPartitioned(connection)):
+        return
+    partitions.partitionShowTable(
+        connection, interval, current_app.config['SHOW_PARTITIONS_AHEAD'])
+
+
+def downgrade():
+    connection = op.get_bind()
+    if partitions.isPartitioned(connection):
+        partitions.unpartitionShowTable(connection)
@@ -4,11 +4,24 @@
 
 
 import datetime
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import bindparam, event, select
+from sqlalchemy.engine import Engine
 
 db = SQLAlchemy()
 
 
+# SQLite only enforces foreign keys, and their ON DELETE CASCADE (which
+# removes a venue's or artist's shows), when asked to per connection.
+@event.listens_for(Engine, 'connect')
+def enableSqliteForeignKeys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
 """--------------------------------------------------------------------------#
 # Models
 #--------------------------------------------------------------------------"""
@@ -25,7 +38,7 @@ class Venue(db.Model):
     defaultImg = "https://placebear.com/400/400"
     # Main Model
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), nullable=False, unique=True)
+    name = db.Column(db.String(120), nullable=False)
     genres = db.Column(db.String)
     address = db.Column(db.String(120))
     city = db.Column(db.String(120))
@@ -36,8 +49,21 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, nullable=False, server_default='f')
     seeking_description = db.Column(db.String(500))
     image_link = db.Column(db.String(500), nullable=False, default=defaultImg)
+    # Geocoded from the city and state (geo.py), None if not found.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
     # Relationships
-    shows = db.relationship('Show', back_populates='venue', lazy=True)
+    # Shows are removed by the foreign key's ON DELETE CASCADE, so they are
+    # not loaded when a venue is deleted.
+    shows = db.relationship('Show', back_populates='venue', lazy=True,
+                            cascade='all, delete', passive_deletes=True)
+
+    __mapper_args__ = {'version_id_col': version}
+    # Names are unique regardless of case and surrounding spaces.
+    __table_args__ = (db.Index('ix_Venue_name_lower',
+                               db.func.lower(db.func.trim(name)),
+                               unique=True),)
 
 
 #  ----------------------------------------------------------------
@@ -51,7 +77,7 @@ class Artist(db.Model):
     defaultImg = "https://placekitten.com/2000/2000"
     # Main model
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), nullable=False, unique=True)
+    name = db.Column(db.String(120), nullable=False)
     genres = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
@@ -63,8 +89,18 @@ class Artist(db.Model):
     image_link = db.Column(db.String(500), nullable=False, default=defaultImg)
     available_start = db.Column(db.DateTime)
     available_end = db.Column(db.DateTime)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
     # Relationships
-    shows = db.relationship('Show', back_populates='artist', lazy=True)
+    # Shows are removed by the foreign key's ON DELETE CASCADE, so they are
+    # not loaded when an artist is deleted.
+    shows = db.relationship('Show', back_populates='artist', lazy=True,
+                            cascade='all, delete', passive_deletes=True)
+
+    __mapper_args__ = {'version_id_col': version}
+    # Names are unique regardless of case and surrounding spaces.
+    __table_args__ = (db.Index('ix_Artist_name_lower',
+                               db.func.lower(db.func.trim(name)),
+                               unique=True),)
 
 #  ----------------------------------------------------------------
 #  Show model
@@ -81,6 +117,261 @@ class Show(db.Model):
                          ondelete='CASCADE'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False,
                            default=datetime.datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
     # Relationships
     venue = db.relationship('Venue', back_populates='shows', lazy=True)
     artist = db.relationship('Artist', back_populates='shows', lazy=True)
+
+    __mapper_args__ = {'version_id_col': version}
+    # The same show can't be listed twice. A venue's or artist's shows in
+    # start time order, and their counts, are read from the indexes.
+    __table_args__ = (
+        db.UniqueConstraint('artist_id', 'venue_id', 'start_time',
+                            name='uq_Show_artist_id_venue_id_start_time'),
+        db.Index('ix_Show_venue_id_start_time',
+                 'venue_id', 'start_time', 'id'),
+        db.Index('ix_Show_artist_id_start_time',
+                 'artist_id', 'start_time', 'id'),
+    )
+
+
+#  ----------------------------------------------------------------
+#  Show archive model
+#  ----------------------------------------------------------------
+
+
+# Past shows moved out of Show by the archive job (archive.py). They
+# keep their IDs, and only what the detail pages list.
+class ShowArchive(db.Model):
+    __tablename__ = 'ShowArchive'
+    # Main model
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id',
+                          ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id',
+                         ondelete='CASCADE'), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+
+    # Pages of a venue's or artist's archived shows, newest first, and
+    # their counts are read from these indexes alone.
+    __table_args__ = (
+        db.Index('ix_ShowArchive_venue_id_start_time',
+                 'venue_id', 'start_time', 'id'),
+        db.Index('ix_ShowArchive_artist_id_start_time',
+                 'artist_id', 'start_time', 'id'),
+    )
+
+
+#  ----------------------------------------------------------------
+#  Show listing model
+#  ----------------------------------------------------------------
+
+
+# Shows with their artist's and venue's names, images and location,
+# kept current by listing.py. Show lists are read from here instead of
+# joining Show to Artist and Venue. The ID is the show's (no foreign
+# key, a partitioned Show's primary key includes start_time).
+class ShowListing(db.Model):
+    __tablename__ = 'ShowListing'
+    # Main model
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id',
+                          ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id',
+                         ondelete='CASCADE'), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    artist_name = db.Column(db.String(120), nullable=False)
+    artist_image_link = db.Column(db.String(500))
+    venue_name = db.Column(db.String(120), nullable=False)
+    venue_image_link = db.Column(db.String(500))
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+
+    # A venue's or artist's shows in start time order are range scans.
+    __table_args__ = (
+        db.Index('ix_ShowListing_venue_id_start_time',
+                 'venue_id', 'start_time', 'id'),
+        db.Index('ix_ShowListing_artist_id_start_time',
+                 'artist_id', 'start_time', 'id'),
+        db.Index('ix_ShowListing_start_time', 'start_time', 'id'),
+    )
+
+
+#  ----------------------------------------------------------------
+#  Page snapshot model
+#  ----------------------------------------------------------------
+
+
+# Rendered directory pages (snapshots.py), stored compressed. version
+# goes up with every change to what the page lists, the snapshot is
+# current while rendered_version matches it.
+class PageSnapshot(db.Model):
+    __tablename__ = 'PageSnapshot'
+    # Main model
+    name = db.Column(db.String(120), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    rendered_version = db.Column(db.Integer)
+    etag = db.Column(db.String(64))
+    gzip_body = db.Column(db.LargeBinary)
+    br_body = db.Column(db.LargeBinary)
+    rendered_at = db.Column(db.Float)
+    # The asset manifest the page was rendered with (its asset URLs).
+    assets_version = db.Column(db.String(32))
+
+
+#  ----------------------------------------------------------------
+#  Change log model
+#  ----------------------------------------------------------------
+
+
+# Append-only log of venue, artist and show writes (changelog.py), read
+# by downstream consumers in sequence order. sequence is numbered as the
+# change commits. version is the record's version after the change, None
+# for deletes.
+class ChangeLog(db.Model):
+    __tablename__ = 'ChangeLog'
+    # Main model
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'),
+                   primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)
+    record_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(10), nullable=False)
+    version = db.Column(db.Integer)
+    changed_at = db.Column(db.DateTime, nullable=False)
+    sequence = db.Column(db.BigInteger, unique=True, index=True)
+
+    # Compaction looks up the later changes of the same record.
+    __table_args__ = (
+        db.Index('ix_ChangeLog_entity_record_id_sequence',
+                 'entity', 'record_id', 'sequence'),
+    )
+
+
+#  ----------------------------------------------------------------
+#  Job model
+#  ----------------------------------------------------------------
+
+
+class Job(db.Model):
+    __tablename__ = 'Job'
+    # Main model
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(120), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    idempotency_key = db.Column(db.String(255), unique=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    last_error = db.Column(db.Text)
+    run_at = db.Column(db.DateTime, nullable=False,
+                       default=datetime.datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index('ix_Job_status_run_at', 'status', 'run_at'),)
+
+
+class RateLimit(db.Model):
+    __tablename__ = 'RateLimit'
+    # Main model
+    key = db.Column(db.String(255), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    # Seconds since the epoch, so refills are simple arithmetic in SQL.
+    updated_at = db.Column(db.Float, nullable=False)
+
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'IdempotencyKey'
+    # Main model
+    # The kind of record created and the submission's key.
+    key = db.Column(db.String(255), primary_key=True)
+    # Seconds since the epoch, like RateLimit.updated_at.
+    created_at = db.Column(db.Float, nullable=False)
+
+
+"""--------------------------------------------------------------------------#
+# Functions
+#--------------------------------------------------------------------------"""
+
+
+# Function returns an INSERT for the database in use, so callers can add
+# ON CONFLICT clauses (PostgreSQL and SQLite share the syntax). The
+# dialect is imported here, keeping the other one out of the app import.
+def dialectInsert(table):
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects import postgresql
+        return postgresql.insert(table)
+    if db.engine.dialect.name == 'sqlite':
+        from sqlalchemy.dialects import sqlite
+        return sqlite.insert(table)
+    raise NotImplementedError(f'ON CONFLICT is not supported on '
+                              f'{db.engine.dialect.name}.')
+
+
+# Function returns the expression of the table's unique name index.
+def nameKey(table):
+    return db.func.lower(db.func.trim(table.name))
+
+
+# Function returns whether an IntegrityError was raised by the table's
+# unique name index.
+def isNameConflict(error, table):
+    return f'ix_{table.__tablename__}_name_lower' in str(error.orig)
+
+
+#  ----------------------------------------------------------------
+#  Hot queries
+#  ----------------------------------------------------------------
+
+
+# These run on most requests. Their statements are built once, with
+# bound parameters, and reused. Building a statement and generating its
+# cache key on every call takes longer than running it on small tables.
+# (SQLAlchemy caches the compiled SQL either way.)
+_statements = {}
+
+
+def cachedStatement(key, build):
+    statement = _statements.get(key)
+    if statement is None:
+        statement = _statements[key] = build()
+    return statement
+
+
+# Function returns the record with the given primary key, or None.
+def getRecord(table, record_id):
+    statement = cachedStatement(('record', table), lambda: (
+        select(table).where(table.id == bindparam('record_id'))
+    ))
+    return db.session.execute(
+        statement, {'record_id': record_id}).scalar_one_or_none()
+
+
+# Function returns the id, name and image_link of the newest records.
+def getRecent(table, count=5):
+    statement = cachedStatement(('recent', table), lambda: (
+        select(table.id, table.name, table.image_link)
+        .order_by(table.id.desc()).limit(bindparam('count'))
+    ))
+    return db.session.execute(statement, {'count': count}).all()
+
+
+# Function returns the artist and venue IDs of the shows starting after
+# time_now.
+def getUpcomingShowIds(time_now):
+    statement = cachedStatement('upcoming', lambda: (
+        select(Show.artist_id, Show.venue_id)
+        .where(Show.start_time > bindparam('time_now'))
+    ))
+    return db.session.execute(statement, {'time_now': time_now}).all()
+
+
+# Function returns the first record whose column equals value, or None.
+def getFirstMatch(table, column, value):
+    statement = cachedStatement(('first', table, column.key), lambda: (
+        select(table).where(column == bindparam('value')).limit(1)
+    ))
+    return db.session.execute(
+        statement, {'value': value}).scalar_one_or_none()
@@ -0,0 +1,165 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import time
+import threading
+from bisect import bisect_left, bisect_right
+from flask import current_app
+import hooks
+from models import db, Venue, Artist
+
+
+"""--------------------------------------------------------------------------#
+# Name index
+#
+# Artist and venue names kept in memory for autocomplete. Each name is
+# indexed under every word it contains, lower-cased, in a sorted list,
+# so "spo" finds "The Spot" and "Spotlight" with a bisect and a short
+# scan instead of an ILIKE query.
+#
+# Like the show timelines, the index is loaded on first use, kept
+# current from the change hooks when a session commits, and reloaded
+# after NAME_INDEX_MAX_AGE seconds to pick up changes made by other
+# processes.
+# --------------------------------------------------------------------------"""
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+# Function returns the keys a name is indexed under: the name from each
+# of its words to the end.
+def nameKeys(name):
+    words = normalize(name).split(' ')
+    return {' '.join(words[index:]) for index in range(len(words))}
+
+
+#  ----------------------------------------------------------------
+#  Index for a table
+#  ----------------------------------------------------------------
+
+
+class NameIndex(object):
+    def __init__(self):
+        self.keys = []
+        self.ids = []
+        # Record ID -> (name, image_link).
+        self.records = {}
+
+    def add(self, record_id, name, image_link):
+        self.remove(record_id)
+        self.records[record_id] = (name, image_link)
+        for key in nameKeys(name):
+            index = bisect_right(self.keys, key)
+            self.keys.insert(index, key)
+            self.ids.insert(index, record_id)
+
+    def remove(self, record_id):
+        entry = self.records.pop(record_id, None)
+        if entry is None:
+            return
+        for key in nameKeys(entry[0]):
+            index = bisect_left(self.keys, key)
+            while index < len(self.keys) and self.keys[index] == key:
+                if self.ids[index] == record_id:
+                    del self.keys[index]
+                    del self.ids[index]
+                    break
+                index += 1
+
+    # Function builds the index in one sort, for the initial load.
+    def extend(self, rows):
+        entries = []
+        for record_id, name, image_link in rows:
+            self.records[record_id] = (name, image_link)
+            entries.extend((key, record_id) for key in nameKeys(name))
+        entries.sort()
+        self.keys = [key for key, record_id in entries]
+        self.ids = [record_id for key, record_id in entries]
+
+    # Returns up to limit (id, name, image_link) tuples of records with
+    # a word starting with prefix.
+    def search(self, prefix, limit):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        found = []
+        index = bisect_left(self.keys, prefix)
+        while (index < len(self.keys) and len(found) < limit and
+               self.keys[index].startswith(prefix)):
+            if self.ids[index] not in found:
+                found.append(self.ids[index])
+            index += 1
+        return [(record_id,) + self.records[record_id]
+                for record_id in found]
+
+
+#  ----------------------------------------------------------------
+#  Artist and venue indexes
+#  ----------------------------------------------------------------
+
+
+class NameIndexes(object):
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.artists = NameIndex()
+        self.venues = NameIndex()
+        self.loaded_at = None
+
+    def load(self):
+        loaded = {}
+        for kind, table in (('artists', Artist), ('venues', Venue)):
+            loaded[kind] = NameIndex()
+            loaded[kind].extend(
+                db.session.query(table.id, table.name, table.image_link)
+            )
+        with self.lock:
+            self.artists = loaded['artists']
+            self.venues = loaded['venues']
+            self.loaded_at = time.monotonic()
+
+    # Loads the indexes if they were never loaded or are older than
+    # max_age seconds, and returns them.
+    def current(self, max_age):
+        if (self.loaded_at is None or
+                time.monotonic() - self.loaded_at > max_age):
+            self.load()
+        return self
+
+    def search(self, kind, prefix, limit):
+        with self.lock:
+            return getattr(self, kind).search(prefix, limit)
+
+    def apply(self, changes):
+        with self.lock:
+            for kind, method, arguments in changes:
+                getattr(getattr(self, kind), method)(*arguments)
+
+
+name_indexes = NameIndexes()
+
+
+#  ----------------------------------------------------------------
+#  Functions
+#  ----------------------------------------------------------------
+
+
+def getIndexes():
+    return name_indexes.current(current_app.config['NAME_INDEX_MAX_AGE'])
+
+
+# Change hook. Returns the index updates for the changed records.
+@hooks.onCommit(name_indexes.apply, Venue, Artist)
+def collectChanges(table, record_ids, operation):
+    if name_indexes.loaded_at is None:
+        return None
+    kind = 'venues' if table is Venue else 'artists'
+    if operation == 'delete':
+        return [(kind, 'remove', (record_id,)) for record_id in record_ids]
+    rows = (
+        db.session.query(table.id, table.name, table.image_link)
+        .filter(table.id.in_(record_ids))
+    )
+    return [(kind, 'add', tuple(row)) for row in rows]
@@ -0,0 +1,264 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import re
+import datetime
+from flask import current_app
+from sqlalchemy import text
+import hooks
+from models import db, Show
+
+
+"""--------------------------------------------------------------------------#
+# Show partitions
+#
+# On PostgreSQL the Show table can be range partitioned by start_time,
+# one partition per month or year (SHOW_PARTITION_INTERVAL). Queries for
+# upcoming shows then only read the current and future partitions, and
+# old partitions can be detached instead of deleting their rows.
+#
+# The partitioning migration converts the table when the setting is on,
+# "flask maintain-partitions" (run it daily, e.g. from cron) creates the
+# partitions SHOW_PARTITIONS_AHEAD intervals in advance and detaches the
+# ones older than SHOW_PARTITIONS_KEPT intervals, after copying their
+# shows to ShowArchive like the archive job does. Shows outside every
+# partition land in Show_default, so inserts never fail if it doesn't
+# run. Elsewhere (SQLite, or the setting off) Show stays a plain table
+# and all of this does nothing.
+#
+# The primary key becomes (id, start_time), PostgreSQL requires unique
+# constraints to include the partition key. IDs still come from one
+# sequence and the models still use id alone.
+# --------------------------------------------------------------------------"""
+
+
+intervals = ('month', 'year')
+partition_name = re.compile(r'Show_(\d{4})(?:_(\d{2}))?')
+# Advisory lock held while partitions are changed, so two maintenance
+# runs don't create the same partition.
+lock_key = 4315001
+
+
+#  ----------------------------------------------------------------
+#  Intervals
+#  ----------------------------------------------------------------
+
+
+def intervalStart(moment, interval):
+    if interval == 'year':
+        return datetime.datetime(moment.year, 1, 1)
+    return datetime.datetime(moment.year, moment.month, 1)
+
+
+def nextStart(start, interval):
+    if interval == 'year':
+        return start.replace(year=start.year + 1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def previousStart(start, interval):
+    if interval == 'year':
+        return start.replace(year=start.year - 1)
+    if start.month == 1:
+        return start.replace(year=start.year - 1, month=12)
+    return start.replace(month=start.month - 1)
+
+
+def partitionName(start, interval):
+    if interval == 'year':
+        return f'Show_{start:%Y}'
+    return f'Show_{start:%Y_%m}'
+
+
+# Function returns the start of the range a partition named by
+# partitionName() covers, or None for other tables (Show_default).
+def partitionStart(name):
+    match = partition_name.fullmatch(name)
+    if match is None:
+        return None
+    return datetime.datetime(int(match.group(1)), int(match.group(2) or 1),
+                             1)
+
+
+#  ----------------------------------------------------------------
+#  Partitions
+#  ----------------------------------------------------------------
+
+
+def isPartitioned(connection):
+    if connection.dialect.name != 'postgresql':
+        return False
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = to_regclass('\"Show\"')"
+    )).first() is not None
+
+
+def partitionNames(connection):
+    return connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('\"Show\"')"
+    )).scalars().all()
+
+
+# Function creates the partition for the interval starting at start,
+# unless it exists. Shows of that interval already in the default
+# partition are moved to it. Returns whether it was created.
+def createPartition(connection, start, interval):
+    name = partitionName(start, interval)
+    if name in partitionNames(connection):
+        return False
+    # DDL takes no bound parameters. The bounds are dates formatted here.
+    bounds = (f"start_time >= '{start:%Y-%m-%d}' AND "
+              f"start_time < '{nextStart(start, interval):%Y-%m-%d}'")
+    connection.execute(text(
+        f'CREATE TEMPORARY TABLE "Show_moving" AS '
+        f'SELECT * FROM "Show_default" WHERE {bounds}'))
+    connection.execute(text(f'DELETE FROM "Show_default" WHERE {bounds}'))
+    connection.execute(text(
+        f'CREATE TABLE "{name}" PARTITION OF "Show" FOR VALUES '
+        f"FROM ('{start:%Y-%m-%d}') "
+        f"TO ('{nextStart(start, interval):%Y-%m-%d}')"))
+    connection.execute(text('INSERT INTO "Show" SELECT * FROM "Show_moving"'))
+    connection.execute(text('DROP TABLE "Show_moving"'))
+    return True
+
+
+# Function detaches the partitions whose range ended by before. Their
+# shows are copied to ShowArchive first and recorded as archived (in
+# batches of batch_size), so they stay listed as past shows and leave
+# the show listing, timelines and change feed like archived shows. The
+# detached tables can be dropped. Returns their names.
+def detachPartitions(connection, before, interval, batch_size):
+    detached = []
+    for name in partitionNames(connection):
+        start = partitionStart(name)
+        if start is not None and nextStart(start, interval) <= before:
+            show_ids = connection.execute(text(
+                'INSERT INTO "ShowArchive" '
+                '(id, artist_id, venue_id, start_time) '
+                f'SELECT id, artist_id, venue_id, start_time FROM "{name}" '
+                'RETURNING id')).scalars().all()
+            connection.execute(text(
+                f'ALTER TABLE "Show" DETACH PARTITION "{name}"'))
+            for first in range(0, len(show_ids), batch_size):
+                hooks.recordChanged(Show, show_ids[first:first + batch_size],
+                                    'archive')
+            detached.append(name)
+    return detached
+
+
+# Function creates the partitions from the interval of first up to
+# ahead intervals after the one of now.
+def createPartitionsUntil(connection, first, now, interval, ahead):
+    created = []
+    start = intervalStart(first, interval)
+    last = intervalStart(now, interval)
+    for _ in range(ahead):
+        last = nextStart(last, interval)
+    while start <= last:
+        if createPartition(connection, start, interval):
+            created.append(partitionName(start, interval))
+        start = nextStart(start, interval)
+    return created
+
+
+# Function creates the upcoming partitions and detaches the old ones,
+# following the app's settings. Returns the names of the created and the
+# detached partitions.
+def maintainPartitions(now=None):
+    config = current_app.config
+    interval = config['SHOW_PARTITION_INTERVAL']
+    connection = db.session.connection()
+    if interval is None or not isPartitioned(connection):
+        return [], []
+    now = now or datetime.datetime.now()
+    connection.execute(text('SELECT pg_advisory_xact_lock(:key)'),
+                       {'key': lock_key})
+    created = createPartitionsUntil(connection, now, now, interval,
+                                    config['SHOW_PARTITIONS_AHEAD'])
+    detached = []
+    if config['SHOW_PARTITIONS_KEPT'] is not None:
+        before = intervalStart(now, interval)
+        for _ in range(config['SHOW_PARTITIONS_KEPT']):
+            before = previousStart(before, interval)
+        detached = detachPartitions(connection, before, interval,
+                                    config['SHOW_ARCHIVE_BATCH'])
+    db.session.commit()
+    return created, detached
+
+
+#  ----------------------------------------------------------------
+#  Conversion (used by the migration)
+#  ----------------------------------------------------------------
+
+
+show_columns = 'id, artist_id, venue_id, start_time, version'
+
+
+# Function renames the Show table and the constraints backed by indexes,
+# whose names must be unique in the schema, so a new Show table can take
+# their place. The sequence is kept for the new table.
+def setAsideShowTable(connection, new_name):
+    connection.execute(text(f'ALTER TABLE "Show" RENAME TO "{new_name}"'))
+    for constraint in ('Show_pkey', 'uq_Show_artist_id_venue_id_start_time'):
+        connection.execute(text(
+            f'ALTER TABLE "{new_name}" RENAME CONSTRAINT "{constraint}" '
+            f'TO "{constraint.replace("Show", new_name)}"'))
+    connection.execute(text('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE'))
+
+
+def createShowTable(connection, primary_key, partition_by=''):
+    connection.execute(text(f'''
+        CREATE TABLE "Show" (
+            id INTEGER NOT NULL DEFAULT nextval('"Show_id_seq"'),
+            artist_id INTEGER NOT NULL
+                REFERENCES "Artist" (id) ON DELETE CASCADE,
+            venue_id INTEGER NOT NULL
+                REFERENCES "Venue" (id) ON DELETE CASCADE,
+            start_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            CONSTRAINT "Show_pkey" PRIMARY KEY ({primary_key}),
+            CONSTRAINT "uq_Show_artist_id_venue_id_start_time"
+                UNIQUE (artist_id, venue_id, start_time)
+        ) {partition_by}'''))
+
+
+def moveShows(connection, old_name):
+    connection.execute(text(
+        f'INSERT INTO "Show" ({show_columns}) '
+        f'SELECT {show_columns} FROM "{old_name}"'))
+    connection.execute(text('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id'))
+    connection.execute(text(f'DROP TABLE "{old_name}" CASCADE'))
+
+
+# Function replaces the plain Show table with a partitioned one holding
+# the same rows, with partitions from the first show's interval up to
+# ahead intervals from now.
+def partitionShowTable(connection, interval, ahead, now=None):
+    if interval not in intervals:
+        raise ValueError(f'SHOW_PARTITION_INTERVAL must be one of '
+                         f'{intervals} or None, not {interval!r}.')
+    now = now or datetime.datetime.now()
+    setAsideShowTable(connection, 'Show_plain')
+    createShowTable(connection, 'id, start_time',
+                    'PARTITION BY RANGE (start_time)')
+    connection.execute(text(
+        'CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT'))
+    first = connection.execute(text(
+        'SELECT min(start_time) FROM "Show_plain"')).scalar()
+    createPartitionsUntil(connection, min(first or now, now), now, interval,
+                          ahead)
+    moveShows(connection, 'Show_plain')
+
+
+# Function replaces the partitioned Show table with a plain one. Shows in
+# detached partitions are not brought back.
+def unpartitionShowTable(connection):
+    setAsideShowTable(connection, 'Show_partitioned')
+    createShowTable(connection, 'id')
+    moveShows(connection, 'Show_partitioned')
@@ -0,0 +1,167 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import math
+import time
+import random
+import logging
+import threading
+import functools
+from flask import current_app, request, render_template
+from models import db, RateLimit, dialectInsert
+
+logger = logging.getLogger(__name__)
+
+
+"""--------------------------------------------------------------------------#
+# Rate limiting
+#
+# Every client has a token bucket per limited group of endpoints. Each
+# request takes a token, tokens come back at <NAME>_RATE_LIMIT per
+# second up to <NAME>_RATE_BURST, and a request that finds the bucket
+# empty gets a 429 with a Retry-After header.
+#
+# Buckets are kept in a store. MemoryStore keeps them in the process,
+# so every worker process has its own allowance. DatabaseStore keeps
+# them in the RateLimit table, shared by all processes. RATE_LIMIT_STORE
+# picks one of the two, setStore() installs any other object with the
+# same take() method (e.g. one backed by Redis).
+# --------------------------------------------------------------------------"""
+
+
+#  ----------------------------------------------------------------
+#  Stores
+#  ----------------------------------------------------------------
+
+
+class MemoryStore(object):
+    def __init__(self, max_keys=100000):
+        self.lock = threading.Lock()
+        # Key -> (tokens, updated at, full at).
+        self.buckets = {}
+        self.max_keys = max_keys
+
+    # Takes a token from the bucket of key. Returns 0 if there was one,
+    # or else the seconds until there is.
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated_at, full_at = self.buckets.get(key,
+                                                           (burst, now, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self.buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            if len(self.buckets) > self.max_keys:
+                self.prune(now)
+        return wait
+
+    # Drops the buckets that have refilled, they are the same as new
+    # ones. If that is not enough, all buckets are dropped.
+    def prune(self, now):
+        self.buckets = {key: bucket for key, bucket in self.buckets.items()
+                        if bucket[2] > now}
+        if len(self.buckets) > self.max_keys:
+            self.buckets = {}
+
+
+class DatabaseStore(object):
+    def __init__(self, idle_seconds=3600, prune_probability=0.001):
+        self.idle_seconds = idle_seconds
+        self.prune_probability = prune_probability
+
+    def take(self, key, rate, burst):
+        now = time.time()
+        refilled = RateLimit.tokens + (now - RateLimit.updated_at) * rate
+        refilled = db.case((refilled > burst, burst), else_=refilled)
+        # Takes a token in a single statement, so concurrent requests
+        # from several processes can't both take the last one.
+        taken = db.session.execute(
+            db.update(RateLimit)
+            .where(RateLimit.key == key, refilled >= 1)
+            .values(tokens=refilled - 1, updated_at=now)
+            .returning(RateLimit.key)
+        ).first()
+        if taken is None:
+            taken = db.session.execute(
+                dialectInsert(RateLimit)
+                .values(key=key, tokens=burst - 1, updated_at=now)
+                .on_conflict_do_nothing(index_elements=['key'])
+                .returning(RateLimit.key)
+            ).first()
+        wait = 0
+        if taken is None:
+            bucket = db.session.get(RateLimit, key)
+            tokens = min(burst, bucket.tokens +
+                         (now - bucket.updated_at) * rate)
+            wait = max(1 - tokens, 0) / rate
+        if random.random() < self.prune_probability:
+            (RateLimit.query
+             .filter(RateLimit.updated_at < now - self.idle_seconds)
+             .delete(synchronize_session=False))
+        db.session.commit()
+        return wait
+
+
+stores = {
+    'memory': MemoryStore(),
+    'database': DatabaseStore()
+}
+
+# Store installed with setStore(), used instead of RATE_LIMIT_STORE.
+_store = None
+
+
+def setStore(store):
+    global _store
+    _store = store
+
+
+def getStore():
+    if _store is not None:
+        return _store
+    return stores[current_app.config['RATE_LIMIT_STORE']]
+
+
+#  ----------------------------------------------------------------
+#  Functions
+#  ----------------------------------------------------------------
+
+
+# Function returns the client's address. Behind a proxy, wrap the app in
+# werkzeug's ProxyFix so this is the client's and not the proxy's.
+def clientAddress():
+    return request.remote_addr or 'unknown'
+
+
+def tooManyRequests(wait):
+    return (render_template('errors/429.html'), 429,
+            {'Retry-After': str(max(math.ceil(wait), 1))})
+
+
+# Decorator limits a view to <NAME>_RATE_LIMIT requests per second per
+# client, in bursts of up to <NAME>_RATE_BURST. Views decorated with the
+# same name share a bucket. A rate of 0 or None turns the limit off. If
+# the store fails, requests are let through.
+def limited(name):
+    def decorate(view):
+        @functools.wraps(view)
+        def limitedView(*args, **kwargs):
+            config = current_app.config
+            rate = config.get(name.upper() + '_RATE_LIMIT')
+            if rate:
+                try:
+                    wait = getStore().take(f'{name}:{clientAddress()}', rate,
+                                           config[name.upper() +
+                                                  '_RATE_BURST'])
+                except Exception:
+                    db.session.rollback()
+                    logger.exception('Rate limit check for %s failed.', name)
+                    wait = 0
+                if wait:
+                    return tooManyRequests(wait)
+            return view(*args, **kwargs)
+        return limitedView
+    return decorate
@@ -0,0 +1,185 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import gzip
+import time
+import hashlib
+import logging
+from flask import current_app, request, session, make_response
+import assets
+import hooks
+import jobs
+from models import db, PageSnapshot, dialectInsert
+
+logger = logging.getLogger(__name__)
+
+
+"""--------------------------------------------------------------------------#
+# Page snapshots
+#
+# With PAGE_SNAPSHOTS on, the venue and artist directories are served
+# from a rendered copy stored in the PageSnapshot table, gzip and brotli
+# compressed, instead of listing every row on every request. A change to
+# a venue or artist bumps the page's version in the handler's
+# transaction and queues a job that renders the page again. Until it
+# has, and whenever anything goes wrong reading the snapshot, the page
+# is rendered live as before, so a stale page is never served.
+#
+# A snapshot links to the fingerprinted assets of the build it was
+# rendered with. One rendered with another asset manifest than the
+# server's (after "flask build-assets") is stale too, and is rendered
+# again. The job worker must run the same build as the web servers.
+# --------------------------------------------------------------------------"""
+
+
+# Page name -> (path, render function). Filled with the page decorator.
+pages = {}
+
+
+#  ----------------------------------------------------------------
+#  Pages
+#  ----------------------------------------------------------------
+
+
+# Decorator registers a function rendering the page at path, as a
+# snapshot named name that changes with the given models. The function
+# returns the page's HTML, or None if it can't be snapshotted (e.g. it
+# redirects because the table is empty).
+def page(name, path, *tables):
+    def register(render):
+        pages[name] = (path, render)
+
+        @hooks.onChange(*tables)
+        def pageChanged(table, record_ids, operation):
+            if current_app.config['PAGE_SNAPSHOTS']:
+                markStale(name)
+        return render
+    return register
+
+
+# Function bumps the page's version in the current transaction and
+# queues the job rendering it.
+def markStale(name):
+    version = db.session.execute(
+        dialectInsert(PageSnapshot)
+        .values(name=name, version=1)
+        .on_conflict_do_update(
+            index_elements=['name'],
+            set_={'version': PageSnapshot.version + 1})
+        .returning(PageSnapshot.version)
+    ).scalar()
+    jobs.enqueue('snapshots.render', {'name': name},
+                 key=f'snapshots.render:{name}:{version}')
+
+
+def assetsVersion():
+    return assets.manifestVersion(current_app.config['ASSETS_DIST_DIR'])
+
+
+def compress(body):
+    compressed = {'gzip_body': gzip.compress(body, compresslevel=9),
+                  'br_body': None}
+    try:
+        import brotli
+    except ImportError:
+        return compressed
+    compressed['br_body'] = brotli.compress(body)
+    return compressed
+
+
+# Function renders the page and stores it, unless its snapshot is
+# already current. A snapshot rendered from older rows than another one
+# stored meanwhile is dropped.
+def renderSnapshot(name):
+    path, render = pages[name]
+    version = db.session.execute(
+        db.select(PageSnapshot.version)
+        .where(PageSnapshot.name == name,
+               db.or_(PageSnapshot.rendered_version.is_(None),
+                      PageSnapshot.rendered_version !=
+                      PageSnapshot.version))
+    ).scalar()
+    if version is None:
+        db.session.rollback()
+        return False
+    with current_app.test_request_context(path):
+        html = render()
+    if html is None:
+        db.session.rollback()
+        return False
+    body = html.encode('utf-8')
+    db.session.execute(
+        db.update(PageSnapshot)
+        .where(PageSnapshot.name == name,
+               db.or_(PageSnapshot.rendered_version.is_(None),
+                      PageSnapshot.rendered_version < version))
+        .values(rendered_version=version,
+                assets_version=assetsVersion(),
+                etag=hashlib.sha256(body).hexdigest()[:32],
+                rendered_at=time.time(),
+                **compress(body))
+    )
+    db.session.commit()
+    return True
+
+
+@jobs.handler('snapshots.render')
+def renderSnapshotJob(payload):
+    renderSnapshot(payload['name'])
+
+
+#  ----------------------------------------------------------------
+#  Serve
+#  ----------------------------------------------------------------
+
+
+# Function returns the response serving the page's current snapshot, or
+# None to render the page live: snapshots are off, the visitor has
+# messages to flash, the snapshot is missing or stale, or it couldn't be
+# read. A missing snapshot, or one rendered with other assets, is queued
+# to be rendered.
+def snapshotResponse(name):
+    if not current_app.config['PAGE_SNAPSHOTS'] or '_flashes' in session:
+        return None
+    try:
+        snapshot = db.session.get(PageSnapshot, name)
+        if snapshot is None:
+            markStale(name)
+            db.session.commit()
+            return None
+        if snapshot.rendered_version != snapshot.version:
+            return None
+        if snapshot.assets_version != assetsVersion():
+            markStale(name)
+            db.session.commit()
+            return None
+        return compressedResponse(snapshot)
+    except Exception:
+        db.session.rollback()
+        logger.exception('Could not serve the %s snapshot.', name)
+        return None
+    finally:
+        db.session.close()
+
+
+# Function returns the snapshot as a response, brotli or gzip encoded
+# as the client accepts, or decompressed for clients accepting neither.
+def compressedResponse(snapshot):
+    if snapshot.br_body is not None and request.accept_encodings['br']:
+        body, encoding = snapshot.br_body, 'br'
+    elif request.accept_encodings['gzip']:
+        body, encoding = snapshot.gzip_body, 'gzip'
+    else:
+        body, encoding = gzip.decompress(snapshot.gzip_body), None
+
+    response = make_response(body)
+    response.mimetype = 'text/html'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    if encoding is None:
+        response.set_etag(snapshot.etag)
+    else:
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(f'{snapshot.etag}-{encoding}')
+    return response.make_conditional(request)
@@ -2,3 +2,179 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Typeahead for inputs with data-autocomplete="artists" or "venues".
+// Picking a name fills in the ID field given by data-target.
+document.addEventListener('DOMContentLoaded', function() {
+  document.querySelectorAll('input[data-autocomplete]').forEach(function(input) {
+    var target = document.getElementById(input.dataset.target);
+    var list = input.parentNode.querySelector('.typeahead-results');
+    var results = [];
+    var timer = null;
+    var controller = null;
+
+    function pick(result) {
+      input.value = result.name;
+      target.value = result.id;
+      render([]);
+    }
+
+    function render(found) {
+      results = found;
+      list.innerHTML = '';
+      found.forEach(function(result) {
+        var item = document.createElement('li');
+        item.className = 'list-group-item';
+        if (result.image_link) {
+          var image = document.createElement('img');
+          image.src = result.image_link;
+          image.alt = '';
+          item.appendChild(image);
+        }
+        item.appendChild(document.createTextNode(result.name + ' (ID ' + result.id + ')'));
+        item.addEventListener('mousedown', function(event) {
+          event.preventDefault();
+          pick(result);
+        });
+        list.appendChild(item);
+      });
+    }
+
+    input.addEventListener('input', function() {
+      clearTimeout(timer);
+      timer = setTimeout(function() {
+        var query = input.value.trim();
+        if (controller) {
+          controller.abort();
+        }
+        if (!query) {
+          render([]);
+          return;
+        }
+        controller = new AbortController();
+        fetch('/api/autocomplete/' + input.dataset.autocomplete +
+              '?q=' + encodeURIComponent(query), {signal: controller.signal})
+          .then(function(response) { return response.json(); })
+          .then(function(data) { render(data.results); })
+          .catch(function() {});
+      }, 100);
+    });
+    input.addEventListener('keydown', function(event) {
+      if (event.key === 'Enter' && results.length) {
+        event.preventDefault();
+        pick(results[0]);
+      }
+    });
+    input.addEventListener('blur', function() {
+      render([]);
+    });
+  });
+});
+
+// Buttons with data-load-shows (the URL of a venue's or artist's past
+// shows) append the next page of show tiles to the data-target element,
+// starting after the data-after cursor. They load when clicked or
+// scrolled into view. data-show says whether the tiles show the artist
+// or the venue.
+document.addEventListener('DOMContentLoaded', function() {
+  document.querySelectorAll('button[data-load-shows]').forEach(function(button) {
+    var target = document.getElementById(button.dataset.target);
+    var show = button.dataset.show;
+    var next = button.dataset.after;
+
+    function tile(item) {
+      var href = '/' + show + 's/' + item[show + '_id'];
+      var column = document.createElement('div');
+      var box = document.createElement('div');
+      var imageLink = document.createElement('a');
+      var image = document.createElement('img');
+      var name = document.createElement('h5');
+      var nameLink = document.createElement('a');
+      var time = document.createElement('h6');
+      column.className = 'col-sm-4';
+      box.className = 'tile tile-show';
+      imageLink.href = href;
+      image.src = item[show + '_image_link'];
+      image.alt = 'Show Image';
+      nameLink.href = href;
+      nameLink.textContent = item[show + '_name'];
+      time.textContent = item.start_time;
+      imageLink.appendChild(image);
+      name.appendChild(nameLink);
+      box.appendChild(imageLink);
+      box.appendChild(name);
+      box.appendChild(time);
+      column.appendChild(box);
+      return column;
+    }
+
+    function inView() {
+      return button.getBoundingClientRect().top < window.innerHeight;
+    }
+
+    function load() {
+      if (button.disabled) {
+        return;
+      }
+      button.disabled = true;
+      fetch(button.dataset.loadShows + '?after=' + encodeURIComponent(next))
+        .then(function(response) { return response.json(); })
+        .then(function(data) {
+          data.shows.forEach(function(item) {
+            target.appendChild(tile(item));
+          });
+          next = data.next;
+          if (!next) {
+            button.remove();
+            return;
+          }
+          button.disabled = false;
+          // A short page may leave the button in view, the observer
+          // won't fire again until it leaves and comes back.
+          if (inView()) {
+            load();
+          }
+        })
+        .catch(function() { button.disabled = false; });
+    }
+
+    button.addEventListener('click', load);
+    if ('IntersectionObserver' in window) {
+      new IntersectionObserver(function(entries) {
+        if (entries[0].isIntersecting) {
+          load();
+        }
+      }).observe(button);
+    }
+  });
+});
+
+// Elements with data-live-events (event kinds, e.g. "show venue") are
+// shown, with a count, when venues, artists or shows of those kinds are
+// created, edited, deleted or archived after the page was loaded.
+document.addEventListener('DOMContentLoaded', function() {
+  var notices = document.querySelectorAll('[data-live-events]');
+  if (!notices.length || !window.EventSource) {
+    return;
+  }
+  var source = new EventSource('/events');
+  var counts = [];
+
+  function changed(kind) {
+    notices.forEach(function(notice, index) {
+      if (kind !== 'reset' && notice.dataset.liveEvents.split(' ').indexOf(kind) === -1) {
+        return;
+      }
+      counts[index] = (counts[index] || 0) + 1;
+      notice.querySelector('.live-count').textContent = counts[index];
+      notice.hidden = false;
+    });
+  }
+
+  ['venue', 'artist', 'show'].forEach(function(kind) {
+    ['create', 'edit', 'delete', 'archive'].forEach(function(operation) {
+      source.addEventListener(kind + '.' + operation, function() { changed(kind); });
+    });
+  });
+  source.addEventListener('reset', function() { changed('reset'); });
+});
@@ -0,0 +1,97 @@
+"""--------------------------------------------------------------------------#
+# Test fixtures
+#
+# Each test gets the app on a fresh SQLite database in a temporary
+# directory, with warm-up, the template cache, the log file and search
+# rate limits off, and change log entries handed out right away.
+# --------------------------------------------------------------------------"""
+
+import types
+import pytest
+import config
+import geo
+import nameindex
+import timeline
+from app import create_app
+from models import db, Venue, Artist
+
+
+@pytest.fixture
+def app(tmp_path):
+    settings = {name: getattr(config, name) for name in dir(config)
+                if name.isupper()}
+    settings.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "fyyur.db"}',
+        SQLALCHEMY_ENGINE_OPTIONS={},
+        TEMPLATE_CACHE_DIR=None,
+        WARMUP_ON_START=False,
+        LOG_FILE=None,
+        SEARCH_RATE_LIMIT=0,
+        THUMB_DIR=str(tmp_path / 'thumbs'),
+    )
+    app = create_app(types.SimpleNamespace(**settings))
+    with app.app_context():
+        db.create_all()
+    # The in-memory indexes are per process: load them from this test's
+    # database when they are first used.
+    for index in (geo.geo_index, nameindex.name_indexes,
+                  timeline.timelines):
+        index.loaded_at = None
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+#  ----------------------------------------------------------------
+#  Records and form data
+#  ----------------------------------------------------------------
+
+
+@pytest.fixture
+def venue_form():
+    return {'name': 'The Spot', 'city': 'Austin', 'state': 'TX',
+            'address': '1 Main St', 'phone': '1234567890',
+            'image_link': 'https://example.com/spot.jpg',
+            'genres': ['Jazz']}
+
+
+@pytest.fixture
+def artist_form():
+    return {'name': 'The Band', 'city': 'Reno', 'state': 'NV',
+            'phone': '1234567890',
+            'image_link': 'https://example.com/band.jpg',
+            'genres': ['Jazz'], 'seeking_venue': 'y',
+            'seeking_description': 'Looking for a stage.',
+            'available_start': '2026-01-01 00:00',
+            'available_end': '2029-01-01 00:00'}
+
+
+# Fixture returns the ID of a venue added through the ORM.
+@pytest.fixture
+def venue(app):
+    with app.app_context():
+        record = Venue(name='The Spot', city='Austin', state='TX',
+                       address='1 Main St', phone='123-456-7890',
+                       genres='Jazz')
+        db.session.add(record)
+        db.session.commit()
+        return record.id
+
+
+# Fixture returns the ID of an artist seeking venues, added through the
+# ORM.
+@pytest.fixture
+def artist(app):
+    with app.app_context():
+        record = Artist(name='The Band', city='Reno', state='NV',
+                        phone='123-456-7890', genres='Jazz',
+                        seeking_venue=True)
+        db.session.add(record)
+        db.session.commit()
+        return record.id
@@ -0,0 +1,46 @@
+"""--------------------------------------------------------------------------#
+# Static asset builds
+# --------------------------------------------------------------------------"""
+
+import os
+import assets
+
+
+def writeStatic(static_dir, css):
+    os.makedirs(static_dir / 'css', exist_ok=True)
+    (static_dir / 'css' / 'main.css').write_text(css)
+    (static_dir / 'logo.txt').write_text('logo')
+
+
+def builtName(dist_dir, logical_path):
+    return assets.loadManifest(str(dist_dir))[logical_path]
+
+
+def test_rebuild_keeps_the_previous_build(tmp_path):
+    static_dir, dist_dir = tmp_path / 'static', tmp_path / 'dist'
+    writeStatic(static_dir, 'body { color: red; }')
+    first = assets.buildAssets(str(static_dir), str(dist_dir))
+    writeStatic(static_dir, 'body { color: blue; }')
+    second = assets.buildAssets(str(static_dir), str(dist_dir))
+
+    assert first['css/main.css'] != second['css/main.css']
+    for manifest in (first, second):
+        assert (dist_dir / manifest['css/main.css']).is_file()
+        assert (dist_dir / (manifest['css/main.css'] + '.gz')).is_file()
+    assert assets.loadManifest(str(dist_dir)) == second
+    assert not list(dist_dir.glob('*.tmp'))
+
+
+def test_builds_older_than_the_kept_ones_are_pruned(tmp_path):
+    static_dir, dist_dir = tmp_path / 'static', tmp_path / 'dist'
+    built = []
+    for number in range(4):
+        writeStatic(static_dir, f'body {{ order: {number}; }}')
+        built.append(assets.buildAssets(str(static_dir), str(dist_dir),
+                                        kept_builds=2)['css/main.css'])
+
+    assert [(dist_dir / name).is_file() for name in built] == [
+        False, False, True, True]
+    assert not (dist_dir / (built[0] + '.gz')).exists()
+    # Unchanged files are shared by every build and stay.
+    assert (dist_dir / builtName(dist_dir, 'logo.txt')).is_file()
@@ -0,0 +1,74 @@
+"""--------------------------------------------------------------------------#
+# Bulk deletes
+# --------------------------------------------------------------------------"""
+
+import datetime
+import pytest
+from models import db, Venue, Show
+
+
+# Fixture adds venues in Austin and Dallas, each with a show of the
+# artist, and returns the Austin venue IDs.
+@pytest.fixture
+def austin_venues(app, venue, artist):
+    with app.app_context():
+        dallas = Venue(name='The Other Spot', city='Dallas', state='TX',
+                       address='2 Main St', phone='123-456-7890',
+                       genres='Jazz')
+        austin = Venue(name='The Third Spot', city='Austin', state='TX',
+                       address='3 Main St', phone='123-456-7890',
+                       genres='Jazz')
+        db.session.add_all([dallas, austin])
+        db.session.flush()
+        db.session.add_all([
+            Show(artist_id=artist, venue_id=venue_id,
+                 start_time=datetime.datetime(2027, 5, day, 20))
+            for day, venue_id in enumerate((venue, dallas.id, austin.id),
+                                           start=5)])
+        db.session.commit()
+        return [venue, austin.id]
+
+
+def remaining(app):
+    with app.app_context():
+        venues = db.session.execute(
+            db.select(Venue.city).order_by(Venue.id)).scalars().all()
+        shows = db.session.execute(
+            db.select(Venue.city).join(Show.venue)
+            .order_by(Show.start_time)).scalars().all()
+    return venues, shows
+
+
+def test_delete_by_filter_takes_the_shows_along(app, client,
+                                                austin_venues):
+    response = client.delete('/venues', json={'filter': {'city': 'Austin'}})
+    assert response.status_code == 200
+    assert response.get_json() == {'success': True, 'deleted': 2}
+    assert remaining(app) == (['Dallas'], ['Dallas'])
+
+
+def test_delete_by_ids(app, client, austin_venues):
+    response = client.delete('/venues', json={'ids': austin_venues[:1]})
+    assert response.get_json()['deleted'] == 1
+    assert remaining(app) == (['Dallas', 'Austin'], ['Dallas', 'Austin'])
+
+
+def test_shows_are_deleted_by_start_time(app, client, austin_venues):
+    response = client.delete('/shows', json={
+        'filter': {'start_time_before': '2027-05-06 21:00'}})
+    assert response.get_json()['deleted'] == 2
+    assert remaining(app)[1] == ['Austin']
+
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'ids': [1], 'filter': {'capacity': 10}},
+    {'ids': ['one']},
+    {'filter': {'city': 'Austin', 'name_after': 'soon'}},
+])
+def test_bad_request_deletes_nothing(app, client, austin_venues, body):
+    response = client.delete('/venues', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert remaining(app) == (['Austin', 'Dallas', 'Austin'],
+                              ['Austin', 'Dallas', 'Austin'])
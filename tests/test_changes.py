@@ -0,0 +1,126 @@
+"""--------------------------------------------------------------------------#
+# Change feed
+# --------------------------------------------------------------------------"""
+
+import datetime
+import archive
+from models import db, Venue, Artist, Show, ChangeLog
+
+
+def getChanges(client, since=0, **query):
+    return client.get('/api/changes',
+                      query_string=dict(query, since=since)).get_json()
+
+
+def summary(changes):
+    return [(change['entity'], change['operation'], change['version'])
+            for change in changes]
+
+
+def test_feed_lists_creates_edits_and_deletes_in_order(app, client,
+                                                       venue_form,
+                                                       artist_form):
+    client.post('/venues/create', data=venue_form)
+    client.post('/artists/create', data=artist_form)
+    with app.app_context():
+        venue = db.session.execute(db.select(Venue.id)).scalar()
+        artist = db.session.execute(db.select(Artist.id)).scalar()
+    client.post('/shows/create', data={'artist_id': artist,
+                                       'venue_id': venue,
+                                       'start_time': '2027-05-05 20:00'})
+    client.post(f'/venues/{venue}/edit', data=dict(
+        venue_form, id=venue, version=1, name='The New Spot'))
+    # The venue's show goes with it, and is in the feed too.
+    client.delete(f'/venues/{venue}')
+
+    changes = getChanges(client)['changes']
+    assert summary(changes) == [
+        ('Venue', 'create', 1),
+        ('Artist', 'create', 1),
+        ('Show', 'create', 1),
+        ('Venue', 'edit', 2),
+        ('Show', 'delete', None),
+        ('Venue', 'delete', None)
+    ]
+    assert [change['id'] for change in changes] == sorted(
+        change['id'] for change in changes)
+    assert changes[2]['record_id'] == changes[4]['record_id']
+
+
+def test_bulk_delete_lists_the_cascaded_shows(app, client, venue, artist):
+    with app.app_context():
+        db.session.add_all([
+            Show(artist_id=artist, venue_id=venue,
+                 start_time=datetime.datetime(2027, 5, day, 20))
+            for day in (5, 6)])
+        db.session.commit()
+        show_ids = db.session.execute(db.select(Show.id)).scalars().all()
+    since = getChanges(client)['next']
+
+    response = client.delete('/artists', json={'ids': [artist]})
+    assert response.get_json()['deleted'] == 1
+
+    changes = getChanges(client, since)['changes']
+    assert [(change['entity'], change['record_id'], change['operation'])
+            for change in changes] == [
+        ('Show', show_ids[0], 'delete'),
+        ('Show', show_ids[1], 'delete'),
+        ('Artist', artist, 'delete')
+    ]
+
+
+def test_archived_shows_are_listed_as_archived(app, client, venue, artist):
+    with app.app_context():
+        show = Show(artist_id=artist, venue_id=venue,
+                    start_time=datetime.datetime(2020, 1, 1, 20))
+        db.session.add(show)
+        db.session.commit()
+        show_id = show.id
+    since = getChanges(client)['next']
+
+    with app.app_context():
+        assert archive.archiveShows(datetime.datetime(2021, 1, 1), 10) == 1
+
+    changes = getChanges(client, since)['changes']
+    assert [(change['entity'], change['record_id'], change['operation'])
+            for change in changes] == [('Show', show_id, 'archive')]
+
+
+def test_feed_is_read_in_batches(client, venue_form):
+    for number in range(5):
+        client.post('/venues/create',
+                    data=dict(venue_form, name=f'Venue {number}'))
+
+    first = getChanges(client, limit=3)
+    assert (len(first['changes']), first['more']) == (3, True)
+    rest = getChanges(client, first['next'], limit=3)
+    assert (len(rest['changes']), rest['more']) == (2, False)
+    assert rest['changes'][0]['id'] > first['next']
+    assert getChanges(client, rest['next'])['changes'] == []
+
+
+def test_changes_are_listed_in_commit_order(app, client, venue,
+                                            venue_form):
+    since = getChanges(client)['next']
+    client.post('/venues/create',
+                data=dict(venue_form, name='The Quick Spot'))
+    quick = getChanges(client, since)
+    with app.app_context():
+        # As if the edit below was made in a long transaction, which took
+        # its ID before the quick create but commits after it was read.
+        early_id = db.session.execute(
+            db.update(ChangeLog).where(ChangeLog.sequence == quick['next'])
+            .values(id=ChangeLog.id + 1).returning(ChangeLog.id)
+        ).scalar() - 1
+        db.session.commit()
+        db.session.get(Venue, venue).name = 'The Slow Spot'
+        db.session.flush()
+        db.session.execute(db.update(ChangeLog)
+                           .where(ChangeLog.sequence.is_(None))
+                           .values(id=early_id))
+        db.session.commit()
+
+    assert summary(quick['changes']) == [('Venue', 'create', 1)]
+    slow = getChanges(client, quick['next'])['changes']
+    assert summary(slow) == [('Venue', 'edit', 2)]
+    assert slow[0]['record_id'] == venue
@@ -0,0 +1,18 @@
+"""--------------------------------------------------------------------------#
+# Commands
+# --------------------------------------------------------------------------"""
+
+import pytest
+
+
+@pytest.mark.parametrize('command, output', [
+    ('locate-venues', 'Located 1 venues.\n'),
+    ('compact-changes', 'Queued the change log compaction job.\n'),
+    ('build-thumbnails', 'Queued thumbnails for 1 images.\n'),
+    ('maintain-partitions', 'Created 0 and detached 0 partitions.\n'),
+    ('archive-shows', 'Queued the show archive job.\n'),
+])
+def test_commands_report_on_stdout(app, venue, command, output):
+    result = app.test_cli_runner().invoke(args=[command])
+    assert result.exit_code == 0, result.output
+    assert result.output == output
@@ -0,0 +1,81 @@
+"""--------------------------------------------------------------------------#
+# Live change events
+# --------------------------------------------------------------------------"""
+
+import queue
+import pytest
+import events
+import hooks
+from models import db, Venue
+
+
+@pytest.fixture
+def live_app(app):
+    app.config.update(LIVE_EVENTS=True, EVENTS_STREAM_SECONDS=0.2,
+                      EVENTS_KEEPALIVE_SECONDS=0.1)
+    events.hub = None
+    yield app
+    events.hub = None
+
+
+# Function returns the stream's blocks, each split into lines.
+def getEvents(client, last_id=None):
+    headers = {'Last-Event-ID': str(last_id)} if last_id else {}
+    response = client.get('/events', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    body = response.get_data(as_text=True)
+    assert body.endswith('\n\n')
+    return [block.split('\n') for block in body[:-2].split('\n\n')]
+
+
+def test_events_are_off_by_default(client):
+    assert client.get('/events').status_code == 404
+
+
+def test_stream_sends_the_events_missed_since_the_last_id(live_app, client,
+                                                           venue_form):
+    blocks = getEvents(client)
+    assert blocks[0] == ['retry: 1000']
+    start_id = int(blocks[1][0].split(': ')[1])
+    assert set(map(tuple, blocks[2:])) <= {(': keepalive',)}
+
+    client.post('/venues/create', data=venue_form)
+    blocks = getEvents(client, start_id)
+    event_id, kind, data = blocks[1]
+    assert int(event_id.split(': ')[1]) > start_id
+    assert (kind, data) == ('event: venue.create', 'data: {"ids": [1]}')
+    # The stream carries on from that event.
+    assert int(blocks[2][0].split(': ')[1]) >= int(event_id.split(': ')[1])
+
+
+def test_stream_resets_clients_that_may_have_missed_events(live_app,
+                                                           client):
+    blocks = getEvents(client, 1)
+    assert blocks[1] == ['event: reset', 'data: {"ids": []}']
+
+
+def test_events_reach_the_hub_once_committed(live_app, venue):
+    with live_app.app_context():
+        subscriber = events.getHub().subscribe()[0]
+        hooks.recordChanged(Venue, [venue], 'edit')
+        db.session.rollback()
+        assert subscriber.empty()
+
+        hooks.recordChanged(Venue, [venue], 'edit')
+        hooks.recordChanged(Venue, list(range(1, 1001)), 'delete')
+        assert subscriber.empty()
+        db.session.commit()
+
+    received = []
+    while True:
+        try:
+            received.append(subscriber.get_nowait())
+        except queue.Empty:
+            break
+    assert [(message['type'], len(message['ids']))
+            for message in received] == [
+        ('venue.edit', 1), ('venue.delete', 500), ('venue.delete', 500)]
+    assert [message['id'] for message in received] == sorted(
+        message['id'] for message in received)
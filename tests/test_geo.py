@@ -0,0 +1,67 @@
+"""--------------------------------------------------------------------------#
+# Venues near a place
+# --------------------------------------------------------------------------"""
+
+import pytest
+import geo
+from models import db, Venue
+
+
+# Fixture adds venues a few km apart around Austin, TX.
+@pytest.fixture
+def located_venues(app):
+    with app.app_context():
+        db.session.add_all([
+            Venue(name=f'Venue {number}', city='Austin', state='TX',
+                  address='1 Main St', phone='123-456-7890', genres='Jazz',
+                  latitude=30.27 + number * 0.01, longitude=-97.74)
+            for number in range(5)])
+        db.session.commit()
+
+
+def test_venues_within_a_radius(client, located_venues):
+    body = client.get('/api/venues/near', query_string={
+        'lat': 30.27, 'lon': -97.74, 'radius': 10}).get_json()
+    assert [venue['name'] for venue in body['results']] == [
+        f'Venue {number}' for number in range(5)]
+
+
+@pytest.mark.parametrize('query', [
+    {'lat': 30.27, 'lon': -97.74, 'radius': 'nan'},
+    {'lat': 30.27, 'lon': -97.74, 'radius': 'inf'},
+    {'lat': 'nan', 'lon': -97.74},
+    {'lat': 30.27, 'lon': '-inf'},
+    {'lat': 30.27, 'lon': -97.74, 'radius': 'far'},
+    {'lat': 30.27, 'lon': -97.74, 'limit': 'all'}
+])
+def test_bad_numbers_are_rejected(client, located_venues, query):
+    response = client.get('/api/venues/near', query_string=query)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_limit_is_clamped(client, located_venues):
+    for limit, expected in ((-1, 1), (0, 1), (3, 3), (1000, 5)):
+        body = client.get('/api/venues/near', query_string={
+            'lat': 30.27, 'lon': -97.74, 'radius': 10,
+            'limit': limit}).get_json()
+        assert len(body['results']) == expected
+
+
+def test_bad_radius_on_the_page_redirects(client, located_venues):
+    response = client.get('/venues/near', query_string={
+        'city': 'Austin', 'state': 'TX', 'radius': 'nan'})
+    assert response.status_code == 302
+
+
+def test_locating_a_venue_bumps_its_version(app, client, venue):
+    etag = client.get(f'/venues/{venue}/edit').headers['ETag']
+    with app.app_context():
+        assert geo.locateVenues() == 1
+        record = db.session.get(Venue, venue)
+        assert record.latitude is not None and record.version == 2
+
+    assert client.get(f'/venues/{venue}/edit').headers['ETag'] != etag
+    changes = client.get('/api/changes').get_json()['changes']
+    assert [(change['operation'], change['version'])
+            for change in changes] == [('create', 1), ('edit', 2)]
@@ -0,0 +1,57 @@
+"""--------------------------------------------------------------------------#
+# Idempotent create submissions
+# --------------------------------------------------------------------------"""
+
+import re
+from models import db, Venue, Artist, Show, IdempotencyKey
+
+
+def test_create_form_carries_a_key(client):
+    response = client.get('/venues/create')
+    assert re.search(rb'name="idempotency_key" type="hidden" '
+                     rb'value="[0-9a-f]{32}"', response.data)
+
+
+def test_replayed_venue_key_returns_the_first_response(app, client,
+                                                      venue_form):
+    form = dict(venue_form, idempotency_key='form-key-1')
+    first = client.post('/venues/create', data=form)
+    replayed = client.post('/venues/create', data=form)
+    # Even a different submission with the key is answered the same way.
+    changed = client.post('/venues/create',
+                          data=dict(form, name='Another Spot'))
+
+    assert first.status_code == 302
+    for response in (replayed, changed):
+        assert response.status_code == first.status_code
+        assert response.headers['Location'] == first.headers['Location']
+    with app.app_context():
+        assert db.session.execute(
+            db.select(Venue.name)).scalars().all() == ['The Spot']
+
+
+def test_replayed_show_key_adds_one_show(app, client, venue, artist):
+    form = {'artist_id': artist, 'venue_id': venue,
+            'start_time': '2027-05-05 20:00'}
+    headers = {'Idempotency-Key': 'api-key-1'}
+    first = client.post('/shows/create', data=form, headers=headers)
+    replayed = client.post('/shows/create', data=form, headers=headers)
+
+    assert first.status_code == replayed.status_code == 302
+    assert replayed.headers['Location'] == first.headers['Location']
+    with app.app_context():
+        assert db.session.query(Show).count() == 1
+
+
+def test_keys_are_per_kind(app, client, venue_form, artist_form):
+    client.post('/venues/create',
+                data=dict(venue_form, idempotency_key='shared-key'))
+    client.post('/artists/create',
+                data=dict(artist_form, idempotency_key='shared-key'))
+
+    with app.app_context():
+        assert db.session.query(Venue).count() == 1
+        assert db.session.query(Artist).count() == 1
+        assert sorted(db.session.execute(
+            db.select(IdempotencyKey.key)).scalars()) == [
+            'artist:shared-key', 'venue:shared-key']
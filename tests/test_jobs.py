@@ -0,0 +1,114 @@
+"""--------------------------------------------------------------------------#
+# Background jobs
+# --------------------------------------------------------------------------"""
+
+import datetime
+import pytest
+import jobs
+from models import db, Job
+
+
+# Fixture registers a 'test.flaky' handler failing its first runs, and
+# returns the payloads it was called with.
+@pytest.fixture
+def flaky(monkeypatch):
+    calls = []
+
+    def run(payload):
+        calls.append(payload)
+        if len(calls) <= payload.get('failures', 0):
+            raise RuntimeError(f'failure {len(calls)}')
+
+    monkeypatch.setitem(jobs.handlers, 'test.flaky', run)
+    return calls
+
+
+def enqueue(app, **kwargs):
+    with app.app_context():
+        jobs.enqueue('test.flaky', **kwargs)
+        db.session.commit()
+
+
+def getJobs(app):
+    with app.app_context():
+        return db.session.query(Job).order_by(Job.id).all()
+
+
+# Function makes the queued jobs due now, skipping the retry backoff.
+def makeDue(app):
+    with app.app_context():
+        db.session.execute(db.update(Job).values(
+            run_at=datetime.datetime.utcnow()))
+        db.session.commit()
+
+
+def test_jobs_run_once_per_key(app, flaky):
+    for _ in range(2):
+        enqueue(app, payload={'n': 1}, key='test:1')
+    enqueue(app, payload={'n': 2})
+    jobs.work(app, once=True)
+
+    assert flaky == [{'n': 1}, {'n': 2}]
+    assert [(job.status, job.attempts) for job in getJobs(app)] == [
+        ('done', 1), ('done', 1)]
+
+
+def test_failed_job_is_retried_after_a_backoff(app, flaky):
+    enqueue(app, payload={'failures': 1})
+    before = datetime.datetime.utcnow()
+    jobs.work(app, once=True)
+
+    job, = getJobs(app)
+    assert (job.status, job.attempts) == ('queued', 1)
+    assert job.last_error == "RuntimeError('failure 1')"
+    delay = (job.run_at - before).total_seconds()
+    assert jobs.retry_base_seconds / 2 <= delay <= jobs.retry_base_seconds + 1
+    # Not run again before then.
+    jobs.work(app, once=True)
+    assert len(flaky) == 1
+
+    makeDue(app)
+    jobs.work(app, once=True)
+    job, = getJobs(app)
+    assert (job.status, job.attempts, len(flaky)) == ('done', 2, 2)
+
+
+def test_job_fails_for_good_after_its_attempts(app, flaky):
+    enqueue(app, payload={'failures': 5}, key='test:1', max_attempts=3)
+    for _ in range(3):
+        makeDue(app)
+        jobs.work(app, once=True)
+
+    job, = getJobs(app)
+    assert (job.status, job.attempts, len(flaky)) == ('failed', 3, 3)
+    assert job.finished_at is not None and job.idempotency_key is None
+    makeDue(app)
+    jobs.work(app, once=True)
+    assert len(flaky) == 3
+
+
+@pytest.mark.parametrize('attempts, low, high', [
+    (1, 2.5, 5), (3, 10, 20), (12, 1800, 3600), (40, 1800, 3600)])
+def test_backoff_doubles_up_to_the_maximum(attempts, low, high):
+    for _ in range(20):
+        assert low <= jobs.backoff(attempts) <= high
+
+
+def test_abandoned_job_is_handed_out_again(app, flaky):
+    enqueue(app)
+    timeout = datetime.timedelta(seconds=jobs.running_timeout_seconds)
+    with app.app_context():
+        job = jobs.claimJob()
+        assert (job.status, job.attempts) == ('running', 1)
+        # Still within its lease, another worker doesn't get it.
+        assert jobs.claimJob() is None
+        db.session.execute(db.update(Job).values(
+            started_at=datetime.datetime.utcnow() - timeout -
+            datetime.timedelta(seconds=1)))
+        db.session.commit()
+        job = jobs.claimJob()
+        assert (job.status, job.attempts) == ('running', 2)
+        jobs.runJob(job)
+
+    job, = getJobs(app)
+    assert (job.status, len(flaky)) == ('done', 1)
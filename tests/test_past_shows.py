@@ -0,0 +1,85 @@
+"""--------------------------------------------------------------------------#
+# Paged past shows
+# --------------------------------------------------------------------------"""
+
+import datetime
+import pytest
+import archive
+from models import db, Venue, Artist, Show, ShowArchive
+
+
+# Fixture books past shows at the venue, some of them sharing a start
+# time, moves the older ones to the archive and books an upcoming one.
+# Returns the past show IDs, newest first (ties by ID, highest first).
+@pytest.fixture
+def past_shows(app, venue, artist):
+    now = datetime.datetime.now().replace(microsecond=0)
+    with app.app_context():
+        other = Artist(name='Other Band', city='Reno', state='NV',
+                       phone='123-456-7890', genres='Jazz',
+                       seeking_venue=True)
+        db.session.add(other)
+        db.session.flush()
+        shows = [Show(artist_id=artist_id, venue_id=venue,
+                      start_time=now - datetime.timedelta(days=days))
+                 for days, artist_id in ((3, artist), (10, artist),
+                                         (10, other.id), (45, other.id),
+                                         (60, artist), (90, artist),
+                                         (400, artist), (400, other.id),
+                                         (500, other.id), (700, artist))]
+        shows.append(Show(artist_id=artist, venue_id=venue,
+                          start_time=now + datetime.timedelta(days=5)))
+        db.session.add_all(shows)
+        db.session.commit()
+        past_ids = [show.id for show in sorted(
+            shows[:-1], key=lambda show: (show.start_time, show.id),
+            reverse=True)]
+        archive.archiveShows(now - datetime.timedelta(days=365), 100)
+        assert db.session.query(ShowArchive).count() == 4
+        return past_ids
+
+
+def test_cursor_pages_list_every_past_show_in_order(app, venue,
+                                                    past_shows):
+    ids, cursor = [], None
+    with app.app_context():
+        while True:
+            page, cursor = archive.getPastShows(
+                Venue, venue, datetime.datetime.now(), cursor, limit=3)
+            assert len(page) <= 3
+            ids += [show['id'] for show in page]
+            if cursor is None:
+                break
+        assert archive.countPastShows(
+            Venue, venue, datetime.datetime.now()) == len(past_shows)
+    assert ids == past_shows
+
+
+def test_past_shows_endpoint_pages_by_cursor(app, client, venue,
+                                             past_shows):
+    app.config['PAST_SHOWS_PAGE_SIZE'] = 4
+    pages = []
+    cursor = None
+    while True:
+        query = {'after': cursor} if cursor else {}
+        body = client.get(f'/venues/{venue}/past-shows',
+                          query_string=query).get_json()
+        pages.append(body['shows'])
+        cursor = body['next']
+        if cursor is None:
+            break
+    assert [len(page) for page in pages] == [4, 4, len(past_shows) - 8]
+
+
+def test_detail_page_renders_the_first_page(app, client, venue,
+                                            past_shows):
+    app.config['PAST_SHOWS_PAGE_SIZE'] = 2
+    html = client.get(f'/venues/{venue}').data.decode()
+    assert f'{len(past_shows)} Past Shows' in html
+    assert 'data-after="' in html
+
+
+def test_malformed_cursor_is_rejected(client, venue):
+    response = client.get(f'/venues/{venue}/past-shows',
+                          query_string={'after': 'not-a-cursor'})
+    assert response.status_code == 400
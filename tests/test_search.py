@@ -0,0 +1,85 @@
+"""--------------------------------------------------------------------------#
+# Search rate limit and coalescing
+# --------------------------------------------------------------------------"""
+
+import time
+import threading
+import pytest
+import app as fyyur
+import ratelimit
+from models import Venue, Artist
+
+
+@pytest.fixture(autouse=True)
+def search_state():
+    fyyur.search_cache.cache.clear()
+    yield
+    ratelimit.setStore(None)
+
+
+@pytest.mark.parametrize('store', [ratelimit.MemoryStore,
+                                   ratelimit.DatabaseStore])
+def test_searches_over_the_limit_get_a_429(app, client, venue, store):
+    ratelimit.setStore(store())
+    app.config.update(SEARCH_RATE_LIMIT=0.01, SEARCH_RATE_BURST=2)
+    statuses = [client.post('/venues/search',
+                            data={'search_term': 'spot'})
+                for _ in range(3)]
+
+    assert [response.status_code for response in statuses] == [
+        200, 200, 429]
+    assert 1 <= int(statuses[-1].headers['Retry-After']) <= 100
+    # Other clients have their own allowance.
+    response = client.post('/venues/search', data={'search_term': 'spot'},
+                           environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert response.status_code == 200
+
+
+def test_concurrent_searches_share_one_query(app, monkeypatch):
+    app.config['SEARCH_CACHE_SECONDS'] = 0
+    calls = []
+    release = threading.Event()
+
+    def getKeywordResults(table, column, search_term, shows_match_id):
+        calls.append(search_term)
+        release.wait(5)
+        return {'count': 0, 'data': []}
+
+    monkeypatch.setattr(fyyur, 'getKeywordResults', getKeywordResults)
+    results = []
+
+    def search(term):
+        with app.app_context():
+            results.append(fyyur.searchRecords(Venue, Venue.name, term))
+
+    threads = [threading.Thread(target=search, args=(term,))
+               for term in ('Spot', 'spot', 'SPOT', 'spot')]
+    for thread in threads:
+        thread.start()
+    # Lets every thread reach the search before the query returns.
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 4 and all(
+        result is results[0] for result in results)
+    # Nothing is cached without SEARCH_CACHE_SECONDS.
+    search('spot')
+    assert len(calls) == 2
+
+
+def test_search_results_are_cached(app, monkeypatch):
+    calls = []
+
+    def getKeywordResults(table, column, search_term, shows_match_id):
+        calls.append(search_term)
+        return {'count': 0, 'data': []}
+
+    monkeypatch.setattr(fyyur, 'getKeywordResults', getKeywordResults)
+    with app.app_context():
+        for term in ('spot', 'Spot'):
+            fyyur.searchRecords(Venue, Venue.name, term)
+        fyyur.searchRecords(Artist, Artist.name, 'spot')
+    assert calls == ['spot', 'spot']
@@ -0,0 +1,47 @@
+"""--------------------------------------------------------------------------#
+# Page snapshots
+# --------------------------------------------------------------------------"""
+
+import os
+import gzip
+import assets
+import jobs
+
+
+def buildCss(app, static_dir, css):
+    os.makedirs(static_dir / 'css', exist_ok=True)
+    (static_dir / 'css' / 'main.css').write_text(css)
+    return assets.buildAssets(str(static_dir),
+                              app.config['ASSETS_DIST_DIR'])['css/main.css']
+
+
+# Function returns the venue directory and whether it was served from
+# its snapshot (compressed) rather than rendered live.
+def getVenues(client):
+    response = client.get('/venues',
+                          headers={'Accept-Encoding': 'gzip'})
+    if response.headers.get('Content-Encoding') == 'gzip':
+        return gzip.decompress(response.data).decode(), True
+    return response.get_data(as_text=True), False
+
+
+def test_snapshot_is_rendered_again_after_an_asset_build(app, client,
+                                                         venue, tmp_path):
+    app.config['PAGE_SNAPSHOTS'] = True
+    app.config['ASSETS_DIST_DIR'] = str(tmp_path / 'dist')
+    static_dir = tmp_path / 'static'
+    first_css = buildCss(app, static_dir, 'body { color: red; }')
+
+    getVenues(client)
+    jobs.work(app, once=True)
+    html, from_snapshot = getVenues(client)
+    assert from_snapshot and first_css in html
+
+    second_css = buildCss(app, static_dir, 'body { color: blue; }')
+    # The stored page links to the old build, so it is rendered live
+    # until the job has rendered it again.
+    html, from_snapshot = getVenues(client)
+    assert not from_snapshot and second_css in html
+    jobs.work(app, once=True)
+    html, from_snapshot = getVenues(client)
+    assert from_snapshot and second_css in html and first_css not in html
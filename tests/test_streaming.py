@@ -0,0 +1,54 @@
+"""--------------------------------------------------------------------------#
+# Streamed listings
+# --------------------------------------------------------------------------"""
+
+import datetime
+import pytest
+from models import db, Venue, Artist, Show
+
+
+# Fixture adds venues in two cities and artists with past and upcoming
+# shows.
+@pytest.fixture
+def listings(app, venue, artist):
+    with app.app_context():
+        db.session.add_all([
+            Venue(name='The Other Spot', city='Dallas', state='TX',
+                  address='2 Main St', phone='123-456-7890', genres='Jazz'),
+            Venue(name='Another Spot', city='Austin', state='TX',
+                  address='3 Main St', phone='123-456-7890', genres='Jazz'),
+            Artist(name='The Other Band', city='Reno', state='NV',
+                   phone='123-456-7890', genres='Jazz')
+        ])
+        db.session.flush()
+        now = datetime.datetime.now().replace(microsecond=0)
+        db.session.add_all([
+            Show(artist_id=artist_id, venue_id=venue_id,
+                 start_time=now + datetime.timedelta(days=days))
+            for artist_id, venue_id, days in ((artist, venue, -3),
+                                              (artist, venue, 3),
+                                              (artist + 1, venue + 2, 5))])
+        db.session.commit()
+
+
+@pytest.mark.parametrize('path', ['/venues', '/artists', '/shows'])
+def test_streamed_page_matches_the_rendered_page(app, client, listings,
+                                                 path):
+    rendered = client.get(path)
+    app.config['STREAM_LISTINGS'] = True
+    streamed = client.get(path)
+
+    assert (rendered.status_code, streamed.status_code) == (200, 200)
+    assert 'X-Accel-Buffering' not in rendered.headers
+    assert streamed.headers['X-Accel-Buffering'] == 'no'
+    html = rendered.get_data(as_text=True)
+    assert 'The Other' in html
+    assert streamed.get_data(as_text=True) == html
+
+
+@pytest.mark.parametrize('path', ['/venues', '/artists', '/shows'])
+def test_empty_listing_redirects_home(app, client, path):
+    app.config['STREAM_LISTINGS'] = True
+    response = client.get(path)
+    assert response.status_code == 302
+    assert response.headers['Location'] == '/'
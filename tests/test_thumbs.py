@@ -0,0 +1,27 @@
+"""--------------------------------------------------------------------------#
+# Image thumbnails
+# --------------------------------------------------------------------------"""
+
+import jobs
+import thumbs
+from models import db, Job
+
+# Private addresses are never fetched, so the job fails.
+broken_url = 'http://127.0.0.1/broken.jpg'
+
+
+def test_failed_thumbnail_can_be_queued_again(app):
+    with app.app_context():
+        thumbs.enqueueThumbnail(broken_url)
+        thumbs.enqueueThumbnail(broken_url)
+        db.session.execute(db.update(Job).values(max_attempts=1))
+        db.session.commit()
+        assert db.session.query(Job).count() == 1
+    jobs.work(app, once=True)
+
+    with app.app_context():
+        thumbs.enqueueThumbnail(broken_url)
+        db.session.commit()
+        statuses = db.session.execute(
+            db.select(Job.status).order_by(Job.id)).scalars().all()
+    assert statuses == ['failed', 'queued']
@@ -0,0 +1,50 @@
+"""--------------------------------------------------------------------------#
+# Show timelines
+# --------------------------------------------------------------------------"""
+
+import datetime
+import timeline
+from models import db, Show
+
+
+def test_stale_timeline_conflict_is_no_conflict(app, client, venue, artist):
+    app.config['SHOW_TIMELINE'] = True
+    start_time = datetime.datetime(2027, 5, 5, 20)
+    with app.app_context():
+        db.session.add(Show(artist_id=artist, venue_id=venue,
+                            start_time=start_time))
+        db.session.commit()
+        timeline.timelines.load()
+        # Removed behind the timeline's back, e.g. by another process.
+        db.session.execute(db.delete(Show))
+        db.session.commit()
+
+    response = client.post('/shows/create', data={
+        'artist_id': artist, 'venue_id': venue,
+        'start_time': '2027-05-05 21:00'})
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.query(Show).count() == 1
+
+
+def test_every_timeline_conflict_is_checked(app, client, venue, artist):
+    app.config['SHOW_TIMELINE'] = True
+    with app.app_context():
+        db.session.add_all([
+            Show(artist_id=artist, venue_id=venue,
+                 start_time=datetime.datetime(2027, 5, 5, hour, minute))
+            for hour, minute in ((20, 0), (21, 30))])
+        db.session.commit()
+        timeline.timelines.load()
+        # The first show in the window is gone, the second still books
+        # the artist.
+        db.session.execute(db.delete(Show).where(
+            Show.start_time == datetime.datetime(2027, 5, 5, 20)))
+        db.session.commit()
+
+    response = client.post('/shows/create', data={
+        'artist_id': artist, 'venue_id': venue,
+        'start_time': '2027-05-05 21:00'})
+    assert 'is already booked' in response.get_data(as_text=True)
+    with app.app_context():
+        assert db.session.query(Show).count() == 1
@@ -0,0 +1,54 @@
+"""--------------------------------------------------------------------------#
+# Case-insensitive unique venue and artist names
+# --------------------------------------------------------------------------"""
+
+from models import db, Venue, Artist
+
+
+def test_duplicate_venue_name_in_other_case_is_rejected(app, client, venue,
+                                                        venue_form):
+    response = client.post('/venues/create',
+                           data=dict(venue_form, name='  the SPOT '))
+    assert response.status_code == 200
+    assert b'already listed' in response.data
+
+    with app.app_context():
+        assert db.session.query(Venue).count() == 1
+
+
+def test_duplicate_artist_name_in_other_case_is_rejected(app, client,
+                                                         artist,
+                                                         artist_form):
+    response = client.post('/artists/create',
+                           data=dict(artist_form, name='THE BAND'))
+    assert b'already listed' in response.data
+
+    with app.app_context():
+        assert db.session.query(Artist).count() == 1
+
+
+def test_renaming_to_a_taken_name_is_rejected(app, client, venue,
+                                              venue_form):
+    created = client.post('/venues/create',
+                          data=dict(venue_form, name='Other Place'))
+    assert created.status_code == 302
+
+    with app.app_context():
+        other = db.session.execute(
+            db.select(Venue.id).where(Venue.name == 'Other Place')).scalar()
+    response = client.post(f'/venues/{other}/edit', data=dict(
+        venue_form, id=other, version=1, name='The spot'))
+    assert b'already listed' in response.data
+
+    with app.app_context():
+        assert db.session.get(Venue, other).name == 'Other Place'
+
+
+def test_changing_the_case_of_a_name_is_allowed(app, client, artist,
+                                                artist_form):
+    response = client.post(f'/artists/{artist}/edit', data=dict(
+        artist_form, id=artist, version=1, name='the band'))
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert db.session.get(Artist, artist).name == 'the band'
@@ -0,0 +1,38 @@
+"""--------------------------------------------------------------------------#
+# Optimistic concurrency on the edit handlers
+# --------------------------------------------------------------------------"""
+
+from models import db, Venue, Artist
+
+
+def test_stale_venue_edit_is_rejected(app, client, venue, venue_form):
+    edited = client.post(f'/venues/{venue}/edit', data=dict(
+        venue_form, id=venue, version=1, name='The New Spot'))
+    assert edited.headers['Location'].endswith(f'/venues/{venue}')
+
+    # A second editor still holding version 1 is sent back to the form.
+    stale = client.post(f'/venues/{venue}/edit', data=dict(
+        venue_form, id=venue, version=1, name='The Old Spot'))
+    assert stale.headers['Location'].endswith(f'/venues/{venue}/edit')
+
+    with app.app_context():
+        record = db.session.get(Venue, venue)
+        assert (record.name, record.version) == ('The New Spot', 2)
+
+
+def test_stale_artist_edit_is_rejected(app, client, artist, artist_form):
+    for name in ('The New Band', 'The Old Band'):
+        response = client.post(f'/artists/{artist}/edit', data=dict(
+            artist_form, id=artist, version=1, name=name))
+    assert response.headers['Location'].endswith(f'/artists/{artist}/edit')
+
+    with app.app_context():
+        record = db.session.get(Artist, artist)
+        assert (record.name, record.version) == ('The New Band', 2)
+
+
+def test_edit_form_is_tagged_with_the_version(client, venue):
+    response = client.get(f'/venues/{venue}/edit')
+    assert response.headers['ETag'] == f'"venue-{venue}-v1"'
+    assert client.get(f'/venues/{venue}/edit', headers={
+        'If-None-Match': response.headers['ETag']}).status_code == 304
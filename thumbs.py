@@ -0,0 +1,252 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import io
+import os
+import re
+import socket
+import hashlib
+import ipaddress
+import http.client
+import urllib.parse
+import urllib.request
+from flask import current_app, request, send_from_directory, url_for, abort
+import hooks
+import jobs
+from models import db, Venue, Artist
+
+
+"""--------------------------------------------------------------------------#
+# Image thumbnails
+#
+# A job fetches each image_link once, resizes it and stores a JPEG and a
+# WebP variant under THUMB_DIR/objects, named by the hash of the source
+# image (so identical images, like the default placeholders, are stored
+# once). THUMB_DIR/links/<url key> holds that hash for each image_link.
+# Templates use the thumb filter, which points at /thumbs/<url key> once
+# a thumbnail exists and at the original image until then.
+# --------------------------------------------------------------------------"""
+
+
+immutable_cache = 'public, max-age=31536000, immutable'
+max_image_bytes = 20 * 1024 * 1024
+
+# URL keys known to have a thumbnail. Only hits are remembered, so a
+# thumbnail built after a miss is picked up on the next lookup.
+_built = set()
+
+
+#  ----------------------------------------------------------------
+#  Fetching
+#  ----------------------------------------------------------------
+
+
+# Image links are submitted by anyone filling in a form, so the worker
+# only fetches http(s) URLs on public addresses. The address is checked
+# when each connection (including one for a redirect) is made, on the
+# address actually connected to, so a name can't resolve to a public
+# address for the check and a private one for the fetch.
+
+
+def isPublicAddress(address):
+    ip = ipaddress.ip_address(address.split('%')[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+# Function connects like socket.create_connection, refusing hosts that
+# resolve to any address that isn't public.
+def connectPublic(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT,
+                  source_address=None, **options):
+    host, port = address
+    resolved = [info[4][0] for info in
+                socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    for resolved_address in resolved:
+        if not isPublicAddress(resolved_address):
+            raise ValueError(f'Image host {host} is not a public address.')
+    return socket.create_connection((resolved[0], port), timeout,
+                                    source_address)
+
+
+class PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connectPublic
+
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connectPublic
+
+
+class PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(PublicHTTPConnection, req)
+
+
+class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(PublicHTTPSConnection, req,
+                            context=self._context)
+
+
+# Only http(s) handlers, no proxy, file or ftp ones, so redirects can't
+# lead anywhere else either.
+opener = urllib.request.OpenerDirector()
+for url_handler in (PublicHTTPHandler(), PublicHTTPSHandler(),
+                    urllib.request.HTTPRedirectHandler(),
+                    urllib.request.HTTPDefaultErrorHandler(),
+                    urllib.request.HTTPErrorProcessor()):
+    opener.add_handler(url_handler)
+
+
+def fetchUrl(url):
+    if urllib.parse.urlsplit(url).scheme not in ('http', 'https'):
+        raise ValueError(f'Image link {url} is not an http(s) URL.')
+    with opener.open(url, timeout=10) as response:
+        content = response.read(max_image_bytes + 1)
+    if len(content) > max_image_bytes:
+        raise ValueError(f'Image at {url} is larger than {max_image_bytes} '
+                         'bytes.')
+    return content
+
+
+# The function used to download images. Replace it with setFetcher(),
+# e.g. with a stub that reads local files in tests.
+fetcher = fetchUrl
+
+
+def setFetcher(function):
+    global fetcher
+    fetcher = function
+
+
+#  ----------------------------------------------------------------
+#  Building
+#  ----------------------------------------------------------------
+
+
+def urlKey(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+
+def writeAtomic(path, content):
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as target:
+        target.write(content)
+    os.replace(temporary, path)
+
+
+# Function fetches an image, writes its thumbnails (unless an identical
+# image was seen before) and links the image URL to them.
+def buildThumbnail(url, thumb_dir, size):
+    # Pillow is only needed by the job worker that builds thumbnails, so
+    # it is not imported with the app.
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError('Pillow is required to build thumbnails.')
+    content = fetcher(url)
+    digest = hashlib.sha256(content).hexdigest()
+    objects_dir = os.path.join(thumb_dir, 'objects')
+    links_dir = os.path.join(thumb_dir, 'links')
+    os.makedirs(objects_dir, exist_ok=True)
+    os.makedirs(links_dir, exist_ok=True)
+
+    if not os.path.isfile(os.path.join(objects_dir, digest + '.webp')):
+        image = Image.open(io.BytesIO(content)).convert('RGB')
+        image.thumbnail((size, size))
+        for extension, options in (('jpg', {'format': 'JPEG',
+                                            'quality': 80,
+                                            'optimize': True}),
+                                   ('webp', {'format': 'WEBP',
+                                             'quality': 75})):
+            encoded = io.BytesIO()
+            image.save(encoded, **options)
+            writeAtomic(os.path.join(objects_dir, f'{digest}.{extension}'),
+                        encoded.getvalue())
+
+    writeAtomic(os.path.join(links_dir, urlKey(url)),
+                digest.encode('ascii'))
+    return digest
+
+
+@jobs.handler('thumbs.build')
+def buildThumbnailJob(payload):
+    buildThumbnail(payload['url'], current_app.config['THUMB_DIR'],
+                   current_app.config['THUMB_SIZE'])
+
+
+# Function queues a thumbnail job for an image URL. The idempotency key
+# makes sure each URL is only fetched once, or again after its job
+# failed for good.
+def enqueueThumbnail(url):
+    if url:
+        jobs.enqueue('thumbs.build', {'url': url},
+                     key='thumbs.build:' + urlKey(url))
+
+
+@hooks.onChange(Venue, Artist)
+def enqueueChangedImages(table, record_ids, operation):
+    if operation == 'delete':
+        return
+    image_links = (
+        db.session.query(table.image_link)
+        .filter(table.id.in_(record_ids)).distinct()
+    )
+    for record in image_links:
+        enqueueThumbnail(record.image_link)
+
+
+# Function queues thumbnail jobs for every image already in the
+# database.
+def enqueueAllThumbnails():
+    count = 0
+    for table in (Venue, Artist):
+        for record in db.session.query(table.image_link).distinct():
+            enqueueThumbnail(record.image_link)
+            count += 1
+    db.session.commit()
+    return count
+
+
+#  ----------------------------------------------------------------
+#  Serving
+#  ----------------------------------------------------------------
+
+
+# Template filter. Returns the thumbnail URL for an image, or the image
+# itself if no thumbnail has been built yet.
+def thumbUrl(url):
+    if not url:
+        return url
+    key = urlKey(url)
+    if key not in _built:
+        link = os.path.join(current_app.config['THUMB_DIR'], 'links', key)
+        if not os.path.isfile(link):
+            return url
+        _built.add(key)
+    return url_for('main.thumbnail', key=key)
+
+
+# Function sends the thumbnail for a URL key, as WebP if the client
+# accepts it.
+def sendThumbnail(key):
+    if not re.fullmatch(r'[0-9a-f]{32}', key):
+        abort(404)
+    thumb_dir = current_app.config['THUMB_DIR']
+    try:
+        with open(os.path.join(thumb_dir, 'links', key), 'rb') as link:
+            digest = link.read().decode('ascii')
+    except (OSError, ValueError):
+        abort(404)
+    extension = ('webp' if request.accept_mimetypes['image/webp']
+                 else 'jpg')
+    response = send_from_directory(os.path.join(thumb_dir, 'objects'),
+                                   f'{digest}.{extension}')
+    response.headers['Cache-Control'] = immutable_cache
+    response.headers['Vary'] = 'Accept'
+    return response
@@ -0,0 +1,214 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import time
+import calendar
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from flask import current_app
+import hooks
+from models import db, Venue, Artist, Show
+
+
+"""--------------------------------------------------------------------------#
+# Show timelines
+#
+# When SHOW_TIMELINE is enabled, every artist and venue has a sorted
+# array('q') of its show start times (as epoch seconds) with the show
+# IDs in a parallel array. Splitting past from upcoming shows, counting
+# upcoming shows and finding booking conflicts are then bisect lookups
+# instead of scans over the Show table.
+#
+# The timelines are loaded from the database on first use and kept
+# current from the change hooks, applied when the session commits.
+# They live in each process, so changes committed by other processes
+# are only seen after a reload, at most SHOW_TIMELINE_MAX_AGE seconds
+# later.
+# --------------------------------------------------------------------------"""
+
+
+def toEpoch(value):
+    return calendar.timegm(value.timetuple())
+
+
+#  ----------------------------------------------------------------
+#  Timeline for a set of entities
+#  ----------------------------------------------------------------
+
+
+class Timeline(object):
+    def __init__(self):
+        self.epochs = {}
+        self.show_ids = {}
+
+    def add(self, entity_id, epoch, show_id):
+        epochs = self.epochs.setdefault(entity_id, array('q'))
+        show_ids = self.show_ids.setdefault(entity_id, array('q'))
+        index = bisect_right(epochs, epoch)
+        epochs.insert(index, epoch)
+        show_ids.insert(index, show_id)
+
+    def remove(self, entity_id, epoch, show_id):
+        epochs = self.epochs.get(entity_id)
+        if epochs is None:
+            return
+        show_ids = self.show_ids[entity_id]
+        index = bisect_left(epochs, epoch)
+        while index < len(epochs) and epochs[index] == epoch:
+            if show_ids[index] == show_id:
+                del epochs[index]
+                del show_ids[index]
+                break
+            index += 1
+        if not epochs:
+            del self.epochs[entity_id]
+            del self.show_ids[entity_id]
+
+    def drop(self, entity_id):
+        self.epochs.pop(entity_id, None)
+        return self.show_ids.pop(entity_id, array('q'))
+
+    # Returns the IDs of the shows at or before epoch and of the shows
+    # after it, both in start time order.
+    def split(self, entity_id, epoch):
+        epochs = self.epochs.get(entity_id, ())
+        show_ids = self.show_ids.get(entity_id, array('q'))
+        index = bisect_right(epochs, epoch)
+        return show_ids[:index].tolist(), show_ids[index:].tolist()
+
+    def countAfter(self, entity_id, epoch):
+        epochs = self.epochs.get(entity_id, ())
+        return len(epochs) - bisect_right(epochs, epoch)
+
+    # Returns the IDs of the shows starting between start and end
+    # (inclusive) other than exclude_id, in start time order.
+    def conflicts(self, entity_id, start, end, exclude_id=None):
+        epochs = self.epochs.get(entity_id, ())
+        show_ids = self.show_ids.get(entity_id, array('q'))
+        first = bisect_left(epochs, start)
+        last = bisect_right(epochs, end)
+        return [show_id for show_id in show_ids[first:last]
+                if show_id != exclude_id]
+
+
+#  ----------------------------------------------------------------
+#  Artist and venue timelines
+#  ----------------------------------------------------------------
+
+
+class ShowTimelines(object):
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.artists = Timeline()
+        self.venues = Timeline()
+        # Show ID -> (artist ID, venue ID, epoch), to find the entries of
+        # a show that is edited or deleted.
+        self.shows = {}
+        self.loaded_at = None
+
+    def addShow(self, show_id, artist_id, venue_id, epoch):
+        self.removeShow(show_id)
+        self.artists.add(artist_id, epoch, show_id)
+        self.venues.add(venue_id, epoch, show_id)
+        self.shows[show_id] = (artist_id, venue_id, epoch)
+
+    def removeShow(self, show_id):
+        entry = self.shows.pop(show_id, None)
+        if entry is not None:
+            artist_id, venue_id, epoch = entry
+            self.artists.remove(artist_id, epoch, show_id)
+            self.venues.remove(venue_id, epoch, show_id)
+
+    # Removes an artist or venue together with its shows, which the
+    # database deletes by cascade.
+    def removeEntity(self, kind, entity_id):
+        for show_id in getattr(self, kind).drop(entity_id):
+            self.removeShow(show_id)
+
+    def load(self):
+        loaded = ShowTimelines()
+        rows = (
+            db.session.query(Show.id, Show.artist_id, Show.venue_id,
+                             Show.start_time)
+            .order_by(Show.start_time, Show.id)
+            .yield_per(5000)
+        )
+        for row in rows:
+            loaded.addShow(row.id, row.artist_id, row.venue_id,
+                           toEpoch(row.start_time))
+        with self.lock:
+            self.artists = loaded.artists
+            self.venues = loaded.venues
+            self.shows = loaded.shows
+            self.loaded_at = time.monotonic()
+
+    # Loads the timelines if they were never loaded or are older than
+    # max_age seconds, and returns them.
+    def current(self, max_age):
+        if (self.loaded_at is None or
+                time.monotonic() - self.loaded_at > max_age):
+            self.load()
+        return self
+
+    # Lookups by 'artists' or 'venues', under the lock so they never see
+    # a half applied change.
+    def split(self, kind, entity_id, epoch):
+        with self.lock:
+            return getattr(self, kind).split(entity_id, epoch)
+
+    def countAfter(self, kind, entity_id, epoch):
+        with self.lock:
+            return getattr(self, kind).countAfter(entity_id, epoch)
+
+    def conflicts(self, kind, entity_id, start, end, exclude_id=None):
+        with self.lock:
+            return getattr(self, kind).conflicts(entity_id, start, end,
+                                                 exclude_id)
+
+    def apply(self, changes):
+        with self.lock:
+            for change in changes:
+                change[0](*change[1:])
+
+
+timelines = ShowTimelines()
+
+
+#  ----------------------------------------------------------------
+#  Functions
+#  ----------------------------------------------------------------
+
+
+def enabled():
+    return bool(current_app.config.get('SHOW_TIMELINE'))
+
+
+def getTimelines():
+    return timelines.current(current_app.config['SHOW_TIMELINE_MAX_AGE'])
+
+
+# Change hook. Returns the timeline updates for the changed records.
+@hooks.onCommit(timelines.apply, Venue, Artist, Show)
+def collectChanges(table, record_ids, operation):
+    if not enabled() or timelines.loaded_at is None:
+        return None
+    pending = []
+    if table is Show:
+        for show_id in record_ids:
+            pending.append((timelines.removeShow, show_id))
+        if operation not in hooks.removals:
+            rows = (
+                db.session.query(Show.id, Show.artist_id, Show.venue_id,
+                                 Show.start_time)
+                .filter(Show.id.in_(record_ids))
+            )
+            for row in rows:
+                pending.append((timelines.addShow, row.id, row.artist_id,
+                                row.venue_id, toEpoch(row.start_time)))
+    elif operation == 'delete':
+        kind = 'venues' if table is Venue else 'artists'
+        for entity_id in record_ids:
+            pending.append((timelines.removeEntity, kind, entity_id))
+    return pending
@@ -3,9 +3,13 @@
 # --------------------------------------------------------------------------"""
 
 import re
+import logging
 import datetime
+import timeline
 from wtforms import ValidationError, DateTimeField
-from models import db, Artist, Venue, Show
+from models import db, Artist, Venue, Show, getRecord, getFirstMatch
+
+logger = logging.getLogger(__name__)
 
 """--------------------------------------------------------------------------#
 # Validators, error messages and enum choice restrictions
@@ -77,49 +81,13 @@ class RequiredIfFilled(object):
         # has data.
 
         check_field_value = form._fields.get(self.check_field).data.strip()
-        print('try check field value: ', check_field_value)
+        logger.debug('RequiredIfFilled: %s is %r.', self.check_field,
+                     check_field_value)
 
         if check_field_value != '' and field.data.strip() == '':
             raise ValidationError(self.message)
 
 
-class IsUnique(object):
-    def __init__(self, table=None, key=None,
-                 check_field=None, message=None):
-        self.table = table
-        self.key = key
-        self.check_field = check_field
-
-        if not message:
-            message = 'This field must be unique.'
-        self.message = message
-
-    def __call__(self, form, field):
-        # Conditional validates required inputs, returns exception if not met
-        if self.table is None or self.key is None or self.check_field is None:
-            raise Exception('Required paramaters not provided to verify '
-                            'field is unique.')
-
-        # Queries database for matching record with the table and column
-        # provided as parameters.
-        # NOTE: this is intentionally case-insensitive to allow for whacky
-        # capitalization schemes some bands are known for.
-        check_field_value = field.data.strip()
-        key_value = int((form._fields.get(self.key).data) or -1)
-        record_query = (
-            self.table.query
-            .filter(getattr(self.table, self.check_field)
-                    == check_field_value).first()
-        )
-        # If a record is returned checks for field value match and record
-        # id mismatch. Raises validation error if both conditions are met.
-        if record_query is not None:
-            if (getattr(record_query, self.check_field).strip()
-                    == check_field_value and (key_value) !=
-                    ((getattr(record_query, self.key)))):
-                raise ValidationError(self.message)
-
-
 class RecordExists(object):
     def __init__(self, table=None, check_field=None, message=None):
         self.table = table
@@ -137,11 +105,9 @@ class RecordExists(object):
         # Checks that the record with the ID entered in the field exists
         # in the specified table.
         check_field_value = field.data
-        record_query = (
-            self.table.query
-            .filter(getattr(self.table, self.check_field)
-                    == check_field_value).first()
-        )
+        record_query = getFirstMatch(self.table,
+                                     getattr(self.table, self.check_field),
+                                     check_field_value)
 
         if record_query is None:
             raise ValidationError(self.message)
@@ -226,14 +192,13 @@ class DateAvailable(object):
         artist_id = int((form._fields.get('artist_id').data) or -1)
 
         if artist_id > -1:
-            artist_query = Artist.query.get(artist_id)
+            artist_query = getRecord(Artist, artist_id)
             artist_start = artist_query.available_start
             artist_end = artist_query.available_end
             artist_available = artist_query.seeking_venue
         else:
             raise Exception('')
 
-        artist_shows = Show.query.filter(Show.artist_id == artist_id).all()
         try:
             this_date = stringToDateTime(field.data.strip())
         except ValueError:
@@ -256,16 +221,33 @@ class DateAvailable(object):
                 )
         # Verifies that the time is not too close to another booking.
         # The default is two hours but can be set with the show_time_delta
-        # parameter.
+        # parameter. The show being edited (if any) is not a conflict.
+        show_delta = datetime.timedelta(hours=self.show_time_delta)
+        show_field = form._fields.get('id')
+        show_id = int((show_field.data if show_field else None) or -1)
+        if timeline.enabled():
+            conflict_ids = timeline.getTimelines().conflicts(
+                'artists', artist_id,
+                timeline.toEpoch(this_date - show_delta),
+                timeline.toEpoch(this_date + show_delta),
+                exclude_id=show_id)
+            # A stale timeline may name shows that are gone or were moved,
+            # each is checked against the database below.
+            artist_shows = (Show.query.filter(Show.id.in_(conflict_ids),
+                                              Show.artist_id == artist_id)
+                            .order_by(Show.start_time).all()
+                            if conflict_ids else [])
+        else:
+            artist_shows = (Show.query.filter(Show.artist_id == artist_id,
+                                              Show.id != show_id).all())
         for show in artist_shows:
-            show_delta = datetime.timedelta(hours=self.show_time_delta)
             start_time = show.start_time - show_delta
             end_time = show.start_time + show_delta
             if this_date >= start_time and this_date <= end_time:
                 raise ValidationError(
                     f'{artist_query.name} is already booked on '
                     f'{show.venue.name} at {show.start_time} '
-                    f'please pick a time {self.show_delta} hours '
+                    f'please pick a time {self.show_time_delta} hours '
                     'before or after that time.'
                 )
 
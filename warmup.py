@@ -0,0 +1,90 @@
+"""--------------------------------------------------------------------------#
+# Imports
+# --------------------------------------------------------------------------"""
+
+import os
+import logging
+import threading
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy.orm import configure_mappers
+from models import db, Venue, Artist, getRecent
+
+logger = logging.getLogger(__name__)
+
+
+"""--------------------------------------------------------------------------#
+# Start up warm-up
+# --------------------------------------------------------------------------"""
+
+
+# Set once every warm-up step has been attempted. The readiness endpoint
+# reports ready only after this is set.
+ready = threading.Event()
+
+
+#  ----------------------------------------------------------------
+#  Functions
+#  ----------------------------------------------------------------
+
+
+# Function attaches an on-disk bytecode cache to the Jinja environment.
+# All workers point at the same directory, so a template compiled by
+# one worker (or at deploy time) is loaded as bytecode by the others.
+def configureTemplateCache(app):
+    cache_dir = app.config.get('TEMPLATE_CACHE_DIR')
+    if not cache_dir:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+
+# Function compiles every html template so it is held in the
+# environment's template cache (and written to the bytecode cache).
+def warmTemplates(app):
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+# Function configures the ORM mappers and runs the home page queries
+# once, so their statements are built and their compiled SQL is in the
+# engine's compiled cache before the first request. The count is a bound
+# parameter, so a count of 0 keeps the queries cheap.
+def warmQueries(app):
+    configure_mappers()
+    with app.app_context():
+        try:
+            getRecent(Venue, 0)
+            getRecent(Artist, 0)
+        finally:
+            db.session.remove()
+
+
+def warmUp(app):
+    try:
+        count = warmTemplates(app)
+        logger.info('Precompiled %s templates.', count)
+        try:
+            warmQueries(app)
+        except Exception:
+            # A database that is not reachable yet should not keep the
+            # worker out of rotation forever, the first request will
+            # connect and compile as it would without warm-up.
+            logger.exception('Query warm-up failed.')
+    finally:
+        ready.set()
+
+
+# Function starts the warm-up. By default it runs on a background
+# thread so the server can accept connections (and answer the
+# readiness probe) while it works.
+def startWarmUp(app, background=True):
+    if not app.config.get('WARMUP_ON_START', True):
+        ready.set()
+        return
+    if background:
+        threading.Thread(target=warmUp, args=(app,), name='warm-up',
+                         daemon=True).start()
+    else:
+        warmUp(app)
@@ -0,0 +1,15 @@
+"""--------------------------------------------------------------------------#
+# Job worker entry point
+#
+#   python worker.py
+# --------------------------------------------------------------------------"""
+
+import os
+import jobs
+from app import create_app
+
+
+if __name__ == '__main__':
+    app = create_app()
+    jobs.work(app, poll_interval=float(os.environ.get('JOB_POLL_INTERVAL',
+                                                      1.0)))
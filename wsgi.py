@@ -0,0 +1,17 @@
+"""--------------------------------------------------------------------------#
+# Production entry point
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# gunicorn.conf.py sets preload_app, so the app is created once in the
+# master process. Warm-up is finished here, before the workers are
+# forked, so they all start with compiled templates and configured
+# mappers shared copy-on-write.
+# --------------------------------------------------------------------------"""
+
+import warmup
+from app import create_app
+
+
+app = create_app()
+warmup.ready.wait()